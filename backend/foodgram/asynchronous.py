@@ -0,0 +1,87 @@
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.db import close_old_connections
+from django.http import HttpResponse, StreamingHttpResponse
+
+
+@functools.lru_cache(maxsize=None)
+def get_executor():
+    """Пул потоков процесса для чтения в асинхронных представлениях."""
+    return ThreadPoolExecutor(
+        max_workers=settings.ASYNC_VIEW_THREADS,
+        thread_name_prefix='async-read',
+    )
+
+
+def _run_in_thread(view, request, *args, **kwargs):
+    # Соединения с БД у каждого потока свои, и сигналы начала и конца
+    # запроса до потоков пула не доходят: закрываем старые соединения
+    # (или возвращаем их в пул) здесь же.
+    close_old_connections()
+    try:
+        response = view(request, *args, **kwargs)
+        if hasattr(response, 'render'):
+            response.render()
+        return response
+    finally:
+        close_old_connections()
+
+
+def streaming_response(content, **kwargs):
+    """
+    StreamingHttpResponse под WSGI. Под ASGI Django 3.2 перебирает
+    итератор ответа в цикле событий, где запросы к БД запрещены,
+    поэтому содержимое собирается целиком ещё в потоке представления.
+    """
+    if settings.ASYNC_VIEWS:
+        return HttpResponse(content, **kwargs)
+    return StreamingHttpResponse(content, **kwargs)
+
+
+def async_read_view(view, actions):
+    """
+    Асинхронная обёртка над представлением DRF. Запросы к действиям
+    actions выполняются в общем пуле потоков и не ждут друг друга;
+    остальные — в одном потоке, как синхронные представления под ASGI.
+    В Django 3.2 асинхронного ORM нет, поэтому чтение идёт через
+    sync_to_async.
+    """
+    read = sync_to_async(
+        functools.partial(_run_in_thread, view),
+        thread_sensitive=False,
+        executor=get_executor(),
+    )
+    write = sync_to_async(view)
+    mapping = getattr(view, 'actions', None) or {}
+    read_methods = {
+        method for method, action in mapping.items() if action in actions
+    }
+
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        if request.method.lower() in read_methods:
+            return await read(request, *args, **kwargs)
+        return await write(request, *args, **kwargs)
+
+    return wrapper
+
+
+class AsyncReadMixin:
+    """
+    Под ASGI (ASYNC_VIEWS=True) отдаёт действия из async_actions через
+    async_read_view. Под WSGI представления остаются синхронными.
+    """
+
+    async_actions = ()
+
+    @classmethod
+    def as_view(cls, actions=None, **initkwargs):
+        view = super().as_view(actions, **initkwargs)
+        if not settings.ASYNC_VIEWS or not cls.async_actions:
+            return view
+        if not set(cls.async_actions) & set((actions or {}).values()):
+            return view
+        return async_read_view(view, cls.async_actions)
@@ -0,0 +1,13 @@
+from django.conf import settings
+
+# Кеши, которые живут в памяти процесса: запись и инвалидация из другого
+# процесса до них не дойдут.
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def is_shared_cache():
+    """True, если кеш по умолчанию общий для всех процессов."""
+    return settings.CACHES['default']['BACKEND'] not in LOCAL_CACHE_BACKENDS
@@ -0,0 +1,164 @@
+import threading
+import time
+from collections import deque
+
+from foodgram.profiling import MS_BUCKETS, Histogram
+from psycopg2 import OperationalError
+from psycopg2.extensions import TRANSACTION_STATUS_IDLE
+
+
+class PoolTimeoutError(OperationalError):
+    """Django превращает её в django.db.OperationalError."""
+
+
+class ConnectionPool:
+    """
+    Пул соединений процесса. Держит до max_size соединений, при
+    нехватке открывает ещё до max_overflow временных, которые
+    закрываются при возврате; дальше запросы ждут до timeout секунд.
+    Простаивавшие дольше idle_timeout соединения закрываются, при выдаче
+    соединение проверяется запросом SELECT 1 (health_check).
+    """
+
+    def __init__(self, max_size=10, max_overflow=0, timeout=30,
+                 idle_timeout=300, health_check=True):
+        self.max_size = max_size
+        self.max_overflow = max_overflow
+        self.timeout = timeout
+        self.idle_timeout = idle_timeout
+        self.health_check = health_check
+        self._condition = threading.Condition()
+        self._idle = deque()
+        self._size = 0
+        self._wait_ms = Histogram(MS_BUCKETS)
+        self._counters = dict.fromkeys((
+            'checkouts', 'overflows', 'timeouts', 'created', 'closed',
+            'health_check_failures',
+        ), 0)
+
+    def checkout(self, connect):
+        """Свободное соединение из пула или новое, открытое connect()."""
+        start = time.monotonic()
+        deadline = start + self.timeout
+        with self._condition:
+            while True:
+                connection = self._pop_idle()
+                if connection is not None:
+                    break
+                if self._size < self.max_size + self.max_overflow:
+                    self._size += 1
+                    if self._size > self.max_size:
+                        self._counters['overflows'] += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._counters['timeouts'] += 1
+                    raise PoolTimeoutError(
+                        f'Нет свободных соединений за {self.timeout} с.'
+                    )
+                self._condition.wait(remaining)
+            self._counters['checkouts'] += 1
+            self._wait_ms.observe((time.monotonic() - start) * 1000)
+        if connection is not None and not self._is_usable(connection):
+            # Слот остаётся за этим запросом, соединение открывается заново.
+            self._discard(connection)
+            connection = None
+        if connection is None:
+            try:
+                connection = connect()
+            except Exception:
+                self._release_slot()
+                raise
+            with self._condition:
+                self._counters['created'] += 1
+        return connection
+
+    def checkin(self, connection):
+        with self._condition:
+            overflow = self._size > self.max_size
+        if overflow or connection.closed or not self._reset(connection):
+            self._close(connection)
+            return
+        with self._condition:
+            self._idle.append((connection, time.monotonic()))
+            self._condition.notify()
+
+    def close_all(self):
+        with self._condition:
+            idle, self._idle = list(self._idle), deque()
+        for connection, _ in idle:
+            self._close(connection)
+
+    def stats(self):
+        with self._condition:
+            return {
+                **self._counters,
+                'size': self._size,
+                'idle': len(self._idle),
+                'in_use': self._size - len(self._idle),
+                'max_size': self.max_size,
+                'max_overflow': self.max_overflow,
+                'wait_ms': self._wait_ms.as_dict(),
+            }
+
+    def _pop_idle(self):
+        """Свежее свободное соединение; устаревшие закрываются."""
+        now = time.monotonic()
+        while self._idle:
+            connection, returned = self._idle.pop()
+            if now - returned <= self.idle_timeout:
+                return connection
+            # Остальные вернулись ещё раньше и тоже устарели.
+            stale = [connection] + [item[0] for item in self._idle]
+            self._idle.clear()
+            self._size -= len(stale)
+            self._counters['closed'] += len(stale)
+            for connection in stale:
+                self._close_quietly(connection)
+        return None
+
+    def _is_usable(self, connection):
+        if connection.closed:
+            return False
+        if not self.health_check:
+            return True
+        try:
+            with connection.cursor() as cursor:
+                cursor.execute('SELECT 1')
+            if not connection.autocommit:
+                connection.rollback()
+        except Exception:
+            with self._condition:
+                self._counters['health_check_failures'] += 1
+            return False
+        return True
+
+    def _reset(self, connection):
+        """Откатывает незавершённую транзакцию перед возвратом в пул."""
+        try:
+            if connection.get_transaction_status() != TRANSACTION_STATUS_IDLE:
+                connection.rollback()
+        except Exception:
+            return False
+        return connection.get_transaction_status() == TRANSACTION_STATUS_IDLE
+
+    def _discard(self, connection):
+        self._close_quietly(connection)
+        with self._condition:
+            self._counters['closed'] += 1
+
+    def _close(self, connection):
+        self._discard(connection)
+        self._release_slot()
+
+    def _release_slot(self):
+        with self._condition:
+            self._size -= 1
+            self._condition.notify()
+
+    @staticmethod
+    def _close_quietly(connection):
+        try:
+            connection.close()
+        except Exception:
+            pass
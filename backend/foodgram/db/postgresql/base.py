@@ -0,0 +1,103 @@
+import os
+import threading
+
+from django.db.backends.postgresql import base
+from foodgram.db.pool import ConnectionPool
+from foodgram.profiling import metrics
+
+from .creation import DatabaseCreation
+
+_pools = {}
+_pools_lock = threading.Lock()
+
+
+def get_pool(alias, conn_params, options):
+    """
+    Пул соединений с параметрами conn_params. После fork (воркеры
+    gunicorn) каждый процесс создаёт свой пул, унаследованные сокеты
+    не используются.
+    """
+    key = (os.getpid(), alias, tuple(sorted(conn_params.items())))
+    pool = _pools.get(key)
+    if pool is None:
+        with _pools_lock:
+            pool = _pools.get(key)
+            if pool is None:
+                pool = _pools[key] = ConnectionPool(**{
+                    name.lower(): value for name, value in options.items()
+                })
+                metrics.register_source(
+                    f'db_pool:{alias}:{conn_params.get("database")}',
+                    pool.stats
+                )
+    return pool
+
+
+def close_pools():
+    """Закрывает свободные соединения всех пулов процесса."""
+    with _pools_lock:
+        pools = [
+            pool for (pid, *_), pool in _pools.items() if pid == os.getpid()
+        ]
+    for pool in pools:
+        pool.close_all()
+
+
+class DatabaseWrapper(base.DatabaseWrapper):
+    """
+    Postgres с проверкой постоянных соединений и необязательным пулом.
+
+    CONN_HEALTH_CHECKS: перед первым запросом в каждом HTTP-запросе
+    постоянное соединение (CONN_MAX_AGE > 0) проверяется и при обрыве
+    открывается заново, вместо ошибки у пользователя.
+
+    POOL: словарь с параметрами ConnectionPool (MAX_SIZE, MAX_OVERFLOW,
+    TIMEOUT, IDLE_TIMEOUT, HEALTH_CHECK). Соединение берётся из пула при
+    первом запросе и возвращается в него при закрытии, поэтому
+    CONN_MAX_AGE для пула должен быть 0.
+    """
+
+    creation_class = DatabaseCreation
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.health_check_done = False
+        self.pool = None
+
+    def get_new_connection(self, conn_params):
+        options = self.settings_dict.get('POOL')
+        if options is None:
+            return super().get_new_connection(conn_params)
+        self.pool = get_pool(self.alias, conn_params, options)
+        return self.pool.checkout(
+            lambda: super(DatabaseWrapper, self).get_new_connection(
+                conn_params
+            )
+        )
+
+    def _close(self):
+        if self.pool is None or self.connection is None:
+            super()._close()
+        else:
+            with self.wrap_database_errors:
+                self.pool.checkin(self.connection)
+
+    def connect(self):
+        # Новое соединение не проверяется; флаг ставится до connect(),
+        # потому что тот сам вызывает ensure_connection().
+        self.health_check_done = True
+        super().connect()
+
+    def ensure_connection(self):
+        if (
+            self.connection is not None and not self.health_check_done
+            and self.settings_dict.get('CONN_HEALTH_CHECKS')
+        ):
+            if not self.is_usable():
+                self.close()
+            self.health_check_done = True
+        super().ensure_connection()
+
+    def close_if_unusable_or_obsolete(self):
+        super().close_if_unusable_or_obsolete()
+        self.health_check_done = False
@@ -0,0 +1,12 @@
+from django.db.backends.postgresql import creation
+
+
+class DatabaseCreation(creation.DatabaseCreation):
+
+    def _destroy_test_db(self, test_database_name, verbosity):
+        # Свободные соединения пула держат сессии в тестовой базе,
+        # и DROP DATABASE с ними не пройдёт.
+        from .base import close_pools
+
+        close_pools()
+        super()._destroy_test_db(test_database_name, verbosity)
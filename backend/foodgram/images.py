@@ -0,0 +1,221 @@
+import base64
+import binascii
+import hashlib
+import logging
+import os
+import posixpath
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile, File
+from django.core.files.storage import FileSystemStorage, default_storage
+from django.core.files.uploadedfile import TemporaryUploadedFile
+from django.db import transaction
+from PIL import Image, UnidentifiedImageError
+
+logger = logging.getLogger(__name__)
+
+# Кратно 4, чтобы каждый кусок декодировался независимо.
+DECODE_CHUNK_SIZE = 64 * 1024
+HASHED_NAME_RE = re.compile(r'^[0-9a-f]{64}\.\w+$')
+THUMBNAIL_FORMATS = (('jpg', 'JPEG'), ('webp', 'WEBP'))
+# Сколько секунд помнить, что миниатюр ещё нет: их вот-вот создадут.
+THUMBNAIL_MISS_TIMEOUT = 5
+
+pending = set()
+pending_lock = threading.Lock()
+# Имя изображения → (есть ли миниатюры, до какого момента это верно):
+# сериализация не проверяет файлы на диске для каждого изображения.
+thumbnails_ready = {}
+executor = ThreadPoolExecutor(
+    max_workers=max(settings.IMAGE_THUMBNAIL_WORKERS, 1),
+    thread_name_prefix='thumbnails',
+)
+
+
+def decode_data_uri(data):
+    """
+    Декодирует изображение из data URI во временный файл по частям,
+    попутно считая sha256. Файл называется по хешу содержимого
+    и помечается атрибутом content_sha256 для DedupFileSystemStorage.
+    """
+    header, _, payload = data.partition(';base64,')
+    ext = re.sub(r'\W', '', header.split('/')[-1]) or 'img'
+    if any(char in payload for char in ' \r\n'):
+        payload = ''.join(payload.split())
+    file = TemporaryUploadedFile(
+        'upload.' + ext, header[len('data:'):], 0, None
+    )
+    digest = hashlib.sha256()
+    try:
+        for start in range(0, len(payload), DECODE_CHUNK_SIZE):
+            chunk = base64.b64decode(
+                payload[start:start + DECODE_CHUNK_SIZE], validate=True
+            )
+            digest.update(chunk)
+            file.write(chunk)
+    except binascii.Error:
+        file.close()
+        raise
+    file.size = file.tell()
+    file.seek(0)
+    file.content_sha256 = digest.hexdigest()
+    file.name = f'{file.content_sha256}.{ext}'
+    return file
+
+
+class DedupFileSystemStorage(FileSystemStorage):
+    """
+    Файлы с хешем, посчитанным сервером (content_sha256), сохраняются
+    под именем <sha256>.<ext> один раз: одинаковые загрузки указывают
+    на один файл. Имя от клиента дедупликации не включает, а похожее
+    на хеш переименовывается, чтобы не занять чужое имя.
+    """
+
+    def save(self, name, content, max_length=None):
+        directory, filename = posixpath.split(name)
+        ext = os.path.splitext(filename)[1]
+        digest = getattr(content, 'content_sha256', None)
+        if digest is None:
+            if HASHED_NAME_RE.match(filename):
+                name = posixpath.join(directory, 'upload' + ext)
+            return super().save(name, content, max_length)
+        name = posixpath.join(directory, digest + ext)
+        if self.exists(name):
+            # Свежая дата изменения: delete_unused_images не удалит файл,
+            # на который вот-вот появится ссылка.
+            os.utime(self.path(name))
+        else:
+            # Запись под временным именем и атомарное переименование:
+            # параллельная загрузка того же файла не создаст копию.
+            part = super().save(
+                name + '.part', File(content.file), max_length
+            )
+            os.replace(self.path(part), self.path(name))
+        return name
+
+
+def get_thumbnail_name(name, width, ext):
+    directory, filename = posixpath.split(name)
+    stem = os.path.splitext(filename)[0]
+    return posixpath.join(directory, 'thumbs', f'{stem}_{width}.{ext}')
+
+
+def get_thumbnails(image):
+    """
+    URL миниатюр: JPEG наименьшей ширины и srcset из WebP.
+    Пока миниатюры не готовы, возвращает None.
+    """
+    if not image:
+        return None
+    return get_thumbnails_by_name(image.name)
+
+
+def get_thumbnails_by_name(name):
+    """То же, что get_thumbnails, по имени файла в хранилище."""
+    if not name or not has_thumbnails(name):
+        return None
+    widths = settings.IMAGE_THUMBNAIL_WIDTHS
+    return {
+        'thumb': default_storage.url(
+            get_thumbnail_name(name, widths[0], 'jpg')
+        ),
+        'srcset': ', '.join(
+            default_storage.url(get_thumbnail_name(name, width, 'webp'))
+            + f' {width}w'
+            for width in widths
+        ),
+    }
+
+
+def has_thumbnails(name):
+    """
+    Есть ли последняя миниатюра изображения. Ответ хранится в памяти
+    процесса IMAGE_THUMBNAIL_CACHE_TIMEOUT секунд, отрицательный —
+    THUMBNAIL_MISS_TIMEOUT.
+    """
+    now = time.monotonic()
+    entry = thumbnails_ready.get(name)
+    if entry is not None and entry[1] > now:
+        return entry[0]
+    widths = settings.IMAGE_THUMBNAIL_WIDTHS
+    ready = default_storage.exists(
+        get_thumbnail_name(name, widths[-1], THUMBNAIL_FORMATS[-1][0])
+    )
+    remember_thumbnails(name, ready, now)
+    return ready
+
+
+def remember_thumbnails(name, ready, now=None):
+    if now is None:
+        now = time.monotonic()
+    timeout = (
+        settings.IMAGE_THUMBNAIL_CACHE_TIMEOUT if ready
+        else THUMBNAIL_MISS_TIMEOUT
+    )
+    if len(thumbnails_ready) >= settings.IMAGE_THUMBNAIL_CACHE_SIZE:
+        thumbnails_ready.clear()
+    thumbnails_ready[name] = (ready, now + timeout)
+
+
+def generate_thumbnails(name):
+    """Создаёт недостающие миниатюры изображения, возвращает их число."""
+    targets = [
+        (width, ext, image_format)
+        for width in settings.IMAGE_THUMBNAIL_WIDTHS
+        for ext, image_format in THUMBNAIL_FORMATS
+        if not default_storage.exists(get_thumbnail_name(name, width, ext))
+    ]
+    if not targets:
+        remember_thumbnails(name, True)
+        return 0
+    with default_storage.open(name) as file:
+        original = Image.open(file)
+        original.load()
+    if original.mode not in ('RGB', 'L'):
+        original = original.convert('RGB')
+    for width, ext, image_format in targets:
+        thumbnail = original.copy()
+        thumbnail.thumbnail((width, width * 4))
+        buffer = BytesIO()
+        thumbnail.save(buffer, image_format, quality=80)
+        default_storage.save(
+            get_thumbnail_name(name, width, ext),
+            ContentFile(buffer.getvalue()),
+        )
+    remember_thumbnails(name, True)
+    return len(targets)
+
+
+def _run(name, callback):
+    with pending_lock:
+        if name in pending:
+            return
+        pending.add(name)
+    try:
+        if generate_thumbnails(name) and callback is not None:
+            callback()
+    except FileNotFoundError:
+        logger.warning('Файл изображения не найден: %s', name)
+    except (
+        OSError, UnidentifiedImageError, Image.DecompressionBombError
+    ):
+        logger.exception('Не удалось создать миниатюры для %s', name)
+    finally:
+        with pending_lock:
+            pending.discard(name)
+
+
+def schedule_thumbnails(name, callback=None):
+    """
+    После коммита ставит генерацию миниатюр в пул потоков. callback
+    вызывается, когда появились новые миниатюры.
+    """
+    if settings.IMAGE_THUMBNAIL_WORKERS:
+        transaction.on_commit(lambda: executor.submit(_run, name, callback))
+    else:
+        transaction.on_commit(lambda: _run(name, callback))
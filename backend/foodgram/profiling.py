@@ -0,0 +1,262 @@
+import asyncio
+import logging
+import threading
+import time
+from bisect import bisect_left
+from contextvars import ContextVar
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.test.runner import DiscoverRunner
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+from rest_framework.views import APIView
+
+logger = logging.getLogger(__name__)
+
+MS_BUCKETS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+QUERY_BUCKETS = (1, 2, 3, 5, 8, 13, 21, 34, 55, 89)
+SIZE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+current_profile = ContextVar('current_profile', default=None)
+
+
+class QueryBudgetExceeded(AssertionError):
+    pass
+
+
+class RequestProfile:
+    __slots__ = ('queries', 'db_time', 'serializer_time', 'serializer_depth')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_time = 0.0
+        self.serializer_time = 0.0
+        self.serializer_depth = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries += 1
+            self.db_time += time.perf_counter() - start
+
+
+def profile_query(execute, sql, params, many, context):
+    """
+    Обёртка выполнения запросов всех соединений. Профиль берётся из
+    контекста, поэтому запросы учитываются в любом потоке, куда
+    sync_to_async перенёс обработку запроса.
+    """
+    profile = current_profile.get()
+    if profile is None:
+        return execute(sql, params, many, context)
+    return profile(execute, sql, params, many, context)
+
+
+def install_query_profiler(sender, connection, **kwargs):
+    if profile_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(profile_query)
+
+
+connection_created.connect(install_query_profiler)
+
+
+def add_serializer_time(seconds):
+    """Учитывает время сериализации, сделанной без сериализаторов DRF."""
+    profile = current_profile.get()
+    if profile is not None:
+        profile.serializer_time += seconds
+
+
+class ProfiledSerializerMixin:
+    """Учитывает время to_representation во времени сериализации запроса."""
+
+    def to_representation(self, instance):
+        profile = current_profile.get()
+        if profile is None:
+            return super().to_representation(instance)
+        profile.serializer_depth += 1
+        start = time.perf_counter()
+        try:
+            return super().to_representation(instance)
+        finally:
+            profile.serializer_depth -= 1
+            if not profile.serializer_depth:
+                profile.serializer_time += time.perf_counter() - start
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.count = 0
+        self.sum = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.count += 1
+        self.sum += value
+
+    def as_dict(self):
+        return {
+            'count': self.count,
+            'sum': round(self.sum, 3),
+            'buckets': dict(zip(
+                [str(bucket) for bucket in self.buckets] + ['+Inf'],
+                self.counts
+            )),
+        }
+
+
+class MetricsRegistry:
+    """
+    Гистограммы по представлениям и действиям. Другие подсистемы
+    добавляют свои счётчики через register_source().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._views = {}
+        self._sources = {}
+
+    def register_source(self, name, func):
+        self._sources[name] = func
+
+    def observe(self, view, profile, total_time, response_size):
+        with self._lock:
+            histograms = self._views.get(view)
+            if histograms is None:
+                histograms = self._views[view] = {
+                    'queries': Histogram(QUERY_BUCKETS),
+                    'db_ms': Histogram(MS_BUCKETS),
+                    'serializer_ms': Histogram(MS_BUCKETS),
+                    'total_ms': Histogram(MS_BUCKETS),
+                    'response_bytes': Histogram(SIZE_BUCKETS),
+                }
+            histograms['queries'].observe(profile.queries)
+            histograms['db_ms'].observe(profile.db_time * 1000)
+            histograms['serializer_ms'].observe(profile.serializer_time * 1000)
+            histograms['total_ms'].observe(total_time * 1000)
+            if response_size is not None:
+                histograms['response_bytes'].observe(response_size)
+
+    def snapshot(self):
+        with self._lock:
+            views = {
+                view: {
+                    name: histogram.as_dict()
+                    for name, histogram in histograms.items()
+                }
+                for view, histograms in self._views.items()
+            }
+        return {
+            'views': views,
+            **{name: func() for name, func in self._sources.items()},
+        }
+
+
+metrics = MetricsRegistry()
+
+
+def get_view_info(request):
+    """Имя представления, действие и бюджет запросов для запроса."""
+    match = request.resolver_match
+    if match is None:
+        return None, None
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name, None
+    actions = getattr(match.func, 'actions', None) or {}
+    action = actions.get(request.method.lower(), request.method.lower())
+    budget = getattr(view_class, 'query_budget', None) or {}
+    return f'{view_class.__name__}.{action}', budget.get(action)
+
+
+class QueryProfilingMiddleware:
+    """
+    Считает запросы к БД, время БД и сериализации для каждого запроса,
+    отдаёт их в заголовке Server-Timing (в режиме DEBUG или
+    сотрудникам) и копит гистограммы для
+    /api/_metrics/. Проверяет бюджет запросов представления.
+    Работает и под WSGI, и под ASGI.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            self._is_coroutine = asyncio.coroutines._is_coroutine
+
+    def __call__(self, request):
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.process(
+            request, response, profile, time.perf_counter() - start
+        )
+
+    async def __acall__(self, request):
+        profile = RequestProfile()
+        token = current_profile.set(profile)
+        start = time.perf_counter()
+        try:
+            response = await self.get_response(request)
+        finally:
+            current_profile.reset(token)
+        return self.process(
+            request, response, profile, time.perf_counter() - start
+        )
+
+    def process(self, request, response, profile, total_time):
+        if settings.SERVER_TIMING and (
+            settings.DEBUG or getattr(request, 'user', None) is not None
+            and request.user.is_staff
+        ):
+            response['Server-Timing'] = (
+                f'db;dur={profile.db_time * 1000:.1f};'
+                f'desc="{profile.queries} queries", '
+                f'serializer;dur={profile.serializer_time * 1000:.1f}, '
+                f'total;dur={total_time * 1000:.1f}'
+            )
+
+        view, budget = get_view_info(request)
+        if view is None:
+            return response
+        metrics.observe(
+            view, profile, total_time,
+            None if response.streaming else len(response.content)
+        )
+        if budget is not None and profile.queries > budget:
+            message = (
+                f'{view}: {profile.queries} запросов к БД '
+                f'при бюджете {budget} ({request.get_full_path()})'
+            )
+            if settings.QUERY_BUDGET_STRICT:
+                raise QueryBudgetExceeded(message)
+            logger.warning(message)
+        return response
+
+
+class QueryBudgetTestRunner(DiscoverRunner):
+    """Под тестами превышение бюджета запросов — ошибка."""
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        settings.QUERY_BUDGET_STRICT = True
+
+
+class MetricsView(APIView):
+    permission_classes = (IsAdminUser,)
+
+    def get(self, request):
+        return Response(metrics.snapshot())
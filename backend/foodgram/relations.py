@@ -0,0 +1,84 @@
+from django.db import connection
+
+# Postgres и SQLite 3.35+ поддерживают RETURNING в INSERT, UPDATE
+# и DELETE, поэтому каждая операция — один запрос без предварительных
+# проверок exists() и гонок между ними.
+
+
+def _columns(model, *fields):
+    quote = connection.ops.quote_name
+    return [quote(model._meta.get_field(field).column) for field in fields]
+
+
+def _placeholders(values):
+    return ', '.join(['%s'] * len(values))
+
+
+def add_links(model, owner_field, owner_id, target_field, target_ids):
+    """
+    Создаёт связи owner_id со всеми существующими объектами target_ids
+    запросом INSERT ... SELECT ... ON CONFLICT DO NOTHING.
+    Возвращает id объектов, для которых связь создана этим запросом.
+    """
+    if not target_ids:
+        return []
+    quote = connection.ops.quote_name
+    owner, target = _columns(model, owner_field, target_field)
+    related = model._meta.get_field(target_field).related_model._meta
+    pk = quote(related.pk.column)
+    sql = (
+        f'INSERT INTO {quote(model._meta.db_table)} ({owner}, {target}) '
+        f'SELECT %s, {pk} FROM {quote(related.db_table)} '
+        f'WHERE {pk} IN ({_placeholders(target_ids)}) '
+        f'ON CONFLICT DO NOTHING RETURNING {target}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [owner_id, *target_ids])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def remove_links(model, owner_field, owner_id, target_field, target_ids):
+    """
+    Удаляет связи owner_id с объектами target_ids одним DELETE.
+    Возвращает id объектов, связь с которыми была удалена.
+    """
+    if not target_ids:
+        return []
+    quote = connection.ops.quote_name
+    owner, target = _columns(model, owner_field, target_field)
+    sql = (
+        f'DELETE FROM {quote(model._meta.db_table)} '
+        f'WHERE {owner} = %s AND {target} IN ({_placeholders(target_ids)}) '
+        f'RETURNING {target}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [owner_id, *target_ids])
+        return [row[0] for row in cursor.fetchall()]
+
+
+def update_counter(model, field, pks, delta, returning=()):
+    """
+    Прибавляет delta к счётчику field у объектов pks, не опуская его
+    ниже нуля. Возвращает экземпляры model, у которых загружены
+    первичный ключ и поля returning — тем же запросом.
+    """
+    if not pks:
+        return []
+    quote = connection.ops.quote_name
+    (column,) = _columns(model, field)
+    # from_db ждёт значения в порядке полей модели.
+    fields = [
+        model_field.attname for model_field in model._meta.concrete_fields
+        if model_field.primary_key or model_field.attname in returning
+    ]
+    sql = (
+        f'UPDATE {quote(model._meta.db_table)} '
+        f'SET {column} = CASE WHEN {column} + %s > 0 '
+        f'THEN {column} + %s ELSE 0 END '
+        f'WHERE {quote(model._meta.pk.column)} IN ({_placeholders(pks)}) '
+        f'RETURNING {", ".join(_columns(model, *fields))}'
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, [delta, delta, *pks])
+        rows = cursor.fetchall()
+    return [model.from_db(connection.alias, fields, row) for row in rows]
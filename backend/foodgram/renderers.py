@@ -0,0 +1,80 @@
+from collections import OrderedDict
+
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.serializer_helpers import ReturnDict, ReturnList
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+# JSON с этими символами не является подмножеством JavaScript,
+# поэтому DRF всегда экранирует их. В UTF-8 они занимают три байта.
+LINE_SEPARATORS = (
+    ('\u2028'.encode(), b'\\u2028'),
+    ('\u2029'.encode(), b'\\u2029'),
+)
+
+MAPPINGS = {dict, OrderedDict, ReturnDict}
+SEQUENCES = {list, tuple, ReturnList}
+
+
+def has_unsafe_floats(data):
+    """
+    Есть ли в данных числа, которые orjson записывает не так, как json:
+    с экспонентой (1e16 против 1e+16) или NaN и бесконечность (orjson
+    пишет null, DRF с allow_nan=False выдаёт ошибку). Такие числа
+    Python печатает с экспонентой, если модуль не меньше 1e16 или
+    меньше 1e-4; для NaN оба сравнения ложны.
+    """
+    stack = [data]
+    pop, push = stack.pop, stack.extend
+    while stack:
+        value = pop()
+        kind = type(value)
+        if kind in MAPPINGS:
+            push(value.values())
+        elif kind in SEQUENCES:
+            push(value)
+        elif kind is float and value and not 1e-4 <= abs(value) < 1e16:
+            return True
+    return False
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSONRenderer на orjson: ответ собирается сразу в bytes, без
+    промежуточной строки и её перекодирования. Вывод совпадает
+    с JSONRenderer. Без orjson, с отступами (браузерный API, ?indent=),
+    для значений, которые orjson не поддерживает (целые больше 64 бит),
+    и для чисел, которые он пишет иначе (has_unsafe_floats), работает
+    стандартный JSONRenderer.
+    """
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None or data is None
+            or self.ensure_ascii or not self.compact
+            or self.get_indent(
+                accepted_media_type, renderer_context or {}
+            ) is not None
+            or has_unsafe_floats(data)
+        ):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            ret = orjson.dumps(
+                data,
+                default=self.encoder_class().default,
+                option=(
+                    orjson.OPT_NON_STR_KEYS | orjson.OPT_PASSTHROUGH_DATETIME
+                ),
+            )
+        except orjson.JSONEncodeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        for char, escaped in LINE_SEPARATORS:
+            ret = ret.replace(char, escaped)
+        return ret
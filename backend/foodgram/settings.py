@@ -25,6 +25,7 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'foodgram.profiling.QueryProfilingMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,6 +59,10 @@ DATABASES = {
     'default': {
         'ENGINE': 'django.db.backends.sqlite3',
         'NAME': BASE_DIR / 'db.sqlite3',
+        'OPTIONS': {'timeout': 20},
+        # Тестовая база в файле, а не в памяти: в общем кеше SQLite
+        # параллельные записи из потоков не ждут блокировку, а падают.
+        'TEST': {'NAME': BASE_DIR / 'test_db.sqlite3'},
     }
 }
 
@@ -68,17 +73,59 @@ DB_NAME = os.getenv('DB_NAME')
 DB_HOST = os.getenv('DB_HOST')
 DB_PORT = os.getenv('DB_PORT')
 
+# Постоянные соединения: сколько секунд держать соединение между
+# запросами (0 — закрывать после каждого). С DB_POOL=True соединения
+# возвращаются в пул процесса, и CONN_MAX_AGE не используется.
+DB_CONN_MAX_AGE = int(os.getenv('DB_CONN_MAX_AGE', 60))
+DB_HEALTH_CHECKS = os.getenv('DB_HEALTH_CHECKS', 'True') == 'True'
+DB_POOL = os.getenv('DB_POOL', 'False') == 'True'
+
 if all([POSTGRES_DB, POSTGRES_USER, POSTGRES_PASSWORD, DB_HOST, DB_PORT]):
     DATABASES = {
         'default': {
-            'ENGINE': 'django.db.backends.postgresql',
+            'ENGINE': 'foodgram.db.postgresql',
             'NAME': POSTGRES_DB,
             'USER': POSTGRES_USER,
             'PASSWORD': POSTGRES_PASSWORD,
             'HOST': DB_HOST,
             'PORT': DB_PORT,
+            'CONN_MAX_AGE': 0 if DB_POOL else DB_CONN_MAX_AGE,
+            'CONN_HEALTH_CHECKS': DB_HEALTH_CHECKS,
+        }
+    }
+    if DB_POOL:
+        DATABASES['default']['POOL'] = {
+            'MAX_SIZE': int(os.getenv('DB_POOL_MAX_SIZE', 10)),
+            'MAX_OVERFLOW': int(os.getenv('DB_POOL_MAX_OVERFLOW', 5)),
+            'TIMEOUT': float(os.getenv('DB_POOL_TIMEOUT', 10)),
+            'IDLE_TIMEOUT': float(os.getenv('DB_POOL_IDLE_TIMEOUT', 300)),
+            'HEALTH_CHECK': DB_HEALTH_CHECKS,
         }
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', 'foodgram'),
     }
+}
+
+RECIPE_RESPONSE_CACHE_TIMEOUT = int(
+    os.getenv('RECIPE_RESPONSE_CACHE_TIMEOUT', 300)
+)
+
+# Кеш токенов авторизации: LRU в памяти процесса и общий кеш.
+AUTH_TOKEN_CACHE_SIZE = int(os.getenv('AUTH_TOKEN_CACHE_SIZE', 10000))
+AUTH_TOKEN_CACHE_TIMEOUT = int(os.getenv('AUTH_TOKEN_CACHE_TIMEOUT', 300))
+AUTH_TOKEN_LOCAL_TIMEOUT = int(os.getenv('AUTH_TOKEN_LOCAL_TIMEOUT', 10))
+
+PAGINATION_COUNT_CACHE_TIMEOUT = int(
+    os.getenv('PAGINATION_COUNT_CACHE_TIMEOUT', 30)
+)
+PAGINATION_ESTIMATE_THRESHOLD = int(
+    os.getenv('PAGINATION_ESTIMATE_THRESHOLD', 100000)
+)
 
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -111,6 +158,78 @@ STATIC_ROOT = os.path.join(BASE_DIR, 'static')
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+DEFAULT_FILE_STORAGE = 'foodgram.images.DedupFileSystemStorage'
+IMAGE_THUMBNAIL_WIDTHS = (320, 640)
+IMAGE_THUMBNAIL_WORKERS = int(os.getenv('IMAGE_THUMBNAIL_WORKERS', 2))
+# Сколько изображений и сколько секунд помнить, что миниатюры готовы.
+IMAGE_THUMBNAIL_CACHE_SIZE = int(
+    os.getenv('IMAGE_THUMBNAIL_CACHE_SIZE', 100000)
+)
+IMAGE_THUMBNAIL_CACHE_TIMEOUT = int(
+    os.getenv('IMAGE_THUMBNAIL_CACHE_TIMEOUT', 300)
+)
+
+# Под ASGI (foodgram.asgi включает ASYNC_VIEWS) частые запросы на чтение
+# выполняются в пуле из ASYNC_VIEW_THREADS потоков. С DB_POOL=True размер
+# пула соединений должен быть не меньше числа потоков.
+ASYNC_VIEWS = os.getenv('ASYNC_VIEWS', 'False') == 'True'
+ASYNC_VIEW_THREADS = int(os.getenv('ASYNC_VIEW_THREADS', 8))
+
+SERVER_TIMING = os.getenv('SERVER_TIMING', 'True') == 'True'
+QUERY_BUDGET_STRICT = os.getenv('QUERY_BUDGET_STRICT', 'False') == 'True'
+# Тесты всегда проверяют бюджеты запросов.
+TEST_RUNNER = 'foodgram.profiling.QueryBudgetTestRunner'
+
+# list и retrieve рецептов без ModelSerializer (recipes.fastpath).
+RECIPE_FASTPATH = os.getenv('RECIPE_FASTPATH', 'True') == 'True'
+
+INGREDIENT_AUTOCOMPLETE_INDEX = (
+    os.getenv('INGREDIENT_AUTOCOMPLETE_INDEX', 'True') == 'True'
+)
+INGREDIENT_AUTOCOMPLETE_LIMIT = int(
+    os.getenv('INGREDIENT_AUTOCOMPLETE_LIMIT', 50)
+)
+INGREDIENT_INDEX_TIMEOUT = int(os.getenv('INGREDIENT_INDEX_TIMEOUT', 300))
+
+PANTRY_MAX_RESULTS = int(os.getenv('PANTRY_MAX_RESULTS', 500))
+# Сколько секунд хранить отметки об удалённых рецептах. Процесс, который
+# не синхронизировал индекс дольше, строит его заново.
+PANTRY_DELETIONS_TIMEOUT = int(
+    os.getenv('PANTRY_DELETIONS_TIMEOUT', 24 * 60 * 60)
+)
+
+SIMILAR_RECIPES_TOP_K = int(os.getenv('SIMILAR_RECIPES_TOP_K', 20))
+RECOMMENDED_RECIPES_LIMIT = int(os.getenv('RECOMMENDED_RECIPES_LIMIT', 100))
+
+# Рецепты авторов с большим числом подписчиков не раскладываются
+# по лентам при публикации, а подмешиваются при чтении.
+FEED_FANOUT_MAX_SUBSCRIBERS = int(
+    os.getenv('FEED_FANOUT_MAX_SUBSCRIBERS', 1000)
+)
+FEED_MAX_ENTRIES = int(os.getenv('FEED_MAX_ENTRIES', 500))
+
+# Короткие ссылки на рецепты /s/<code>/.
+SHORT_LINK_CODE_LENGTH = int(os.getenv('SHORT_LINK_CODE_LENGTH', 6))
+SHORT_LINK_CACHE_TIMEOUT = int(
+    os.getenv('SHORT_LINK_CACHE_TIMEOUT', 24 * 60 * 60)
+)
+SHORT_LINK_LOCAL_CACHE_SIZE = int(
+    os.getenv('SHORT_LINK_LOCAL_CACHE_SIZE', 100000)
+)
+# Сколько секунд код удалённого рецепта может открываться в других
+# процессах.
+SHORT_LINK_LOCAL_TIMEOUT = int(os.getenv('SHORT_LINK_LOCAL_TIMEOUT', 60))
+SHORT_LINK_HIT_COUNTERS = (
+    os.getenv('SHORT_LINK_HIT_COUNTERS', 'True') == 'True'
+)
+SHORT_LINK_HITS_BATCH = int(os.getenv('SHORT_LINK_HITS_BATCH', 1000))
+SHORT_LINK_HITS_INTERVAL = int(os.getenv('SHORT_LINK_HITS_INTERVAL', 10))
+
+SHOPPING_LIST_PDF_FONT = os.getenv(
+    'SHOPPING_LIST_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
 AUTH_USER_MODEL = 'users.User'
@@ -120,7 +239,16 @@ REST_FRAMEWORK = {
         'rest_framework.permissions.AllowAny',
     ],
     'DEFAULT_AUTHENTICATION_CLASSES': [
-        'rest_framework.authentication.TokenAuthentication',
+        'users.authentication.CachedTokenAuthentication',
+    ],
+    'DEFAULT_RENDERER_CLASSES': [
+        'foodgram.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'foodgram.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
     ],
     'DEFAULT_PAGINATION_CLASS': 'foodgram.pagination.CustomPagination',
     'PAGE_SIZE': 6,
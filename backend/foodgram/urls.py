@@ -1,8 +1,16 @@
 from django.contrib import admin
-from django.urls import include, path
+from django.urls import include, path, re_path
+from recipes.views import short_link_redirect
+
+from .profiling import MetricsView
 
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('api/_metrics/', MetricsView.as_view(), name='metrics'),
     path('api/', include('users.urls')),
     path('api/', include('recipes.urls')),
+    re_path(
+        r'^s/(?P<code>[0-9A-Za-z]{1,16})/$', short_link_redirect,
+        name='short-link-redirect',
+    ),
 ]
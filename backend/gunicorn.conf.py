@@ -0,0 +1,13 @@
+import os
+
+# SERVER_MODE=asgi: uvicorn-воркеры и асинхронные представления для
+# частых запросов на чтение (см. foodgram.asynchronous).
+if os.getenv('SERVER_MODE') == 'asgi':
+    wsgi_app = 'foodgram.asgi:application'
+    worker_class = 'uvicorn.workers.UvicornWorker'
+else:
+    wsgi_app = 'foodgram.wsgi:application'
+
+bind = '0:8000'
+workers = int(os.getenv('GUNICORN_WORKERS', 1))
+threads = int(os.getenv('GUNICORN_THREADS', 1))
@@ -1,7 +1,7 @@
 from django.contrib import admin
 
 from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart)
+                     ShoppingCart, ShortLink)
 
 
 class RecipeIngredientInline(admin.TabularInline):
@@ -13,18 +13,14 @@ class RecipeIngredientInline(admin.TabularInline):
 @admin.register(Recipe)
 class RecipeAdmin(admin.ModelAdmin):
     list_display = (
-        'id', 'name', 'author', 'favorites_count'
+        'id', 'name', 'author', 'favorites_count', 'in_carts_count'
     )
     search_fields = ('name', 'author__username')
     list_filter = ('author', 'name')
     inlines = (RecipeIngredientInline,)
+    readonly_fields = ('favorites_count', 'in_carts_count')
     empty_value_display = '-пусто-'
 
-    def favorites_count(self, obj):
-        return obj.favorites.count()
-
-    favorites_count.short_description = 'В избранном'
-
 
 @admin.register(Ingredient)
 class IngredientAdmin(admin.ModelAdmin):
@@ -41,3 +37,11 @@ class ShoppingCartAdmin(admin.ModelAdmin):
 @admin.register(Favorite)
 class FavoriteAdmin(admin.ModelAdmin):
     list_display = ('user', 'recipe')
+
+
+@admin.register(ShortLink)
+class ShortLinkAdmin(admin.ModelAdmin):
+    list_display = ('code', 'recipe', 'hits')
+    search_fields = ('code', 'recipe__name')
+    readonly_fields = ('code', 'hits')
+    raw_id_fields = ('recipe',)
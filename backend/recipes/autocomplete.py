@@ -0,0 +1,101 @@
+import threading
+import time
+from bisect import bisect_left
+
+from django.conf import settings
+from django.db.models import Count, Max
+
+from .cache import get_generation, rotate_generation
+from .models import Ingredient
+
+GENERATION_CACHE_KEY = 'recipes:ingredient-index:generation'
+
+
+def normalize(value):
+    return value.casefold().replace('ё', 'е')
+
+
+class IngredientIndex:
+    """
+    Отсортированный по нормализованному названию индекс ингредиентов
+    в памяти процесса. Перестраивается, когда меняется поколение в кеше
+    или число и max(id) ингредиентов в БД: load_ingredients работает
+    в отдельном процессе и до LocMemCache воркеров не достаёт.
+    Переименования, о которых процесс не узнал, живут не дольше
+    INGREDIENT_INDEX_TIMEOUT.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._stamp = None
+        self._expires = 0
+        self._snapshot = ([], [])
+
+    def invalidate(self):
+        rotate_generation(GENERATION_CACHE_KEY)
+
+    def search(self, query, limit):
+        """
+        Сначала точные совпадения и совпадения по началу названия
+        (в алфавитном порядке), затем совпадения по подстроке.
+        """
+        query = normalize(query.strip())
+        if not query or limit <= 0:
+            return []
+        keys, items = self._get_snapshot()
+
+        start = bisect_left(keys, query)
+        end = start
+        while (
+            end < len(keys)
+            and end - start < limit
+            and keys[end].startswith(query)
+        ):
+            end += 1
+        results = items[start:end]
+
+        if len(results) < limit:
+            for key, item in zip(keys, items):
+                if query in key and not key.startswith(query):
+                    results.append(item)
+                    if len(results) == limit:
+                        break
+        return results
+
+    def _get_snapshot(self):
+        stamp = self._get_stamp()
+        if stamp != self._stamp or time.monotonic() >= self._expires:
+            with self._lock:
+                if stamp != self._stamp or time.monotonic() >= self._expires:
+                    self._build(stamp)
+        return self._snapshot
+
+    def _get_stamp(self):
+        stats = Ingredient.objects.aggregate(
+            count=Count('id'), max_id=Max('id')
+        )
+        return (
+            get_generation(GENERATION_CACHE_KEY),
+            stats['count'],
+            stats['max_id'],
+        )
+
+    def _build(self, stamp):
+        rows = sorted(
+            (normalize(name), name, measurement_unit, pk)
+            for pk, name, measurement_unit in Ingredient.objects.values_list(
+                'id', 'name', 'measurement_unit'
+            ).iterator()
+        )
+        self._snapshot = (
+            [row[0] for row in rows],
+            [
+                {'id': pk, 'name': name, 'measurement_unit': unit}
+                for _, name, unit, pk in rows
+            ],
+        )
+        self._stamp = stamp
+        self._expires = time.monotonic() + settings.INGREDIENT_INDEX_TIMEOUT
+
+
+ingredient_index = IngredientIndex()
@@ -0,0 +1,270 @@
+import binascii
+import json
+import posixpath
+from collections import Counter
+
+from django.core.exceptions import SuspiciousFileOperation
+from django.core.files.storage import default_storage
+from django.db import DatabaseError, connection, transaction
+from django.db.models import F
+from foodgram.images import decode_data_uri, schedule_thumbnails
+from PIL import Image, UnidentifiedImageError
+from rest_framework.parsers import BaseParser
+from users.models import User
+
+from .cache import LIST_GENERATION_KEY, rotate_generation
+from .feed import fan_out
+from .models import MAX_VALUE, MIN_VALUE, Ingredient, Recipe, RecipeIngredient
+from .pantry import mark_recipes_changed
+from .search import update_search_index
+from .shopping_list import chunked
+
+NAME_MAX_LENGTH = Recipe._meta.get_field('name').max_length
+IMAGE_DIRECTORY = Recipe._meta.get_field('image').upload_to
+EXPORT_CHUNK_SIZE = 1000
+
+
+def iter_ndjson(lines):
+    """Номер строки и объект для каждой непустой строки NDJSON."""
+    for number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if line.strip():
+            try:
+                yield number, json.loads(line)
+            except ValueError:
+                yield number, None
+
+
+class NDJSONParser(BaseParser):
+    media_type = 'application/x-ndjson'
+
+    def parse(self, stream, media_type=None, parser_context=None):
+        return iter_ndjson(stream)
+
+
+def _check_amount(value):
+    return (
+        isinstance(value, int) and not isinstance(value, bool)
+        and MIN_VALUE <= value <= MAX_VALUE
+    )
+
+
+def _check_image_name(name):
+    """
+    Имя уже загруженного изображения: нормализованный относительный
+    путь внутри IMAGE_DIRECTORY, файл с которым есть в хранилище.
+    """
+    if (
+        '\\' in name or posixpath.normpath(name) != name
+        or not name.startswith(IMAGE_DIRECTORY)
+        or len(name) == len(IMAGE_DIRECTORY)
+    ):
+        return False
+    try:
+        return default_storage.exists(name)
+    except SuspiciousFileOperation:
+        return False
+
+
+class RecipeImporter:
+    """
+    Пакетный импорт рецептов. Ингредиенты и авторы (email в поле
+    author, иначе default_author) проверяются по заранее загруженным
+    множествам, строки с ошибками пропускаются и попадают в errors,
+    остальные сохраняются пачками bulk_create.
+    """
+
+    def __init__(self, default_author=None, batch_size=1000):
+        self.default_author = default_author
+        self.batch_size = batch_size
+        self.ingredient_ids = set(
+            Ingredient.objects.values_list('id', flat=True)
+        )
+        self.authors = dict(User.objects.values_list('email', 'id'))
+        self.created = 0
+        self.errors = []
+
+    def run(self, rows):
+        for batch in chunked(self.validate_rows(rows), self.batch_size):
+            self.save_batch(batch)
+        if self.created:
+            rotate_generation(LIST_GENERATION_KEY)
+        return self.created
+
+    def validate_rows(self, rows):
+        for number, row in rows:
+            errors = {} if isinstance(row, dict) else {
+                'non_field_errors': 'Ожидается JSON-объект.'
+            }
+            if not errors:
+                recipe, ingredients = self.validate(row, errors)
+            if errors:
+                self.errors.append({'line': number, 'errors': errors})
+                continue
+            yield number, recipe, ingredients
+
+    def validate(self, row, errors):
+        if 'author' not in row and self.default_author is not None:
+            author_id = self.default_author.pk
+        else:
+            author_id = self.authors.get(row.get('author'))
+            if author_id is None:
+                errors['author'] = 'Автор не найден.'
+
+        name = row.get('name')
+        if not isinstance(name, str) or not name.strip():
+            errors['name'] = 'Обязательное поле.'
+        elif len(name) > NAME_MAX_LENGTH:
+            errors['name'] = f'Не более {NAME_MAX_LENGTH} символов.'
+        text = row.get('text')
+        if not isinstance(text, str) or not text.strip():
+            errors['text'] = 'Обязательное поле.'
+        if not _check_amount(row.get('cooking_time')):
+            errors['cooking_time'] = (
+                f'Целое число от {MIN_VALUE} до {MAX_VALUE}.'
+            )
+        image = row.get('image')
+        if not isinstance(image, str) or not image:
+            errors['image'] = 'Обязательное поле.'
+        elif not image.startswith('data:image') and not _check_image_name(
+            image
+        ):
+            errors['image'] = (
+                'Ожидается data URI или имя файла в '
+                f'{IMAGE_DIRECTORY}, уже загруженного в хранилище.'
+            )
+
+        ingredients = self.validate_ingredients(row.get('ingredients'), errors)
+        if errors:
+            return None, None
+        recipe = Recipe(
+            author_id=author_id,
+            name=name,
+            text=text,
+            cooking_time=row['cooking_time'],
+            image=image,
+        )
+        if image.startswith('data:image'):
+            try:
+                file = decode_data_uri(image)
+                Image.open(file).verify()
+            except (binascii.Error, OSError, UnidentifiedImageError):
+                errors['image'] = 'Некорректное изображение.'
+                return None, None
+            recipe.image.save(file.name, file, save=False)
+        return recipe, ingredients
+
+    def validate_ingredients(self, value, errors):
+        if not isinstance(value, list) or not value:
+            errors['ingredients'] = (
+                "Поле 'ingredients' не может быть пустым."
+            )
+            return None
+        ingredients = {}
+        for item in value:
+            if (
+                not isinstance(item, dict)
+                or item.get('id') not in self.ingredient_ids
+            ):
+                errors['ingredients'] = (
+                    'Один или несколько ингредиентов не существуют.'
+                )
+                return None
+            if item['id'] in ingredients:
+                errors['ingredients'] = 'Ингредиенты не должны повторяться.'
+                return None
+            if not _check_amount(item.get('amount')):
+                errors['ingredients'] = (
+                    f'Количество: целое число от {MIN_VALUE} до {MAX_VALUE}.'
+                )
+                return None
+            ingredients[item['id']] = item['amount']
+        return ingredients
+
+    def save_batch(self, batch):
+        recipes = [recipe for _, recipe, _ in batch]
+        try:
+            with transaction.atomic():
+                self.insert_recipes(recipes)
+                RecipeIngredient.objects.bulk_create(
+                    (
+                        RecipeIngredient(
+                            recipe_id=recipe.pk,
+                            ingredient_id=ingredient_id,
+                            amount=amount,
+                        )
+                        for (_, recipe, ingredients) in batch
+                        for ingredient_id, amount in ingredients.items()
+                    ),
+                    batch_size=self.batch_size,
+                )
+                for author_id, count in Counter(
+                    recipe.author_id for recipe in recipes
+                ).items():
+                    User.objects.filter(pk=author_id).update(
+                        recipes_count=F('recipes_count') + count
+                    )
+        except DatabaseError as error:
+            self.errors.extend(
+                {'line': number, 'errors': {'non_field_errors': str(error)}}
+                for number, _, _ in batch
+            )
+            return
+        self.created += len(recipes)
+        recipe_ids = [recipe.pk for recipe in recipes]
+        transaction.on_commit(lambda: update_search_index(recipe_ids))
+        transaction.on_commit(lambda: mark_recipes_changed(*recipe_ids))
+        transaction.on_commit(lambda: fan_out(recipe_ids))
+        for name in {recipe.image.name for recipe in recipes}:
+            schedule_thumbnails(name)
+
+    def insert_recipes(self, recipes):
+        Recipe.objects.bulk_create(recipes, batch_size=self.batch_size)
+        if connection.features.can_return_rows_from_bulk_insert:
+            return
+        # SQLite не возвращает ключи из bulk_create, но внутри пишущей
+        # транзакции других вставок нет и ключи идут подряд.
+        last = Recipe.objects.order_by('-pk').values_list(
+            'pk', flat=True
+        ).first()
+        for pk, recipe in enumerate(recipes, last - len(recipes) + 1):
+            recipe.pk = pk
+
+
+def iter_export(queryset):
+    """Рецепты в виде словарей для NDJSON, пачками по ключу."""
+    queryset = queryset.order_by('pk').values(
+        'pk', 'author__email', 'name', 'text', 'cooking_time', 'image',
+        'pub_date'
+    )
+    last = 0
+    while True:
+        recipes = list(queryset.filter(pk__gt=last)[:EXPORT_CHUNK_SIZE])
+        if not recipes:
+            return
+        rows = RecipeIngredient.objects.filter(
+            recipe_id__in=[recipe['pk'] for recipe in recipes]
+        ).order_by().values_list('recipe_id', 'ingredient_id', 'amount')
+        ingredients = {}
+        for recipe_id, ingredient_id, amount in rows:
+            ingredients.setdefault(recipe_id, []).append(
+                {'id': ingredient_id, 'amount': amount}
+            )
+        for recipe in recipes:
+            yield {
+                'id': recipe['pk'],
+                'author': recipe['author__email'],
+                'name': recipe['name'],
+                'text': recipe['text'],
+                'cooking_time': recipe['cooking_time'],
+                'image': recipe['image'],
+                'pub_date': recipe['pub_date'].isoformat(),
+                'ingredients': ingredients.get(recipe['pk'], []),
+            }
+        last = recipes[-1]['pk']
+
+
+def render_ndjson(rows):
+    for row in rows:
+        yield json.dumps(row, ensure_ascii=False) + '\n'
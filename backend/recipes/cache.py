@@ -0,0 +1,150 @@
+import copy
+import hashlib
+import time
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models import Exists, OuterRef
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from django.utils.http import http_date, quote_etag
+from foodgram.caching import is_shared_cache
+from rest_framework.response import Response
+from users.models import Subscription
+
+from .models import Favorite, Recipe, ShoppingCart
+
+LIST_GENERATION_KEY = 'recipes:list:generation'
+RECIPE_VERSION_KEY = 'recipes:recipe:{}:version'
+USER_FILTERS = ('is_favorited', 'is_in_shopping_cart')
+
+
+def get_generation(key):
+    generation = cache.get(key)
+    if generation is not None:
+        return generation
+    cache.add(key, uuid.uuid4().hex, None)
+    return cache.get(key)
+
+
+def rotate_generation(key):
+    cache.set(key, uuid.uuid4().hex, None)
+
+
+def invalidate_recipes(*recipe_ids):
+    for recipe_id in recipe_ids:
+        rotate_generation(RECIPE_VERSION_KEY.format(recipe_id))
+    rotate_generation(LIST_GENERATION_KEY)
+
+
+def get_user_flags(user, recipe_ids):
+    return {
+        pk: flags for pk, *flags in Recipe.objects.filter(
+            pk__in=recipe_ids
+        ).annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        ).values_list(
+            'pk', 'is_favorited', 'is_in_shopping_cart', 'is_subscribed'
+        ).order_by()
+    }
+
+
+class RecipeResponseCacheMixin:
+    """
+    Кеширует ответы list и retrieve без флагов пользователя.
+    Авторизованным пользователям флаги is_favorited, is_in_shopping_cart
+    и is_subscribed подставляются поверх закешированного тела.
+    С кешем в памяти процесса (LocMemCache) выключен: инвалидация
+    до других процессов не дойдёт, и они отдавали бы устаревшие рецепты.
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not is_shared_cache() or request.user.is_authenticated and any(
+            request.query_params.get(name) in ('1', 'true', 'True')
+            for name in USER_FILTERS
+        ):
+            return super().list(request, *args, **kwargs)
+        generation = get_generation(LIST_GENERATION_KEY)
+        return self._get_cached_response(
+            f'recipes:list:{generation}', super().list, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        if not is_shared_cache():
+            return super().retrieve(request, *args, **kwargs)
+        version = get_generation(
+            RECIPE_VERSION_KEY.format(kwargs[self.lookup_field])
+        )
+        return self._get_cached_response(
+            f'recipes:detail:{version}', super().retrieve, *args, **kwargs
+        )
+
+    def _get_cached_response(self, prefix, view, *args, **kwargs):
+        request = self.request
+        key = prefix + ':' + hashlib.sha256(
+            (request.get_host() + request.get_full_path()).encode()
+        ).hexdigest()
+        entry = cache.get(key)
+        if entry is None:
+            response = view(request, *args, **kwargs)
+            if response.status_code != 200:
+                return response
+            entry = (self._strip_user_flags(response.data), time.time())
+            cache.set(key, entry, settings.RECIPE_RESPONSE_CACHE_TIMEOUT)
+            data = response.data
+        else:
+            data = entry[0]
+            if request.user.is_authenticated:
+                self._apply_user_flags(data)
+
+        last_modified = int(entry[1])
+        etag = hashlib.sha256(key.encode())
+        if request.user.is_authenticated:
+            for recipe in self._get_recipes(data):
+                etag.update(
+                    f'{recipe["id"]}:{recipe["is_favorited"]:d}'
+                    f'{recipe["is_in_shopping_cart"]:d}'
+                    f'{recipe["author"]["is_subscribed"]:d}'.encode()
+                )
+        etag = quote_etag(etag.hexdigest())
+
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = Response(data)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        patch_vary_headers(response, ('Authorization',))
+        return response
+
+    def _get_recipes(self, data):
+        return data['results'] if 'results' in data else [data]
+
+    def _strip_user_flags(self, data):
+        data = copy.deepcopy(data)
+        for recipe in self._get_recipes(data):
+            recipe['is_favorited'] = False
+            recipe['is_in_shopping_cart'] = False
+            recipe['author']['is_subscribed'] = False
+        return data
+
+    def _apply_user_flags(self, data):
+        recipes = self._get_recipes(data)
+        flags = get_user_flags(
+            self.request.user, [recipe['id'] for recipe in recipes]
+        )
+        for recipe in recipes:
+            (
+                recipe['is_favorited'],
+                recipe['is_in_shopping_cart'],
+                recipe['author']['is_subscribed'],
+            ) = flags.get(recipe['id'], (False, False, False))
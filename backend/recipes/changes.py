@@ -0,0 +1,55 @@
+import threading
+import weakref
+
+from django.db import transaction
+
+from .cache import invalidate_recipes
+from .models import Favorite
+from .pantry import mark_recipes_changed
+from .recommendations import mark_interactions_changed
+from .search import update_search_index
+
+_pending = threading.local()
+
+
+def recipes_changed(*recipe_ids):
+    """
+    Откладывает до коммита сброс кеша ответов, поискового индекса
+    и индекса по ингредиентам для изменённых или удалённых рецептов.
+    Все изменения транзакции обрабатываются одним вызовом.
+    """
+    flush = getattr(_pending, 'flush', None)
+    flush = flush() if flush is not None else None
+    if flush is not None:
+        flush.recipe_ids.update(recipe_ids)
+        return
+    flush = _Flush(recipe_ids)
+    # При откате транзакции или точки сохранения Django выбрасывает
+    # её отложенные вызовы, и слабая ссылка обнуляется вместе с ними.
+    _pending.flush = weakref.ref(flush)
+    transaction.on_commit(flush)
+
+
+class _Flush:
+    """Отложенная до коммита обработка изменённых рецептов."""
+
+    def __init__(self, recipe_ids):
+        self.recipe_ids = set(recipe_ids)
+
+    def __call__(self):
+        _pending.flush = None
+        recipe_ids = list(self.recipe_ids)
+        invalidate_recipes(*recipe_ids)
+        update_search_index(recipe_ids)
+        mark_recipes_changed(*recipe_ids)
+
+
+def interactions_changed(model, user_id, recipe_ids):
+    """
+    После коммита сбрасывает кеш рецептов, у которых изменилось число
+    добавлений в избранное, и пишет изменения в журнал рекомендаций.
+    """
+    pairs = [(user_id, recipe_id) for recipe_id in recipe_ids]
+    if model is Favorite:
+        transaction.on_commit(lambda: invalidate_recipes(*recipe_ids))
+    transaction.on_commit(lambda: mark_interactions_changed(*pairs))
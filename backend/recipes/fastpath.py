@@ -0,0 +1,161 @@
+import time
+from collections import defaultdict
+from functools import lru_cache
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.db.models import Exists, OuterRef
+from foodgram.images import get_thumbnails_by_name
+from foodgram.profiling import add_serializer_time
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+from users.models import Subscription
+
+from .models import Favorite, Recipe, RecipeIngredient, ShoppingCart
+
+RECIPE_FIELDS = (
+    'id', 'name', 'image', 'text', 'cooking_time', 'pub_date',
+    'author_id', 'author__email', 'author__username',
+    'author__first_name', 'author__last_name', 'author__avatar',
+)
+INGREDIENT_FIELDS = (
+    'recipe_id', 'ingredient_id', 'ingredient__name',
+    'ingredient__measurement_unit', 'amount',
+)
+
+
+def get_rows(queryset, user):
+    """
+    Строки рецептов вместе с автором и флагами текущего пользователя
+    одним запросом. Строки — именованные кортежи, поэтому навигация
+    по курсору берёт из них pub_date и id так же, как из моделей.
+    """
+    fields = RECIPE_FIELDS
+    if user.is_authenticated:
+        queryset = queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_subscribed=Exists(Subscription.objects.filter(
+                user=user, author=OuterRef('author')
+            )),
+        )
+        fields += ('is_favorited', 'is_in_shopping_cart', 'is_subscribed')
+    return queryset.values_list(*fields, named=True)
+
+
+def get_ingredients(recipe_ids):
+    """Ингредиенты рецептов в порядке RecipeIngredient.Meta.ordering."""
+    ingredients = defaultdict(list)
+    if not recipe_ids:
+        return ingredients
+    for recipe_id, pk, name, unit, amount in RecipeIngredient.objects.filter(
+        recipe_id__in=recipe_ids
+    ).values_list(*INGREDIENT_FIELDS):
+        ingredients[recipe_id].append({
+            'id': pk,
+            'name': name,
+            'measurement_unit': unit,
+            'amount': amount,
+        })
+    return ingredients
+
+
+def make_renderer(request):
+    """
+    Функция, превращающая строку get_rows в словарь того же вида, что
+    RecipeReadSerializer: те же ключи в том же порядке и те же URL
+    (аватар абсолютный, изображение рецепта — нет).
+    """
+    authenticated = request.user.is_authenticated
+    storage_url = default_storage.url
+    absolute_uri = request.build_absolute_uri
+    # Изображения и авторы на странице повторяются.
+    thumbnails = lru_cache(maxsize=None)(get_thumbnails_by_name)
+
+    @lru_cache(maxsize=None)
+    def avatar_urls(name):
+        if not name:
+            return None, None
+        avatar = absolute_uri(storage_url(name))
+        avatar_thumbnails = thumbnails(name)
+        if avatar_thumbnails is None:
+            return avatar, avatar
+        return avatar, absolute_uri(avatar_thumbnails['thumb'])
+
+    def render(row, ingredients):
+        image = storage_url(row.image) if row.image else None
+        image_thumbnails = thumbnails(row.image)
+        avatar, avatar_thumb = avatar_urls(row.author__avatar)
+        return {
+            'id': row.id,
+            'author': {
+                'email': row.author__email,
+                'id': row.author_id,
+                'username': row.author__username,
+                'first_name': row.author__first_name,
+                'last_name': row.author__last_name,
+                'is_subscribed': authenticated and row.is_subscribed,
+                'avatar': avatar,
+                'avatar_thumb': avatar_thumb,
+            },
+            'ingredients': ingredients.get(row.id, []),
+            'is_favorited': authenticated and row.is_favorited,
+            'is_in_shopping_cart': authenticated and row.is_in_shopping_cart,
+            'name': row.name,
+            'image': image,
+            'image_thumb': (
+                image if image_thumbnails is None
+                else image_thumbnails['thumb']
+            ),
+            'srcset': (
+                None if image_thumbnails is None
+                else image_thumbnails['srcset']
+            ),
+            'text': row.text,
+            'cooking_time': row.cooking_time,
+        }
+
+    return render
+
+
+def render_recipes(rows, request):
+    rows = list(rows)
+    ingredients = get_ingredients([row.id for row in rows])
+    start = time.perf_counter()
+    render = make_renderer(request)
+    try:
+        return [render(row, ingredients) for row in rows]
+    finally:
+        add_serializer_time(time.perf_counter() - start)
+
+
+class RecipeFastPathMixin:
+    """
+    list и retrieve рецептов без ModelSerializer: строки values_list
+    и готовый рендерер (RECIPE_FASTPATH). Ответ совпадает с ответом
+    RecipeReadSerializer байт в байт (проверка — check_fastpath).
+    """
+
+    def list(self, request, *args, **kwargs):
+        if not settings.RECIPE_FASTPATH:
+            return super().list(request, *args, **kwargs)
+        rows = get_rows(
+            self.filter_queryset(Recipe.objects.all()), request.user
+        )
+        page = self.paginate_queryset(rows)
+        if page is not None:
+            return self.get_paginated_response(render_recipes(page, request))
+        return Response(render_recipes(rows, request))
+
+    def retrieve(self, request, *args, **kwargs):
+        if not settings.RECIPE_FASTPATH:
+            return super().retrieve(request, *args, **kwargs)
+        rows = get_rows(
+            self.filter_queryset(Recipe.objects.all()), request.user
+        )
+        row = get_object_or_404(rows, pk=kwargs[self.lookup_field])
+        return Response(render_recipes([row], request)[0])
@@ -0,0 +1,156 @@
+import heapq
+from itertools import islice
+
+from django.conf import settings
+from django.db import connection
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from users.models import Subscription, User
+
+from .models import FeedEntry, Recipe
+from .shopping_list import chunked
+
+IDS_PER_QUERY = 500
+
+FAN_OUT_SQL = (
+    'INSERT INTO {feed} (user_id, recipe_id, author_id, pub_date) '
+    'SELECT subscription.user_id, recipe.id, recipe.author_id, '
+    'recipe.pub_date '
+    'FROM {recipe} AS recipe '
+    'JOIN {subscription} AS subscription '
+    'ON subscription.author_id = recipe.author_id '
+    'JOIN {user} AS author ON author.id = recipe.author_id '
+    'WHERE author.subscribers_count <= %s AND {condition} '
+    'ON CONFLICT DO NOTHING'
+)
+TRIM_SQL = (
+    'DELETE FROM {feed} WHERE id IN ('
+    'SELECT id FROM (SELECT id, row_number() OVER ('
+    'PARTITION BY user_id ORDER BY pub_date DESC, recipe_id DESC'
+    ') AS position FROM {feed} WHERE user_id IN ({users})) AS ranked '
+    'WHERE position > %s)'
+)
+SUBSCRIBERS_SQL = (
+    'SELECT subscription.user_id FROM {subscription} AS subscription '
+    'JOIN {recipe} AS recipe ON recipe.author_id = subscription.author_id '
+    'WHERE recipe.id IN ({ids})'
+)
+
+
+def _format(sql, **kwargs):
+    quote = connection.ops.quote_name
+    return sql.format(
+        feed=quote(FeedEntry._meta.db_table),
+        recipe=quote(Recipe._meta.db_table),
+        subscription=quote(Subscription._meta.db_table),
+        user=quote(User._meta.db_table),
+        **kwargs
+    )
+
+
+def fan_out(recipe_ids):
+    """
+    Раскладывает рецепты по лентам подписчиков их авторов. Рецепты
+    авторов, у которых больше FEED_FANOUT_MAX_SUBSCRIBERS подписчиков,
+    не раскладываются: они подмешиваются в ленту при чтении.
+    """
+    with connection.cursor() as cursor:
+        for ids in chunked(list(recipe_ids), IDS_PER_QUERY):
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                _format(
+                    FAN_OUT_SQL, condition=f'recipe.id IN ({placeholders})'
+                ),
+                [settings.FEED_FANOUT_MAX_SUBSCRIBERS, *ids]
+            )
+            cursor.execute(
+                _format(
+                    TRIM_SQL,
+                    users=_format(SUBSCRIBERS_SQL, ids=placeholders)
+                ),
+                [*ids, settings.FEED_MAX_ENTRIES]
+            )
+
+
+def backfill(user_id, author_id):
+    """Добавляет в ленту нового подписчика последние рецепты автора."""
+    recipe_ids = list(
+        Recipe.objects.filter(author_id=author_id).order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True)[:settings.FEED_MAX_ENTRIES]
+    )
+    if not recipe_ids:
+        return
+    with connection.cursor() as cursor:
+        for ids in chunked(recipe_ids, IDS_PER_QUERY):
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                _format(FAN_OUT_SQL, condition=(
+                    'subscription.user_id = %s AND recipe.id IN '
+                    f'({placeholders})'
+                )),
+                [settings.FEED_FANOUT_MAX_SUBSCRIBERS, user_id, *ids]
+            )
+        cursor.execute(
+            _format(TRIM_SQL, users='%s'),
+            [user_id, settings.FEED_MAX_ENTRIES]
+        )
+
+
+def clear_feed(user_id, author_id):
+    """Убирает из ленты рецепты автора после отписки."""
+    FeedEntry.objects.filter(user_id=user_id, author_id=author_id).delete()
+
+
+def _keyset(cursor, date_field, id_field):
+    if cursor is None:
+        return Q()
+    pub_date, pk = cursor
+    return Q(**{f'{date_field}__lt': pub_date}) | Q(
+        **{date_field: pub_date, f'{id_field}__lt': pk}
+    )
+
+
+def parse_cursor(values):
+    """Курсор ленты: дата публикации и id последнего рецепта."""
+    pub_date, pk = values
+    pub_date = parse_datetime(pub_date)
+    if pub_date is None or not isinstance(pk, int):
+        raise ValueError('Некорректный курсор.')
+    return pub_date, pk
+
+
+def get_feed(user, limit, cursor=None):
+    """
+    Ключи (дата публикации, id) рецептов ленты пользователя после
+    cursor, не больше limit + 1. Разложенные записи сливаются
+    с рецептами популярных авторов, читаемыми напрямую.
+    """
+    heavy_authors = list(
+        Subscription.objects.filter(
+            user=user,
+            author__subscribers_count__gt=(
+                settings.FEED_FANOUT_MAX_SUBSCRIBERS
+            ),
+        ).values_list('author_id', flat=True)
+    )
+    sources = [
+        FeedEntry.objects.filter(user=user).exclude(
+            author_id__in=heavy_authors
+        ).filter(
+            _keyset(cursor, 'pub_date', 'recipe_id')
+        ).order_by('-pub_date', '-recipe_id').values_list(
+            'pub_date', 'recipe_id'
+        )[:limit + 1]
+    ]
+    if heavy_authors:
+        sources.append(
+            Recipe.objects.filter(author_id__in=heavy_authors).filter(
+                _keyset(cursor, 'pub_date', 'id')
+            ).order_by('-pub_date', '-id').values_list(
+                'pub_date', 'id'
+            )[:limit + 1]
+        )
+    return list(islice(
+        heapq.merge(*map(list, sources), reverse=True), limit + 1
+    ))
@@ -1,7 +1,12 @@
+from django.db.models import Exists, OuterRef
 from django_filters.rest_framework import FilterSet, filters
-from users.models import User
 
-from .models import Ingredient, Recipe
+from .models import Favorite, Ingredient, Recipe, ShoppingCart
+from .search import search_recipes
+
+
+class NumberInFilter(filters.BaseInFilter, filters.NumberFilter):
+    pass
 
 
 class IngredientFilter(FilterSet):
@@ -13,24 +18,34 @@ class IngredientFilter(FilterSet):
 
 
 class RecipeFilter(FilterSet):
-    author = filters.ModelChoiceFilter(queryset=User.objects.all())
+    author = filters.NumberFilter(field_name='author_id')
+    authors = NumberInFilter(field_name='author_id')
     is_favorited = filters.BooleanFilter(method='filter_is_favorited')
     is_in_shopping_cart = filters.BooleanFilter(
         method='filter_is_in_shopping_cart'
     )
+    search = filters.CharFilter(method='filter_search')
 
     class Meta:
         model = Recipe
-        fields = ('author', 'is_favorited', 'is_in_shopping_cart')
+        fields = (
+            'author', 'authors', 'is_favorited', 'is_in_shopping_cart',
+            'search'
+        )
+
+    def filter_search(self, queryset, name, value):
+        return search_recipes(queryset, value)
 
     def filter_is_favorited(self, queryset, name, value):
-        user = self.request.user
-        if value and user.is_authenticated:
-            return queryset.filter(favorites__user=user)
-        return queryset
+        return self.filter_user_relation(queryset, value, Favorite)
 
     def filter_is_in_shopping_cart(self, queryset, name, value):
+        return self.filter_user_relation(queryset, value, ShoppingCart)
+
+    def filter_user_relation(self, queryset, value, model):
         user = self.request.user
         if value and user.is_authenticated:
-            return queryset.filter(shopping_cart__user=user)
+            return queryset.filter(Exists(model.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )))
         return queryset
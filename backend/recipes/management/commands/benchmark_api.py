@@ -0,0 +1,434 @@
+import base64
+import json
+import statistics
+import time
+import tracemalloc
+from contextlib import contextmanager
+from io import BytesIO
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.db.models import Count
+from django.utils import timezone
+from foodgram.profiling import RequestProfile
+from PIL import Image
+from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart
+from recipes.urls import router as recipes_router
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APIClient
+from users.models import Subscription, User
+from users.urls import router as users_router
+
+ADMIN_USERNAME = 'benchmark_api_admin'
+ADMIN_PASSWORD = 'benchmark-api-password'
+
+# Эндпоинты djoser для подтверждения почты и сброса пароля отправляют
+# письма или требуют одноразовых токенов из них.
+SKIPPED = {
+    ('users-activation', 'post'): 'подтверждение по письму',
+    ('users-resend-activation', 'post'): 'отправка письма',
+    ('users-reset-password', 'post'): 'отправка письма',
+    ('users-reset-password-confirm', 'post'): 'токен из письма',
+    ('users-reset-username', 'post'): 'отправка письма',
+    ('users-reset-username-confirm', 'post'): 'токен из письма',
+}
+
+
+def get_routes():
+    """Пары (имя маршрута, метод) всех эндпоинтов recipes и users."""
+    routes = {('login', 'post'), ('logout', 'post')}
+    for router in (recipes_router, users_router):
+        for url in router.urls:
+            actions = getattr(url.callback, 'actions', None) or {}
+            routes.update((url.name, method) for method in actions)
+    return routes
+
+
+def image_data_uri():
+    buffer = BytesIO()
+    Image.new('RGB', (64, 64), (200, 120, 40)).save(buffer, 'PNG')
+    return 'data:image/png;base64,' + base64.b64encode(
+        buffer.getvalue()
+    ).decode()
+
+
+def percentile(values, fraction):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(fraction * len(values)))]
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер задержки, числа запросов к БД и пика памяти для каждого '
+        'эндпоинта recipes и users на текущих данных (см. seed_perf_data). '
+        'Изменяющие запросы выполняются в откатываемой транзакции. '
+        'Результат в JSON можно сравнить с прошлым прогоном (--compare).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--repeat', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--search', default='Рецепт')
+        parser.add_argument(
+            '--only', action='append',
+            help='Только сценарии, имя которых начинается с этой строки',
+        )
+        parser.add_argument('--output', help='Сохранить результаты в JSON.')
+        parser.add_argument(
+            '--compare', help='JSON прошлого прогона для сравнения.'
+        )
+
+    def handle(self, *args, **options):
+        context = self.get_context(options['search'])
+        self.tokens = context['tokens']
+        scenarios = self.get_scenarios(context)
+        uncovered = sorted(
+            get_routes() - {
+                (scenario['route'], scenario['method'])
+                for scenario in scenarios
+            } - set(SKIPPED)
+        )
+        if options['only']:
+            scenarios = [
+                scenario for scenario in scenarios
+                if scenario['name'].startswith(tuple(options['only']))
+            ]
+
+        results = {}
+        for scenario in scenarios:
+            results[scenario['name']] = self.measure(
+                scenario, options['repeat'], options['warmup']
+            )
+        report = {
+            'meta': {
+                'date': timezone.now().isoformat(),
+                'vendor': connection.vendor,
+                'django': django.get_version(),
+                'repeat': options['repeat'],
+                'data': {
+                    'users': User.objects.count(),
+                    'recipes': Recipe.objects.count(),
+                    'ingredients': Ingredient.objects.count(),
+                    'favorites': Favorite.objects.count(),
+                    'carts': ShoppingCart.objects.count(),
+                    'subscriptions': Subscription.objects.count(),
+                },
+            },
+            'endpoints': results,
+            'skipped': {
+                f'{method.upper()} {route}': reason
+                for (route, method), reason in sorted(SKIPPED.items())
+            },
+            'uncovered': [
+                f'{method.upper()} {route}' for route, method in uncovered
+            ],
+        }
+
+        previous = None
+        if options['compare']:
+            with open(options['compare']) as file:
+                previous = json.load(file)['endpoints']
+        self.print_report(results, previous)
+        for route in report['uncovered']:
+            self.stdout.write(self.style.WARNING(f'Нет сценария: {route}'))
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                json.dump(report, file, ensure_ascii=False, indent=2)
+
+    def get_context(self, search):
+        """Объекты для сценариев: самый активный пользователь и т. д."""
+        user = User.objects.annotate(
+            subscriptions=Count('subscriber', distinct=True),
+        ).filter(recipes_count__gt=0).order_by(
+            '-subscriptions', '-recipes_count', 'id'
+        ).first()
+        if user is None:
+            raise CommandError(
+                'Нет данных для замеров: выполните seed_perf_data.'
+            )
+        admin = User.objects.filter(username=ADMIN_USERNAME).first()
+        if admin is None:
+            admin = User.objects.create_user(
+                username=ADMIN_USERNAME,
+                email=f'{ADMIN_USERNAME}@foodgram.local',
+                password=ADMIN_PASSWORD,
+                first_name='Benchmark',
+                last_name='Benchmark',
+                is_staff=True,
+            )
+        others = Recipe.objects.exclude(author=user).order_by(
+            '-favorites_count', 'id'
+        )
+        recipe = others.first()
+        new_recipes = list(
+            others.exclude(favorites__user=user).exclude(
+                shopping_cart__user=user
+            ).values_list('id', flat=True)[:10]
+        )
+        subscribed = Subscription.objects.filter(user=user).values_list(
+            'author_id', flat=True
+        )
+        ingredient = Ingredient.objects.filter(
+            recipes=recipe
+        ).order_by('id').first()
+        return {
+            'user': user,
+            'admin': admin,
+            'tokens': {
+                name: Token.objects.get_or_create(user=account)[0].key
+                for name, account in (('user', user), ('admin', admin))
+            },
+            'recipe': recipe.id,
+            'own_recipe': Recipe.objects.filter(author=user).order_by(
+                'id'
+            ).values_list('id', flat=True).first(),
+            'new_recipe': new_recipes[0],
+            'new_recipes': new_recipes,
+            'favorite': Favorite.objects.filter(user=user).order_by(
+                'id'
+            ).values_list('recipe_id', flat=True).first() or recipe.id,
+            'cart': ShoppingCart.objects.filter(user=user).order_by(
+                'id'
+            ).values_list('recipe_id', flat=True).first() or recipe.id,
+            'author': recipe.author_id,
+            'subscribed': subscribed.first() or recipe.author_id,
+            'new_author': User.objects.exclude(pk=user.pk).exclude(
+                pk__in=subscribed
+            ).order_by('-subscribers_count', 'id').values_list(
+                'id', flat=True
+            ).first(),
+            'ingredient': ingredient.id,
+            'ingredient_prefix': ingredient.name[:2],
+            'pantry': ','.join(
+                str(pk) for pk in Ingredient.objects.filter(
+                    recipes=recipe
+                ).values_list('id', flat=True)[:10]
+            ),
+            'search': search,
+            'image': image_data_uri(),
+        }
+
+    def get_scenarios(self, context):
+        ctx = context
+        ingredients = [{'id': ctx['ingredient'], 'amount': 10}]
+        recipe_data = {
+            'name': 'Рецепт для замера',
+            'text': 'Описание',
+            'cooking_time': 15,
+            'image': ctx['image'],
+            'ingredients': ingredients,
+        }
+        scenarios = [
+            ('recipes-list', 'get', '/api/recipes/', None),
+            ('recipes-list', 'get', '/api/recipes/?limit=50', None),
+            ('recipes-list', 'get',
+             f'/api/recipes/?author={ctx["author"]}', None),
+            ('recipes-list', 'get', '/api/recipes/?is_favorited=1', 'user'),
+            ('recipes-list', 'get',
+             '/api/recipes/?is_in_shopping_cart=1', 'user'),
+            ('recipes-list', 'get',
+             f'/api/recipes/?search={ctx["search"]}', None),
+            ('recipes-list', 'get', '/api/recipes/', 'user'),
+            ('recipes-list', 'post', '/api/recipes/', 'user', recipe_data),
+            ('recipes-detail', 'get', f'/api/recipes/{ctx["recipe"]}/', None),
+            ('recipes-detail', 'get',
+             f'/api/recipes/{ctx["recipe"]}/', 'user'),
+            ('recipes-detail', 'put',
+             f'/api/recipes/{ctx["own_recipe"]}/', 'user', recipe_data),
+            ('recipes-detail', 'patch',
+             f'/api/recipes/{ctx["own_recipe"]}/', 'user',
+             {'ingredients': ingredients, 'cooking_time': 20}),
+            ('recipes-detail', 'delete',
+             f'/api/recipes/{ctx["own_recipe"]}/', 'user'),
+            ('recipes-favorite', 'post',
+             f'/api/recipes/{ctx["new_recipe"]}/favorite/', 'user'),
+            ('recipes-favorite', 'delete',
+             f'/api/recipes/{ctx["favorite"]}/favorite/', 'user'),
+            ('recipes-shopping-cart', 'post',
+             f'/api/recipes/{ctx["new_recipe"]}/shopping_cart/', 'user'),
+            ('recipes-shopping-cart', 'delete',
+             f'/api/recipes/{ctx["cart"]}/shopping_cart/', 'user'),
+            ('recipes-favorite-batch', 'post', '/api/recipes/favorite/',
+             'user', {'recipes': ctx['new_recipes']}),
+            ('recipes-favorite-batch', 'delete', '/api/recipes/favorite/',
+             'user', {'recipes': [ctx['favorite']]}),
+            ('recipes-shopping-cart-batch', 'post',
+             '/api/recipes/shopping_cart/', 'user',
+             {'recipes': ctx['new_recipes']}),
+            ('recipes-shopping-cart-batch', 'delete',
+             '/api/recipes/shopping_cart/', 'user',
+             {'recipes': [ctx['cart']]}),
+            ('recipes-download-shopping-cart', 'get',
+             '/api/recipes/download_shopping_cart/', 'user'),
+            ('recipes-download-shopping-cart', 'get',
+             '/api/recipes/download_shopping_cart/?type=pdf', 'user'),
+            ('recipes-get-link', 'get',
+             f'/api/recipes/{ctx["recipe"]}/get-link/', None),
+            ('recipes-similar', 'get',
+             f'/api/recipes/{ctx["recipe"]}/similar/', None),
+            ('recipes-recommended', 'get', '/api/recipes/recommended/',
+             'user'),
+            ('recipes-feed', 'get', '/api/recipes/feed/', 'user'),
+            ('recipes-pantry', 'get',
+             f'/api/recipes/pantry/?ingredients={ctx["pantry"]}', None),
+            ('recipes-bulk', 'get', '/api/recipes/bulk/', 'admin'),
+            ('recipes-bulk', 'post', '/api/recipes/bulk/', 'admin',
+             json.dumps(recipe_data) + '\n'),
+            ('ingredients-list', 'get', '/api/ingredients/', None),
+            ('ingredients-list', 'get',
+             f'/api/ingredients/?name={ctx["ingredient_prefix"]}', None),
+            ('ingredients-detail', 'get',
+             f'/api/ingredients/{ctx["ingredient"]}/', None),
+            ('users-list', 'get', '/api/users/', None),
+            ('users-list', 'get', '/api/users/', 'user'),
+            ('users-list', 'post', '/api/users/', None, {
+                'email': 'benchmark-new@foodgram.local',
+                'username': 'benchmark_new',
+                'first_name': 'Benchmark',
+                'last_name': 'Benchmark',
+                'password': ADMIN_PASSWORD,
+            }),
+            ('users-detail', 'get', f'/api/users/{ctx["author"]}/', 'user'),
+            ('users-detail', 'put', f'/api/users/{ctx["admin"].pk}/',
+             'admin', {
+                 'email': ctx['admin'].email,
+                 'username': ctx['admin'].username,
+                 'first_name': 'Benchmark',
+                 'last_name': 'Benchmark',
+             }),
+            ('users-detail', 'patch', f'/api/users/{ctx["admin"].pk}/',
+             'admin', {'first_name': 'Benchmark'}),
+            ('users-detail', 'delete', f'/api/users/{ctx["admin"].pk}/',
+             'admin', {'current_password': ADMIN_PASSWORD}),
+            ('users-me', 'get', '/api/users/me/', 'user'),
+            ('users-avatar', 'put', '/api/users/me/avatar/', 'user',
+             {'avatar': ctx['image']}),
+            ('users-avatar', 'delete', '/api/users/me/avatar/', 'user'),
+            ('users-subscriptions', 'get', '/api/users/subscriptions/',
+             'user'),
+            ('users-subscriptions', 'get',
+             '/api/users/subscriptions/?recipes_limit=3', 'user'),
+            ('users-subscribe', 'post',
+             f'/api/users/{ctx["new_author"]}/subscribe/', 'user'),
+            ('users-subscribe', 'delete',
+             f'/api/users/{ctx["subscribed"]}/subscribe/', 'user'),
+            ('users-set-password', 'post', '/api/users/set_password/',
+             'admin', {
+                 'current_password': ADMIN_PASSWORD,
+                 'new_password': ADMIN_PASSWORD + '-new',
+             }),
+            ('users-set-username', 'post', '/api/users/set_email/',
+             'admin', {
+                 'current_password': ADMIN_PASSWORD,
+                 'new_email': 'benchmark-changed@foodgram.local',
+             }),
+            ('login', 'post', '/api/auth/token/login/', None, {
+                'email': ctx['admin'].email, 'password': ADMIN_PASSWORD,
+            }),
+            ('logout', 'post', '/api/auth/token/logout/', 'admin'),
+        ]
+        return [
+            {
+                'name': (
+                    f'{method.upper()} {path}'
+                    + (f' [{account}]' if account else '')
+                ),
+                'route': route,
+                'method': method,
+                'path': path,
+                'account': account,
+                'data': data[0] if data else None,
+            }
+            for route, method, path, account, *data in scenarios
+        ]
+
+    @contextmanager
+    def rollback(self, enabled):
+        if not enabled:
+            yield
+            return
+        with transaction.atomic():
+            yield
+            transaction.set_rollback(True)
+
+    def request(self, client, scenario):
+        data = scenario['data']
+        kwargs = {}
+        if isinstance(data, str):
+            kwargs = {'data': data, 'content_type': 'application/x-ndjson'}
+        elif data is not None:
+            kwargs = {'data': data, 'format': 'json'}
+        response = getattr(client, scenario['method'])(
+            scenario['path'], **kwargs
+        )
+        if response.streaming:
+            content = b''.join(
+                chunk.encode() if isinstance(chunk, str) else chunk
+                for chunk in response.streaming_content
+            )
+        else:
+            content = response.content
+        return response.status_code, len(content)
+
+    def measure(self, scenario, repeat, warmup):
+        client = APIClient()
+        if scenario['account']:
+            client.credentials(
+                HTTP_AUTHORIZATION=f'Token {self.tokens[scenario["account"]]}'
+            )
+        write = scenario['method'] != 'get'
+        for _ in range(warmup):
+            with self.rollback(write):
+                self.request(client, scenario)
+
+        times, db_times = [], []
+        for _ in range(repeat):
+            # Счётчик запросов не зависит от DEBUG и сброса
+            # connection.queries в начале каждого запроса.
+            profile = RequestProfile()
+            with self.rollback(write), connection.execute_wrapper(profile):
+                start = time.perf_counter()
+                status, size = self.request(client, scenario)
+                times.append((time.perf_counter() - start) * 1000)
+            db_times.append(profile.db_time * 1000)
+
+        tracemalloc.start()
+        with self.rollback(write):
+            self.request(client, scenario)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+        return {
+            'status': status,
+            'bytes': size,
+            'queries': profile.queries,
+            'median_ms': round(statistics.median(times), 3),
+            'db_median_ms': round(statistics.median(db_times), 3),
+            'p95_ms': round(percentile(times, 0.95), 3),
+            'min_ms': round(min(times), 3),
+            'peak_kb': round(peak / 1024, 1),
+        }
+
+    def print_report(self, results, previous):
+        self.stdout.write(
+            f'{"":<60}{"median":>9}{"p95":>9}{"db":>9}{"SQL":>5}'
+            f'{"KB":>9}{"bytes":>9}  status'
+        )
+        for name, result in results.items():
+            line = (
+                f'{name[:59]:<60}{result["median_ms"]:>9.2f}'
+                f'{result["p95_ms"]:>9.2f}{result["db_median_ms"]:>9.2f}'
+                f'{result["queries"]:>5}'
+                f'{result["peak_kb"]:>9.1f}{result["bytes"]:>9}'
+                f'  {result["status"]}'
+            )
+            before = (previous or {}).get(name)
+            if before:
+                change = (
+                    result['median_ms'] / before['median_ms'] - 1
+                ) * 100 if before['median_ms'] else 0
+                line += f'  {change:+.0f}%'
+                if result['queries'] != before['queries']:
+                    line += f', SQL {before["queries"]} → {result["queries"]}'
+            self.stdout.write(line)
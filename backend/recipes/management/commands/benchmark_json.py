@@ -0,0 +1,124 @@
+import base64
+import os
+import time
+from io import BytesIO
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from foodgram.parsers import FastJSONParser
+from foodgram.renderers import FastJSONRenderer, orjson
+from PIL import Image
+from recipes.models import Recipe
+from recipes.serializers import RecipeReadSerializer
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIRequestFactory
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнивает JSONRenderer и JSONParser DRF с FastJSONRenderer '
+        'и FastJSONParser на настоящих данных: страница рецептов, '
+        'один рецепт и запрос на создание рецепта с изображением '
+        'в base64. Проверяет, что результаты совпадают.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=50)
+        parser.add_argument(
+            '--image',
+            help='Файл изображения для запроса на создание; по умолчанию '
+                 'шум 800×600 в PNG (около 1,4 МБ)',
+        )
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            raise CommandError(
+                'orjson не установлен: FastJSONRenderer работает как '
+                'JSONRenderer, сравнивать нечего.'
+            )
+        recipes = list(Recipe.objects.for_read(AnonymousUser()).order_by(
+            '-pub_date', '-id'
+        )[:options['limit']])
+        if not recipes:
+            raise CommandError('Нет рецептов: выполните seed_perf_data.')
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = AnonymousUser()
+        results = RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+        payloads = {
+            'list': {
+                'count': len(results),
+                'next': None,
+                'previous': None,
+                'results': results,
+            },
+            'detail': results[0],
+            'create': {
+                'name': recipes[0].name,
+                'text': recipes[0].text,
+                'cooking_time': recipes[0].cooking_time,
+                'image': self.get_image(options['image']),
+                'ingredients': [
+                    {'id': item['id'], 'amount': item['amount']}
+                    for item in results[0]['ingredients']
+                ],
+            },
+        }
+        self.stdout.write(
+            f'{"данные":<8}{"КБ":>8}'
+            f'{"render, мкс":>24}{"parse, мкс":>24}'
+        )
+        for name, data in payloads.items():
+            self.compare(name, data, options['repeat'])
+
+    def get_image(self, path):
+        if path:
+            with open(path, 'rb') as image:
+                content = image.read()
+        else:
+            buffer = BytesIO()
+            Image.frombytes(
+                'RGB', (800, 600), os.urandom(800 * 600 * 3)
+            ).save(buffer, 'PNG')
+            content = buffer.getvalue()
+        return 'data:image/png;base64,' + base64.b64encode(content).decode()
+
+    def compare(self, name, data, repeat):
+        content = JSONRenderer().render(data)
+        if FastJSONRenderer().render(data) != content:
+            raise CommandError(f'{name}: FastJSONRenderer выдал другой JSON')
+        parsed = JSONParser().parse(BytesIO(content))
+        if FastJSONParser().parse(BytesIO(content)) != parsed:
+            raise CommandError(f'{name}: FastJSONParser разобрал иначе')
+
+        timings = []
+        for renderer, parser in (
+            (JSONRenderer(), JSONParser()),
+            (FastJSONRenderer(), FastJSONParser()),
+        ):
+            timings.append((
+                self.measure(repeat, renderer.render, data),
+                self.measure(
+                    repeat, lambda: parser.parse(BytesIO(content))
+                ),
+            ))
+        (render, parse), (fast_render, fast_parse) = timings
+        self.stdout.write(
+            f'{name:<8}{len(content) / 1024:>8.1f}'
+            f'{render:>10.0f} →{fast_render:>7.0f} '
+            f'×{render / fast_render:<4.1f}'
+            f'{parse:>10.0f} →{fast_parse:>7.0f} '
+            f'×{parse / fast_parse:<4.1f}'
+        )
+
+    def measure(self, repeat, func, *args):
+        """Лучшее время вызова из repeat в микросекундах."""
+        best = float('inf')
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func(*args)
+            best = min(best, time.perf_counter() - start)
+        return best * 1e6
@@ -0,0 +1,118 @@
+import random
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from recipes.models import Ingredient, Recipe, RecipeIngredient
+from recipes.serializers import RecipeWriteSerializer
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер обновления рецепта с большим числом ингредиентов: '
+        'пересоздание строк против обновления по разнице. '
+        'Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--ingredients', type=int, default=60)
+        parser.add_argument('--changed', type=int, default=5)
+        parser.add_argument('--repeat', type=int, default=20)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            recipe, pool = self.create_recipe(options['ingredients'])
+            rows = recipe.recipe_ingredients.order_by('pk').values_list(
+                'ingredient_id', 'amount'
+            )
+            current = [
+                {'id': ingredient_id, 'amount': amount}
+                for ingredient_id, amount in rows
+            ]
+            changed = options['changed']
+            scenarios = {
+                'без изменений': current,
+                f'изменено количество у {changed}': [
+                    {'id': item['id'], 'amount': item['amount'] + 1}
+                    if index < changed else item
+                    for index, item in enumerate(current)
+                ],
+                f'заменено {changed} ингредиентов': current[changed:] + [
+                    {'id': ingredient_id, 'amount': 1}
+                    for ingredient_id in pool[:changed]
+                ],
+            }
+            self.stdout.write(
+                f'Ингредиентов в рецепте: {len(current)}, '
+                f'повторов: {options["repeat"]}'
+            )
+            for name, ingredients in scenarios.items():
+                for strategy in (self.recreate, self.diff):
+                    self.measure(
+                        name, strategy, recipe, current, ingredients,
+                        options['repeat']
+                    )
+            transaction.set_rollback(True)
+
+    def create_recipe(self, count):
+        user = User.objects.create_user(
+            email='benchmark@foodgram.local',
+            username='benchmark_recipe_update',
+            first_name='Benchmark',
+            last_name='Benchmark',
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'benchmark {i}', measurement_unit='г')
+            for i in range(count * 2)
+        )
+        ingredients = list(
+            Ingredient.objects.filter(
+                name__startswith='benchmark '
+            ).values_list('id', flat=True)
+        )
+        recipe = Recipe.objects.create(
+            author=user,
+            name='Рецепт',
+            image='recipes/images/benchmark.png',
+            text='benchmark',
+            cooking_time=10,
+        )
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_id,
+                amount=random.randint(1, 500),
+            )
+            for ingredient_id in ingredients[:count]
+        )
+        return recipe, ingredients[count:]
+
+    def recreate(self, recipe, ingredients):
+        recipe.save()
+        recipe.recipe_ingredients.all().delete()
+        RecipeWriteSerializer().create_ingredients(ingredients, recipe)
+
+    def diff(self, recipe, ingredients):
+        RecipeWriteSerializer().update(recipe, {
+            'name': recipe.name,
+            'text': recipe.text,
+            'cooking_time': recipe.cooking_time,
+            'ingredients': ingredients,
+        })
+
+    def measure(self, name, strategy, recipe, current, ingredients, repeat):
+        times, queries = [], 0
+        for _ in range(repeat):
+            with transaction.atomic():
+                self.diff(recipe, current)
+                with CaptureQueriesContext(connection) as context:
+                    start = time.perf_counter()
+                    strategy(recipe, ingredients)
+                    times.append(time.perf_counter() - start)
+                queries = len(context.captured_queries)
+        self.stdout.write(
+            f'{name}, {strategy.__name__}: '
+            f'{min(times) * 1000:.2f} мс, запросов: {queries}'
+        )
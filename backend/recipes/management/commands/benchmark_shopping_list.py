@@ -0,0 +1,112 @@
+import random
+import time
+import tracemalloc
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from recipes.models import Ingredient, Recipe, RecipeIngredient, ShoppingCart
+from recipes.shopping_list import (EXPORTERS, get_cart_etag,
+                                   get_cart_ingredients)
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = (
+        'Замер выгрузки списка покупок для большой корзины. '
+        'Данные создаются в транзакции и откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=2000)
+        parser.add_argument('--ingredients', type=int, default=1500)
+        parser.add_argument('--per-recipe', type=int, default=10)
+        parser.add_argument('--repeat', type=int, default=3)
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            user = self.create_cart(options)
+            lines = RecipeIngredient.objects.filter(
+                recipe__shopping_cart__user=user
+            ).count()
+            self.stdout.write(
+                f'Рецептов в корзине: {options["recipes"]}, '
+                f'строк ингредиентов: {lines}'
+            )
+            for exporter in EXPORTERS.values():
+                self.measure(user, exporter, options['repeat'])
+            transaction.set_rollback(True)
+
+    def create_cart(self, options):
+        user = User.objects.create_user(
+            email='benchmark@foodgram.local',
+            username='benchmark_shopping_list',
+            first_name='Benchmark',
+            last_name='Benchmark',
+        )
+        Ingredient.objects.bulk_create(
+            Ingredient(name=f'benchmark {i}', measurement_unit='г')
+            for i in range(options['ingredients'])
+        )
+        ingredients = list(
+            Ingredient.objects.filter(
+                name__startswith='benchmark '
+            ).values_list('id', flat=True)
+        )
+        Recipe.objects.bulk_create(
+            Recipe(
+                author=user,
+                name=f'Рецепт {i}',
+                image='recipes/images/benchmark.png',
+                text='benchmark',
+                cooking_time=10,
+            )
+            for i in range(options['recipes'])
+        )
+        recipe_ids = list(
+            Recipe.objects.filter(author=user).values_list('id', flat=True)
+        )
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=random.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in random.sample(
+                    ingredients, options['per_recipe']
+                )
+            ),
+            batch_size=1000,
+        )
+        ShoppingCart.objects.bulk_create(
+            (ShoppingCart(user=user, recipe_id=pk) for pk in recipe_ids),
+            batch_size=1000,
+        )
+        return user
+
+    def measure(self, user, exporter, repeat):
+        etag_times, render_times = [], []
+        size = peak = 0
+        for _ in range(repeat):
+            start = time.perf_counter()
+            ingredients = get_cart_ingredients(user)
+            get_cart_etag(ingredients, exporter)
+            etag_times.append(time.perf_counter() - start)
+
+            tracemalloc.start()
+            start = time.perf_counter()
+            size = sum(
+                len(chunk.encode() if isinstance(chunk, str) else chunk)
+                for chunk in exporter.render(ingredients)
+            )
+            render_times.append(time.perf_counter() - start)
+            peak = max(peak, tracemalloc.get_traced_memory()[1])
+            tracemalloc.stop()
+
+        self.stdout.write(
+            f'{exporter.extension}: запрос и ETag '
+            f'{min(etag_times) * 1000:.1f} мс, '
+            f'выгрузка {min(render_times) * 1000:.1f} мс, '
+            f'{size / 1024:.1f} КБ, пик памяти {peak / 1024:.1f} КБ'
+        )
@@ -0,0 +1,185 @@
+import json
+import time
+from urllib.parse import urlsplit
+
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count
+from django.test import override_settings
+from recipes.fastpath import get_ingredients, get_rows, make_renderer
+from recipes.models import Recipe
+from recipes.serializers import RecipeReadSerializer
+from rest_framework.test import APIClient, APIRequestFactory
+from users.models import User
+
+NO_CACHE = {
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+}
+CURSOR_PAGES = 3
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверяет ответы list и retrieve рецептов с RECIPE_FASTPATH '
+        'и без него байт в байт, затем сравнивает стоимость одного '
+        'рецепта для RecipeReadSerializer и recipes.fastpath. '
+        'Изменения данных для проверки откатываются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--details', type=int, default=20)
+        parser.add_argument('--limit', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=10)
+        parser.add_argument('--skip-benchmark', action='store_true')
+
+    def handle(self, *args, **options):
+        user = User.objects.annotate(
+            favorites_total=Count('favorites')
+        ).order_by('-favorites_total', 'id').first()
+        if user is None or not Recipe.objects.exists():
+            raise CommandError('Нет данных: выполните seed_perf_data.')
+
+        with transaction.atomic():
+            self.add_avatars()
+            checked, errors = self.check_contract(user, options['details'])
+            transaction.set_rollback(True)
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS(
+            f'Ответов сверено: {checked}, расхождений нет.'
+        ))
+        if not options['skip_benchmark']:
+            for account in (AnonymousUser(), user):
+                self.benchmark(account, options['limit'], options['repeat'])
+
+    def add_avatars(self):
+        """Аватары с миниатюрами и без, чтобы проверить оба варианта URL."""
+        authors = list(
+            Recipe.objects.order_by('-pub_date').values_list(
+                'author_id', flat=True
+            ).distinct()[:2]
+        )
+        image = Recipe.objects.order_by('id').values_list(
+            'image', flat=True
+        ).first()
+        for author_id, avatar in zip(authors, (image, 'users/missing.png')):
+            User.objects.filter(pk=author_id).update(avatar=avatar)
+
+    def get_paths(self, user, details):
+        recipe_ids = list(
+            Recipe.objects.order_by('-pub_date').values_list(
+                'id', flat=True
+            )[:details]
+        )
+        author_id = Recipe.objects.values_list(
+            'author_id', flat=True
+        ).first()
+        paths = [
+            '/api/recipes/',
+            '/api/recipes/?limit=50',
+            '/api/recipes/?page=2',
+            '/api/recipes/?page=100000',
+            f'/api/recipes/?author={author_id}',
+            '/api/recipes/?search=Рецепт',
+            '/api/recipes/?cursor=',
+            '/api/recipes/999999999/',
+            '/api/recipes/abc/',
+        ]
+        paths += [f'/api/recipes/{pk}/' for pk in recipe_ids]
+        if user is not None:
+            paths += [
+                '/api/recipes/?is_favorited=1',
+                '/api/recipes/?is_in_shopping_cart=1&limit=20',
+            ]
+        return paths
+
+    def fetch(self, client, path, fastpath):
+        with override_settings(RECIPE_FASTPATH=fastpath, CACHES=NO_CACHE):
+            response = client.get(path)
+        return response.status_code, response.content
+
+    def check_contract(self, user, details):
+        checked = 0
+        errors = []
+        for account in (None, user):
+            client = APIClient()
+            client.force_authenticate(account)
+            paths = self.get_paths(account, details)
+            cursor_pages = 0
+            while paths:
+                path = paths.pop(0)
+                expected = self.fetch(client, path, False)
+                checked += 1
+                if self.fetch(client, path, True) != expected:
+                    errors.append(
+                        f'{path} [{account or "аноним"}]: ответы различаются'
+                    )
+                    continue
+                # По курсору проходим несколько страниц подряд.
+                if 'cursor' in path and cursor_pages < CURSOR_PAGES:
+                    cursor_pages += 1
+                    next_path = self.get_next_path(expected)
+                    if next_path:
+                        paths.insert(0, next_path)
+        return checked, errors
+
+    def get_next_path(self, result):
+        status, content = result
+        if status != 200:
+            return None
+        next_link = json.loads(content).get('next')
+        if not next_link:
+            return None
+        parts = urlsplit(next_link)
+        return f'{parts.path}?{parts.query}'
+
+    def benchmark(self, user, limit, repeat):
+        request = APIRequestFactory().get('/api/recipes/')
+        request.user = user
+        results = {}
+        for name, load, render in (
+            ('RecipeReadSerializer', self.load_models, self.render_models),
+            ('fastpath', self.load_rows, self.render_rows),
+        ):
+            totals, renders = [], []
+            for _ in range(repeat):
+                start = time.perf_counter()
+                data = load(user, limit)
+                middle = time.perf_counter()
+                render(data, request)
+                end = time.perf_counter()
+                totals.append(end - start)
+                renders.append(end - middle)
+            count = len(data[0]) if isinstance(data, tuple) else len(data)
+            results[name] = (
+                min(totals) / count * 1e6, min(renders) / count * 1e6
+            )
+        self.stdout.write(
+            f'{"аноним" if user.is_anonymous else "пользователь"}, '
+            f'{limit} рецептов, мкс на рецепт (всего / сериализация):'
+        )
+        for name, (total, render) in results.items():
+            self.stdout.write(f'  {name:<22}{total:>9.1f}{render:>9.1f}')
+        base, fast = results['RecipeReadSerializer'], results['fastpath']
+        self.stdout.write(
+            f'  ускорение: всего в {base[0] / fast[0]:.1f} раза, '
+            f'сериализация в {base[1] / fast[1]:.1f} раза'
+        )
+
+    def load_models(self, user, limit):
+        return list(Recipe.objects.for_read(user)[:limit])
+
+    def render_models(self, recipes, request):
+        return RecipeReadSerializer(
+            recipes, many=True, context={'request': request}
+        ).data
+
+    def load_rows(self, user, limit):
+        rows = list(get_rows(Recipe.objects.all(), user)[:limit])
+        return rows, get_ingredients([row.id for row in rows])
+
+    def render_rows(self, data, request):
+        rows, ingredients = data
+        render = make_renderer(request)
+        return [render(row, ingredients) for row in rows]
@@ -0,0 +1,135 @@
+import random
+import threading
+from collections import Counter
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from recipes.models import Favorite, Recipe, ShoppingCart
+from recipes.views import RecipeViewSet
+from rest_framework.test import APIRequestFactory, force_authenticate
+from users.models import Subscription, User
+from users.views import CustomUserViewSet
+
+EXPECTED_STATUSES = {201, 204, 400}
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка избранного, корзины и подписок под конкурентной '
+        'нагрузкой: потоки одновременно добавляют и удаляют одну и ту же '
+        'пару, после чего счётчики сверяются с числом строк. '
+        'Созданные данные удаляются.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=16)
+        parser.add_argument('--iterations', type=int, default=50)
+
+    def handle(self, *args, **options):
+        user, author, recipe = self.create_objects()
+        factory = APIRequestFactory()
+        views = {
+            'favorite': (
+                RecipeViewSet.as_view({
+                    'post': 'favorite', 'delete': 'delete_favorite'
+                }),
+                f'/api/recipes/{recipe.pk}/favorite/', {'pk': recipe.pk},
+            ),
+            'shopping_cart': (
+                RecipeViewSet.as_view({
+                    'post': 'shopping_cart', 'delete': 'delete_shopping_cart'
+                }),
+                f'/api/recipes/{recipe.pk}/shopping_cart/',
+                {'pk': recipe.pk},
+            ),
+            'subscribe': (
+                CustomUserViewSet.as_view({
+                    'post': 'subscribe', 'delete': 'subscribe'
+                }),
+                f'/api/users/{author.pk}/subscribe/', {'id': author.pk},
+            ),
+        }
+        statuses = Counter()
+        lock = threading.Lock()
+
+        def hammer():
+            try:
+                for _ in range(options['iterations']):
+                    name = random.choice(list(views))
+                    view, path, kwargs = views[name]
+                    method = random.choice(('post', 'delete'))
+                    request = getattr(factory, method)(path)
+                    force_authenticate(request, user)
+                    try:
+                        code = view(request, **kwargs).status_code
+                    except Exception as error:
+                        code = type(error).__name__
+                    with lock:
+                        statuses[name, method, code] += 1
+            finally:
+                connection.close()
+
+        threads = [
+            threading.Thread(target=hammer)
+            for _ in range(options['threads'])
+        ]
+        try:
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            errors = self.verify_counters(user, author, recipe, statuses)
+        finally:
+            recipe.delete()
+            author.delete()
+            user.delete()
+
+        for (name, method, code), count in sorted(
+            statuses.items(), key=str
+        ):
+            self.stdout.write(f'{name} {method.upper()} {code}: {count}')
+        if errors:
+            raise CommandError('\n'.join(errors))
+        self.stdout.write(self.style.SUCCESS('Расхождений нет.'))
+
+    def create_objects(self):
+        suffix = random.randrange(10 ** 9)
+        user, author = (
+            User.objects.create_user(
+                email=f'{role}-{suffix}@foodgram.local',
+                username=f'{role}_{suffix}',
+                first_name=role,
+                last_name=role,
+            )
+            for role in ('races', 'races_author')
+        )
+        recipe = Recipe.objects.create(
+            author=author,
+            name='Рецепт',
+            image='recipes/images/races.png',
+            text='races',
+            cooking_time=10,
+        )
+        return user, author, recipe
+
+    def verify_counters(self, user, author, recipe, statuses):
+        errors = [
+            f'{name} {method.upper()}: неожиданный ответ {code} ({count})'
+            for (name, method, code), count in statuses.items()
+            if code not in EXPECTED_STATUSES
+        ]
+        recipe.refresh_from_db()
+        author.refresh_from_db()
+        counters = (
+            ('favorites_count', recipe.favorites_count,
+             Favorite.objects.filter(recipe=recipe).count()),
+            ('in_carts_count', recipe.in_carts_count,
+             ShoppingCart.objects.filter(recipe=recipe).count()),
+            ('subscribers_count', author.subscribers_count,
+             Subscription.objects.filter(author=author).count()),
+        )
+        errors.extend(
+            f'{name} = {value}, строк: {rows}'
+            for name, value, rows in counters if value != rows
+        )
+        return errors
@@ -0,0 +1,77 @@
+import posixpath
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+from foodgram.images import THUMBNAIL_FORMATS, get_thumbnail_name
+from recipes.models import Recipe
+from users.models import User
+
+# Модели и поля с изображениями; каталог берётся из upload_to.
+IMAGE_FIELDS = (
+    (Recipe, 'image'),
+    (User, 'avatar'),
+)
+
+
+class Command(BaseCommand):
+    help = (
+        'Удаление изображений, на которые не ссылается ни один рецепт '
+        'или пользователь, вместе с их миниатюрами. Одинаковые загрузки '
+        'хранятся одним файлом, поэтому при замене или удалении '
+        'изображения файл не удаляется сразу.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--min-age',
+            type=int,
+            default=60 * 60,
+            help=(
+                'Не трогать файлы моложе N секунд: ссылка на только что '
+                'загруженный файл может быть ещё не закоммичена'
+            ),
+        )
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только показать, что будет удалено',
+        )
+
+    def handle(self, *args, **options):
+        threshold = timezone.now() - timedelta(seconds=options['min_age'])
+        deleted = 0
+        for model, field_name in IMAGE_FIELDS:
+            field = model._meta.get_field(field_name)
+            directory = field.upload_to.rstrip('/')
+            used = set(model.objects.values_list(field_name, flat=True))
+            if not default_storage.exists(directory):
+                continue
+            for filename in default_storage.listdir(directory)[1]:
+                name = posixpath.join(directory, filename)
+                if (
+                    name in used
+                    or default_storage.get_modified_time(name) > threshold
+                ):
+                    continue
+                for width in settings.IMAGE_THUMBNAIL_WIDTHS:
+                    for ext, _ in THUMBNAIL_FORMATS:
+                        self.delete(
+                            get_thumbnail_name(name, width, ext), options
+                        )
+                self.delete(name, options)
+                deleted += 1
+        self.stdout.write(self.style.SUCCESS(
+            f'Неиспользуемых изображений: {deleted}'
+            + (' (не удалены, --dry-run)' if options['dry_run'] else '')
+        ))
+
+    def delete(self, name, options):
+        if not default_storage.exists(name):
+            return
+        if options['dry_run']:
+            self.stdout.write(name)
+        else:
+            default_storage.delete(name)
@@ -0,0 +1,28 @@
+from django.core.management.base import BaseCommand
+from recipes.bulk import iter_export, render_ndjson
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Выгрузка рецептов в NDJSON: один рецепт в строке'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path',
+            nargs='?',
+            default='-',
+            help='Путь к файлу .ndjson; по умолчанию stdout',
+        )
+        parser.add_argument('--author', help='Email автора рецептов')
+
+    def handle(self, *args, **options):
+        recipes = Recipe.objects.all()
+        if options['author']:
+            recipes = recipes.filter(author__email=options['author'])
+        lines = render_ndjson(iter_export(recipes))
+        if options['path'] == '-':
+            for line in lines:
+                self.stdout.write(line, ending='')
+            return
+        with open(options['path'], 'w', encoding='utf-8') as file:
+            file.writelines(lines)
@@ -0,0 +1,56 @@
+import sys
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from recipes.bulk import RecipeImporter, iter_ndjson
+from users.models import User
+
+
+class Command(BaseCommand):
+    help = 'Импорт рецептов из NDJSON: один рецепт в строке'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            'path', help='Путь к файлу .ndjson или - для stdin'
+        )
+        parser.add_argument(
+            '--author',
+            help='Email автора для строк без поля author',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--show-errors',
+            type=int,
+            default=20,
+            help='Сколько ошибок вывести',
+        )
+
+    def handle(self, *args, **options):
+        author = None
+        if options['author']:
+            author = User.objects.filter(email=options['author']).first()
+            if author is None:
+                raise CommandError(
+                    f'Пользователь не найден: {options["author"]}'
+                )
+        importer = RecipeImporter(author, options['batch_size'])
+
+        start = time.perf_counter()
+        if options['path'] == '-':
+            importer.run(iter_ndjson(sys.stdin))
+        else:
+            try:
+                with open(options['path'], encoding='utf-8') as file:
+                    importer.run(iter_ndjson(file))
+            except FileNotFoundError:
+                raise CommandError(
+                    f'Файл не найден по пути: {options["path"]}'
+                )
+        elapsed = time.perf_counter() - start
+
+        for error in importer.errors[:options['show_errors']]:
+            self.stderr.write(f'Строка {error["line"]}: {error["errors"]}')
+        self.stdout.write(self.style.SUCCESS(
+            f'Добавлено рецептов: {importer.created}, '
+            f'ошибок: {len(importer.errors)}, время: {elapsed:.2f} с'
+        ))
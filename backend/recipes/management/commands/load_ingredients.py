@@ -1,39 +1,196 @@
+import csv
 import json
 import os
+import time
+from itertools import islice
 
 from django.conf import settings
-from django.core.management.base import BaseCommand
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from recipes.autocomplete import ingredient_index
 from recipes.models import Ingredient
+from recipes.shopping_list import Echo
+
+READ_CHUNK_SIZE = 64 * 1024
+FORMATS = ('json', 'csv')
+
+
+def iter_json_array(file):
+    """Разбирает JSON-массив объект за объектом, не читая файл целиком."""
+    decoder = json.JSONDecoder()
+    buffer = ''
+    started = False
+    while True:
+        buffer = buffer.lstrip(' \t\r\n,' if started else ' \t\r\n')
+        if not buffer:
+            buffer = file.read(READ_CHUNK_SIZE)
+            if not buffer:
+                raise CommandError('Неожиданный конец JSON-файла')
+            continue
+        if not started:
+            if buffer[0] != '[':
+                raise CommandError('Ожидается JSON-массив ингредиентов')
+            buffer = buffer[1:]
+            started = True
+            continue
+        if buffer[0] == ']':
+            return
+        try:
+            item, end = decoder.raw_decode(buffer)
+        except json.JSONDecodeError:
+            chunk = file.read(READ_CHUNK_SIZE)
+            if not chunk:
+                raise CommandError('Некорректный JSON-файл')
+            buffer += chunk
+            continue
+        yield item['name'], item['measurement_unit']
+        buffer = buffer[end:]
+
+
+def iter_csv(file):
+    for row in csv.reader(file):
+        if row:
+            yield row[0], row[1] if len(row) > 1 else ''
+
+
+class CsvStream:
+    """Файлоподобный объект для COPY: отдаёт строки в формате CSV."""
+
+    def __init__(self, rows):
+        writer = csv.writer(Echo())
+        self.lines = (writer.writerow(row) for row in rows)
+
+    def read(self, size=-1):
+        chunk = []
+        length = 0
+        for line in self.lines:
+            chunk.append(line)
+            length += len(line)
+            if 0 <= size <= length:
+                break
+        return ''.join(chunk)
 
 
 class Command(BaseCommand):
     help = 'Загрузка ингредиентов в базу данных'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--path',
+            default=os.path.join(
+                settings.BASE_DIR, '..', 'data', 'ingredients.json'
+            ),
+            help='Путь к файлу ingredients.json или ingredients.csv',
+        )
+        parser.add_argument(
+            '--format',
+            choices=FORMATS,
+            help='Формат файла; по умолчанию определяется по расширению',
+        )
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument(
+            '--dry-run',
+            action='store_true',
+            help='Только разобрать файл, ничего не записывая',
+        )
+        parser.add_argument(
+            '--stats',
+            action='store_true',
+            help='Показать число строк и скорость загрузки',
+        )
+        parser.add_argument(
+            '--no-copy',
+            action='store_true',
+            help='Не использовать COPY на Postgres',
+        )
+
     def handle(self, *args, **options):
-        data_path = os.path.join(
-            settings.BASE_DIR, '..', 'data', 'ingredients.json'
+        data_path = options['path']
+        file_format = options['format'] or (
+            os.path.splitext(data_path)[1].lstrip('.').lower()
         )
+        if file_format not in FORMATS:
+            raise CommandError(
+                f'Неизвестный формат файла: {file_format or data_path}'
+            )
+        parse = iter_json_array if file_format == 'json' else iter_csv
 
+        start = time.perf_counter()
         try:
-            with open(data_path, encoding='utf-8') as file:
-                data = json.load(file)
-                ingredients_to_create = []
-                for item in data:
-                    ingredients_to_create.append(
-                        Ingredient(
-                            name=item['name'],
-                            measurement_unit=item['measurement_unit']
-                        )
-                    )
-                Ingredient.objects.bulk_create(ingredients_to_create)
+            with open(data_path, encoding='utf-8', newline='') as file:
+                rows = self.clean(parse(file))
+                if options['dry_run']:
+                    created = 0
+                    for _ in rows:
+                        pass
+                elif (
+                    connection.vendor == 'postgresql'
+                    and not options['no_copy']
+                ):
+                    created = self.copy(rows)
+                else:
+                    created = self.bulk_create(rows, options['batch_size'])
+        except FileNotFoundError:
+            self.stdout.write(
+                self.style.ERROR(f'Файл не найден по пути: {data_path}')
+            )
+            return
+        elapsed = time.perf_counter() - start
 
+        if not options['dry_run']:
+            ingredient_index.invalidate()
+        if options['stats'] or options['dry_run']:
+            self.stdout.write(
+                f'Строк в файле: {self.total}, пропущено: {self.skipped}, '
+                f'добавлено: {created}, время: {elapsed:.2f} с, '
+                f'{self.total / elapsed if elapsed else 0:.0f} строк/с'
+            )
+        if not options['dry_run']:
             self.stdout.write(
                 self.style.SUCCESS('Ингредиенты успешно загружены!')
             )
 
-        except FileNotFoundError:
-            self.stdout.write(
-                self.style.ERROR(f'Файл не найден по пути: {data_path}')
+    def clean(self, rows):
+        self.total = self.skipped = 0
+        for name, measurement_unit in rows:
+            self.total += 1
+            name, measurement_unit = name.strip(), measurement_unit.strip()
+            if not name or not measurement_unit:
+                self.skipped += 1
+                continue
+            yield name, measurement_unit
+
+    def bulk_create(self, rows, batch_size):
+        before = Ingredient.objects.count()
+        with transaction.atomic():
+            while True:
+                batch = [
+                    Ingredient(name=name, measurement_unit=measurement_unit)
+                    for name, measurement_unit in islice(rows, batch_size)
+                ]
+                if not batch:
+                    break
+                Ingredient.objects.bulk_create(
+                    batch, batch_size=batch_size, ignore_conflicts=True
+                )
+        return Ingredient.objects.count() - before
+
+    def copy(self, rows):
+        table = connection.ops.quote_name(Ingredient._meta.db_table)
+        with transaction.atomic(), connection.cursor() as cursor:
+            cursor.execute(
+                'CREATE TEMP TABLE ingredient_import '
+                '(name varchar(200), measurement_unit varchar(200)) '
+                'ON COMMIT DROP'
+            )
+            cursor.copy_expert(
+                'COPY ingredient_import (name, measurement_unit) '
+                'FROM STDIN WITH (FORMAT csv)',
+                CsvStream(rows),
+            )
+            cursor.execute(
+                f'INSERT INTO {table} (name, measurement_unit) '
+                'SELECT DISTINCT name, measurement_unit '
+                'FROM ingredient_import ON CONFLICT DO NOTHING'
             )
-        except Exception as e:
-            self.stdout.write(self.style.ERROR(f'Произошла ошибка: {e}'))
+            return cursor.rowcount
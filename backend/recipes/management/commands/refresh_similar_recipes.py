@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from recipes.recommendations import refresh_similar_recipes
+
+
+class Command(BaseCommand):
+    help = (
+        'Пересчитывает похожие рецепты по совместному добавлению '
+        'в избранное и корзину. По умолчанию — только для рецептов, '
+        'затронутых изменениями с прошлого запуска.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true', help='Пересчитать все рецепты.'
+        )
+        parser.add_argument('--top-k', type=int, default=None)
+        parser.add_argument('--block-size', type=int, default=1000)
+        parser.add_argument(
+            '--interval',
+            type=int,
+            default=None,
+            help=(
+                'Не завершаться, а пересчитывать каждые N секунд '
+                '(полный пересчёт — только при первом запуске).'
+            ),
+        )
+
+    def handle(self, *args, **options):
+        full = options['full']
+        while True:
+            start = time.perf_counter()
+            count = refresh_similar_recipes(
+                full=full,
+                top_k=options['top_k'],
+                block_size=options['block_size'],
+            )
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                f'Пересчитано рецептов: {count} за {elapsed:.2f} с'
+            )
+            if options['interval'] is None:
+                return
+            full = False
+            # Соединение не держим открытым между запусками.
+            connection.close()
+            time.sleep(max(options['interval'] - elapsed, 0))
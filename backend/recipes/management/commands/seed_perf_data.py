@@ -0,0 +1,267 @@
+import hashlib
+import os
+import random
+import time
+from datetime import timedelta
+from io import BytesIO, StringIO
+from itertools import accumulate
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils import timezone
+from foodgram.images import generate_thumbnails
+from PIL import Image
+from recipes.changes import recipes_changed
+from recipes.feed import fan_out
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            ShoppingCart)
+from recipes.recommendations import refresh_similar_recipes
+from users.models import Subscription, User
+
+USERNAME_PREFIX = 'perf_'
+IMAGE_COLORS = (
+    (231, 76, 60), (46, 204, 113), (52, 152, 219), (241, 196, 15),
+    (155, 89, 182), (230, 126, 34), (26, 188, 156), (149, 165, 166),
+)
+
+
+class PowerLaw:
+    """Выбор элементов с вероятностью, убывающей как 1 / rank^exponent."""
+
+    def __init__(self, rng, items, exponent):
+        self.rng = rng
+        self.items = list(items)
+        rng.shuffle(self.items)
+        self.cum_weights = list(accumulate(
+            1 / (rank + 1) ** exponent for rank in range(len(self.items))
+        ))
+
+    def sample(self, count):
+        return self.rng.choices(
+            self.items, cum_weights=self.cum_weights, k=count
+        )
+
+
+class Command(BaseCommand):
+    help = (
+        'Наполнение базы данными для замеров производительности: '
+        'пользователи, рецепты с 5–30 ингредиентами из '
+        'data/ingredients.json, избранное, корзины и подписки '
+        'со степенным распределением популярности.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--recipes', type=int, default=5000)
+        parser.add_argument('--favorites', type=int, default=30000)
+        parser.add_argument('--carts', type=int, default=5000)
+        parser.add_argument('--subscriptions', type=int, default=10000)
+        parser.add_argument('--min-ingredients', type=int, default=5)
+        parser.add_argument('--max-ingredients', type=int, default=30)
+        parser.add_argument(
+            '--exponent', type=float, default=1.1,
+            help='Показатель степенного распределения популярности',
+        )
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument(
+            '--ingredients-path',
+            default=os.path.join(
+                settings.BASE_DIR, '..', 'data', 'ingredients.json'
+            ),
+        )
+        parser.add_argument(
+            '--skip-similar', action='store_true',
+            help='Не пересчитывать похожие рецепты',
+        )
+
+    def handle(self, *args, **options):
+        self.rng = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        self.timings = {}
+        ingredient_ids = self.step('ingredients', self.load_ingredients,
+                                   options['ingredients_path'])
+        images = self.step('images', self.create_images)
+        with transaction.atomic():
+            user_ids = self.step('users', self.create_users, options['users'])
+            recipe_ids = self.step(
+                'recipes', self.create_recipes, options['recipes'],
+                user_ids, images, options['exponent'],
+            )
+            self.step(
+                'recipe_ingredients', self.create_recipe_ingredients,
+                recipe_ids, ingredient_ids,
+                options['min_ingredients'], options['max_ingredients'],
+            )
+            recipes = PowerLaw(self.rng, recipe_ids, options['exponent'])
+            users = PowerLaw(self.rng, user_ids, options['exponent'])
+            for name, model, count in (
+                ('favorites', Favorite, options['favorites']),
+                ('carts', ShoppingCart, options['carts']),
+            ):
+                self.step(
+                    name, self.create_links, model, 'recipe_id', count,
+                    users, recipes,
+                )
+            self.step(
+                'subscriptions', self.create_links, Subscription,
+                'author_id', options['subscriptions'], users,
+                PowerLaw(self.rng, user_ids, options['exponent']),
+                exclude_self=True,
+            )
+            self.step(
+                'counters', call_command, 'sync_counters', stdout=StringIO()
+            )
+            recipes_changed(*recipe_ids)
+            transaction.on_commit(lambda: self.step(
+                'feed', fan_out, recipe_ids
+            ))
+        if not options['skip_similar']:
+            self.step('similar', refresh_similar_recipes, full=True)
+
+        for name, elapsed in self.timings.items():
+            self.stdout.write(f'{name}: {elapsed:.2f} с')
+        self.stdout.write(self.style.SUCCESS(
+            f'Создано пользователей: {len(user_ids)}, '
+            f'рецептов: {len(recipe_ids)}'
+        ))
+
+    def step(self, name, func, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            self.timings[name] = time.perf_counter() - start
+
+    def load_ingredients(self, path):
+        if not Ingredient.objects.exists():
+            call_command('load_ingredients', path=path, stdout=StringIO())
+        ingredient_ids = list(
+            Ingredient.objects.order_by('id').values_list('id', flat=True)
+        )
+        if not ingredient_ids:
+            raise CommandError(f'Не удалось загрузить ингредиенты из {path}')
+        return ingredient_ids
+
+    def create_images(self):
+        """Несколько настоящих изображений с миниатюрами на все рецепты."""
+        names = []
+        for color in IMAGE_COLORS:
+            buffer = BytesIO()
+            Image.new('RGB', (960, 640), color).save(buffer, 'PNG')
+            file = ContentFile(buffer.getvalue())
+            file.content_sha256 = hashlib.sha256(file.read()).hexdigest()
+            name = default_storage.save(
+                f'recipes/images/{file.content_sha256}.png', file
+            )
+            generate_thumbnails(name)
+            names.append(name)
+        return names
+
+    def create_users(self, count):
+        offset = User.objects.filter(
+            username__startswith=USERNAME_PREFIX
+        ).count()
+        last_id = User.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        password = make_password(None)
+        User.objects.bulk_create(
+            (
+                User(
+                    username=f'{USERNAME_PREFIX}{number}',
+                    email=f'{USERNAME_PREFIX}{number}@foodgram.local',
+                    first_name=f'Имя {number}',
+                    last_name=f'Фамилия {number}',
+                    password=password,
+                )
+                for number in range(offset, offset + count)
+            ),
+            batch_size=self.batch_size,
+        )
+        return list(User.objects.filter(id__gt=last_id).order_by(
+            'id'
+        ).values_list('id', flat=True))
+
+    def create_recipes(self, count, user_ids, images, exponent):
+        last_id = Recipe.objects.order_by('-id').values_list(
+            'id', flat=True
+        ).first() or 0
+        authors = PowerLaw(self.rng, user_ids, exponent).sample(count)
+        Recipe.objects.bulk_create(
+            (
+                Recipe(
+                    author_id=author_id,
+                    name=f'Рецепт {number}',
+                    image=self.rng.choice(images),
+                    text=f'Описание рецепта {number}. ' * 10,
+                    cooking_time=self.rng.randint(5, 180),
+                )
+                for number, author_id in enumerate(authors)
+            ),
+            batch_size=self.batch_size,
+        )
+        # pub_date заполняется auto_now_add: разносим даты публикации
+        # по последнему году отдельным запросом.
+        recipes = list(
+            Recipe.objects.filter(id__gt=last_id).order_by('id').only('id')
+        )
+        now = timezone.now()
+        for recipe in recipes:
+            recipe.pub_date = now - timedelta(
+                seconds=self.rng.randrange(365 * 24 * 3600)
+            )
+        Recipe.objects.bulk_update(
+            recipes, ['pub_date'], batch_size=self.batch_size
+        )
+        return [recipe.id for recipe in recipes]
+
+    def create_recipe_ingredients(self, recipe_ids, ingredient_ids,
+                                  minimum, maximum):
+        maximum = min(maximum, len(ingredient_ids))
+        RecipeIngredient.objects.bulk_create(
+            (
+                RecipeIngredient(
+                    recipe_id=recipe_id,
+                    ingredient_id=ingredient_id,
+                    amount=self.rng.randint(1, 500),
+                )
+                for recipe_id in recipe_ids
+                for ingredient_id in self.rng.sample(
+                    ingredient_ids,
+                    self.rng.randint(min(minimum, maximum), maximum),
+                )
+            ),
+            batch_size=self.batch_size,
+        )
+
+    def create_links(self, model, target_field, count, owners, targets,
+                     exclude_self=False):
+        """
+        count уникальных пар (пользователь, цель): активные пользователи
+        и популярные цели встречаются чаще.
+        """
+        pairs = set()
+        for _ in range(10):
+            needed = count - len(pairs)
+            if needed <= 0:
+                break
+            pairs.update(
+                pair for pair in zip(
+                    owners.sample(needed * 2), targets.sample(needed * 2)
+                )
+                if not exclude_self or pair[0] != pair[1]
+            )
+        model.objects.bulk_create(
+            (
+                model(user_id=user_id, **{target_field: target_id})
+                for user_id, target_id in list(pairs)[:count]
+            ),
+            batch_size=self.batch_size,
+            ignore_conflicts=True,
+        )
@@ -0,0 +1,55 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+from recipes.models import Favorite, Recipe, ShoppingCart
+from users.models import Subscription, User
+
+COUNTERS = (
+    (Recipe, 'favorites_count', Favorite, 'recipe'),
+    (Recipe, 'in_carts_count', ShoppingCart, 'recipe'),
+    (User, 'recipes_count', Recipe, 'author'),
+    (User, 'subscribers_count', Subscription, 'author'),
+)
+
+
+def count_related(model, field):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            **{field: OuterRef('pk')}
+        ).order_by().values(field).annotate(
+            total=Count('pk')
+        ).values('total')
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка и исправление счётчиков избранного, корзин, '
+        'рецептов и подписчиков'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--check',
+            action='store_true',
+            help='Только показать расхождения, ничего не исправляя',
+        )
+
+    def handle(self, *args, **options):
+        for model, field, related_model, related_field in COUNTERS:
+            actual = count_related(related_model, related_field)
+            with transaction.atomic():
+                drifted = model.objects.annotate(
+                    actual=actual
+                ).exclude(**{field: F('actual')}).values('pk')
+                count = drifted.count()
+                if count and not options['check']:
+                    model.objects.filter(pk__in=drifted).update(
+                        **{field: actual}
+                    )
+            self.stdout.write(
+                f'{model.__name__}.{field}: расхождений {count}'
+            )
+        if not options['check']:
+            self.stdout.write(self.style.SUCCESS('Счётчики синхронизированы'))
@@ -0,0 +1,44 @@
+# Generated by Django 3.2.16 on 2026-10-17 06:47
+
+from django.db import migrations, models
+
+POSTGRES_INDEXES = (
+    (
+        'ingredient_name_pattern_idx',
+        'ON recipes_ingredient (name varchar_pattern_ops)',
+    ),
+    (
+        'ingredient_name_trgm_idx',
+        'ON recipes_ingredient USING gin (UPPER(name) gin_trgm_ops)',
+    ),
+)
+
+
+def create_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, definition in POSTGRES_INDEXES:
+        schema_editor.execute(f'CREATE INDEX {name} {definition}')
+
+
+def drop_postgres_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in POSTGRES_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='ingredient',
+            index=models.Index(fields=['name'], name='ingredient_name_idx'),
+        ),
+        migrations.RunPython(create_postgres_indexes, drop_postgres_indexes),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 3.2.16 on 2026-10-17 07:10
+
+from django.db import migrations
+
+# Копия SQL из recipes/search.py на момент миграции: миграции не должны
+# зависеть от текущего кода приложения.
+SEARCH_CONFIG = 'russian'
+SEARCH_TABLE = 'recipes_recipe_search'
+POSTGRES_UPDATE_SQL = (
+    'UPDATE recipes_recipe AS recipe SET search_vector = '
+    "setweight(to_tsvector(%(config)s, translate(recipe.name, 'ёЁ', 'еЕ')), "
+    "'A') || "
+    "setweight(to_tsvector(%(config)s, translate(recipe.text, 'ёЁ', 'еЕ')), "
+    "'B') || "
+    'setweight(to_tsvector(%(config)s, translate('
+    "coalesce((SELECT string_agg(ingredient.name, ' ') "
+    'FROM recipes_recipeingredient AS recipe_ingredient '
+    'JOIN recipes_ingredient AS ingredient '
+    'ON ingredient.id = recipe_ingredient.ingredient_id '
+    "WHERE recipe_ingredient.recipe_id = recipe.id), ''), "
+    "'ёЁ', 'еЕ')), 'C')"
+)
+SQLITE_INSERT_SQL = (
+    'INSERT INTO recipes_recipe_search (rowid, name, text, ingredients) '
+    "SELECT recipe.id, replace(recipe.name, 'ё', 'е'), "
+    "replace(recipe.text, 'ё', 'е'), replace("
+    "coalesce((SELECT group_concat(ingredient.name, ' ') "
+    'FROM recipes_recipeingredient AS recipe_ingredient '
+    'JOIN recipes_ingredient AS ingredient '
+    'ON ingredient.id = recipe_ingredient.ingredient_id '
+    "WHERE recipe_ingredient.recipe_id = recipe.id), ''), 'ё', 'е') "
+    'FROM recipes_recipe AS recipe'
+)
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe ADD COLUMN search_vector tsvector'
+        )
+        schema_editor.execute(
+            'CREATE INDEX recipe_search_vector_idx '
+            'ON recipes_recipe USING gin (search_vector)'
+        )
+        schema_editor.execute(POSTGRES_UPDATE_SQL, {'config': SEARCH_CONFIG})
+    elif vendor == 'sqlite':
+        schema_editor.execute(
+            f'CREATE VIRTUAL TABLE {SEARCH_TABLE} USING fts5('
+            'name, text, ingredients, '
+            "tokenize = 'unicode61 remove_diacritics 2')"
+        )
+        schema_editor.execute(SQLITE_INSERT_SQL)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'postgresql':
+        schema_editor.execute(
+            'ALTER TABLE recipes_recipe DROP COLUMN search_vector'
+        )
+    elif vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE {SEARCH_TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_user_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
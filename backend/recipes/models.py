@@ -1,6 +1,10 @@
 from django.core.validators import MaxValueValidator, MinValueValidator
 from django.db import models
-from users.models import User
+from django.db.models import Exists, F, OuterRef, Prefetch, Window
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import RowNumber
+from django.utils import timezone
+from users.models import Subscription, User
 
 MIN_VALUE = 1
 MAX_VALUE = 32000
@@ -20,11 +24,75 @@ class Ingredient(models.Model):
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
         ordering = ['name']
+        indexes = [
+            models.Index(fields=['name'], name='ingredient_name_idx'),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=['name', 'measurement_unit'],
+                name='unique_ingredient'
+            )
+        ]
 
     def __str__(self):
         return f'{self.name}, {self.measurement_unit}'
 
 
+class RecipeQuerySet(models.QuerySet):
+    def latest_per_author(self, limit):
+        """
+        Оставляет не более limit последних рецептов каждого автора.
+        Отбор делается в SQL через ROW_NUMBER() по разделам author_id.
+        """
+        ranked = self.order_by().annotate(
+            row_number=Window(
+                expression=RowNumber(),
+                partition_by=F('author'),
+                order_by=(F('pub_date').desc(), F('id').desc()),
+            )
+        ).values('id', 'row_number')
+        sql, params = ranked.query.sql_with_params()
+        return self.filter(pk__in=RawSQL(
+            f'SELECT id FROM ({sql}) AS ranked WHERE row_number <= %s',
+            (*params, limit)
+        ))
+
+    def with_ingredients(self):
+        return self.prefetch_related(
+            Prefetch(
+                'recipe_ingredients',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            )
+        )
+
+    def for_read(self, user):
+        """
+        Набор рецептов для чтения: автор, ингредиенты и флаги
+        is_favorited, is_in_shopping_cart и is_subscribed текущего
+        пользователя загружаются фиксированным числом запросов.
+        """
+        queryset = self.with_ingredients()
+        if not user.is_authenticated:
+            return queryset.select_related('author')
+        return queryset.annotate(
+            is_favorited=Exists(Favorite.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+            is_in_shopping_cart=Exists(ShoppingCart.objects.filter(
+                user=user, recipe=OuterRef('pk')
+            )),
+        ).prefetch_related(
+            Prefetch(
+                'author',
+                queryset=User.objects.annotate(
+                    is_subscribed=Exists(Subscription.objects.filter(
+                        user=user, author=OuterRef('pk')
+                    ))
+                )
+            )
+        )
+
+
 class Recipe(models.Model):
     author = models.ForeignKey(
         User,
@@ -60,11 +128,36 @@ class Recipe(models.Model):
         'Дата публикации',
         auto_now_add=True,
     )
+    favorites_count = models.PositiveIntegerField(
+        'В избранном',
+        default=0,
+        editable=False,
+    )
+    in_carts_count = models.PositiveIntegerField(
+        'В корзинах',
+        default=0,
+        editable=False,
+    )
+    # Отметка для индексов в памяти процессов (recipes.pantry):
+    # обновляется после коммита любого изменения рецепта.
+    updated = models.DateTimeField(
+        'Дата изменения',
+        default=timezone.now,
+        db_index=True,
+        editable=False,
+    )
+
+    objects = RecipeQuerySet.as_manager()
 
     class Meta:
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
         ordering = ['-pub_date']
+        indexes = [
+            models.Index(
+                fields=['-pub_date', '-id'], name='recipe_pub_date_id_idx'
+            ),
+        ]
 
     def __str__(self):
         return self.name
@@ -130,6 +223,11 @@ class Favorite(models.Model):
                 name='unique_favorite'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='favorite_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в избранное'
@@ -159,6 +257,161 @@ class ShoppingCart(models.Model):
                 name='unique_shopping_cart'
             )
         ]
+        indexes = [
+            models.Index(
+                fields=['recipe', 'user'], name='shopping_cart_recipe_user_idx'
+            ),
+        ]
 
     def __str__(self):
         return f'{self.user} добавил {self.recipe} в корзину'
+
+
+class RecipeSimilarity(models.Model):
+    """
+    Похожие рецепты: top-k соседей по совместному добавлению
+    в избранное и корзину. Пересчитывается командой
+    refresh_similar_recipes.
+    """
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similarities',
+        verbose_name='Рецепт',
+    )
+    similar = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='similar_to',
+        verbose_name='Похожий рецепт',
+    )
+    score = models.FloatField('Сходство')
+
+    class Meta:
+        verbose_name = 'Похожий рецепт'
+        verbose_name_plural = 'Похожие рецепты'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['recipe', 'similar'],
+                name='unique_recipe_similarity'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['recipe', '-score'],
+                name='similarity_recipe_score_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} ~ {self.similar}: {self.score:.3f}'
+
+
+class RecipeDeletion(models.Model):
+    """
+    Отметка об удалённом рецепте для индексов в памяти процессов
+    (recipes.pantry). Записи старше PANTRY_DELETIONS_TIMEOUT удаляются.
+    """
+    recipe_id = models.BigIntegerField('Рецепт')
+    deleted = models.DateTimeField(
+        'Дата удаления', default=timezone.now, db_index=True
+    )
+
+    class Meta:
+        verbose_name = 'Удалённый рецепт'
+        verbose_name_plural = 'Удалённые рецепты'
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.deleted}'
+
+
+class InteractionChange(models.Model):
+    """
+    Журнал изменений избранного и корзин для refresh_similar_recipes.
+    Без внешних ключей: записи об удалённых рецептах тоже нужны.
+    Команда удаляет обработанные записи.
+    """
+    user_id = models.BigIntegerField('Пользователь')
+    recipe_id = models.BigIntegerField('Рецепт')
+
+    class Meta:
+        verbose_name = 'Изменение взаимодействий'
+        verbose_name_plural = 'Изменения взаимодействий'
+
+    def __str__(self):
+        return f'{self.user_id} → {self.recipe_id}'
+
+
+class FeedEntry(models.Model):
+    """
+    Запись ленты подписок: рецепт автора, на которого подписан
+    пользователь. Заполняется при публикации рецепта, у каждого
+    пользователя хранится не больше FEED_MAX_ENTRIES последних записей.
+    """
+    user = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Подписчик',
+    )
+    recipe = models.ForeignKey(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='feed_entries',
+        verbose_name='Рецепт',
+    )
+    author = models.ForeignKey(
+        User,
+        on_delete=models.CASCADE,
+        related_name='+',
+        verbose_name='Автор',
+    )
+    pub_date = models.DateTimeField('Дата публикации')
+
+    class Meta:
+        verbose_name = 'Запись ленты'
+        verbose_name_plural = 'Лента подписок'
+        constraints = [
+            models.UniqueConstraint(
+                fields=['user', 'recipe'],
+                name='unique_feed_entry'
+            )
+        ]
+        indexes = [
+            models.Index(
+                fields=['user', '-pub_date', '-recipe'],
+                name='feed_user_pub_date_idx'
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe} в ленте {self.user}'
+
+
+class ShortLink(models.Model):
+    """
+    Короткая ссылка /s/<code>/ на рецепт: случайный код в base62.
+    Создаётся при первом запросе get-link.
+    """
+    recipe = models.OneToOneField(
+        Recipe,
+        on_delete=models.CASCADE,
+        related_name='short_link',
+        verbose_name='Рецепт',
+    )
+    code = models.CharField(
+        'Код',
+        max_length=16,
+        unique=True,
+    )
+    hits = models.PositiveIntegerField(
+        'Переходы',
+        default=0,
+    )
+
+    class Meta:
+        verbose_name = 'Короткая ссылка'
+        verbose_name_plural = 'Короткие ссылки'
+
+    def __str__(self):
+        return f'/s/{self.code}/ → {self.recipe}'
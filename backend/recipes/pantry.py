@@ -0,0 +1,165 @@
+import heapq
+import threading
+from array import array
+from bisect import bisect_left, insort
+from collections import Counter
+from datetime import timedelta
+
+from django.conf import settings
+from django.utils import timezone
+
+from .models import Recipe, RecipeDeletion, RecipeIngredient
+
+# Изменения, закоммиченные чуть позже более новых, попадают в окно
+# и не теряются.
+SYNC_LAG = timedelta(seconds=5)
+
+
+def mark_recipes_changed(*recipe_ids):
+    """
+    Сдвигает Recipe.updated у изменённых рецептов. Вызывается после
+    коммита, поэтому отметка не старше самого изменения; процессы
+    догоняют изменения при следующем запросе к индексу.
+    """
+    Recipe.objects.filter(pk__in=recipe_ids).update(updated=timezone.now())
+
+
+def mark_recipes_deleted(*recipe_ids):
+    """
+    Оставляет отметки об удалённых рецептах (после коммита, как
+    mark_recipes_changed) и удаляет устаревшие отметки.
+    """
+    now = timezone.now()
+    RecipeDeletion.objects.bulk_create([
+        RecipeDeletion(recipe_id=recipe_id, deleted=now)
+        for recipe_id in recipe_ids
+    ])
+    RecipeDeletion.objects.filter(
+        deleted__lt=now - timedelta(seconds=settings.PANTRY_DELETIONS_TIMEOUT)
+    ).delete()
+
+
+class PantryIndex:
+    """
+    Инвертированный индекс «ингредиент -> отсортированный массив id
+    рецептов» в памяти процесса. Синхронизируется с БД по Recipe.updated
+    и отметкам RecipeDeletion: изменённые рецепты перечитываются,
+    удалённые убираются из индекса. Если процесс не синхронизировался
+    дольше, чем хранятся отметки, индекс строится заново.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._mark = None
+        self._synced = None
+        self._seen = {}
+        self._postings = {}
+        self._recipes = {}
+
+    def search(self, ingredient_ids, limit, max_missing=None):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов, в порядке
+        числа недостающих ингредиентов. Возвращает пары
+        (id рецепта, сколько ингредиентов не хватает).
+        """
+        with self._lock:
+            self._sync()
+            matched = Counter()
+            for ingredient_id in set(ingredient_ids):
+                matched.update(self._postings.get(ingredient_id, ()))
+            candidates = (
+                (len(self._recipes[recipe_id]) - count, -count, -recipe_id)
+                for recipe_id, count in matched.items()
+            )
+            if max_missing is not None:
+                candidates = (
+                    candidate for candidate in candidates
+                    if candidate[0] <= max_missing
+                )
+            return [
+                (-recipe_id, missing)
+                for missing, _, recipe_id in heapq.nsmallest(
+                    limit, candidates
+                )
+            ]
+
+    def _sync(self):
+        now = timezone.now()
+        if self._synced is None or self._synced < now - timedelta(
+            seconds=settings.PANTRY_DELETIONS_TIMEOUT
+        ) + SYNC_LAG:
+            self._build()
+            return
+        self._synced = now
+        recent = self._read_recent()
+        changed = {
+            recipe_id for recipe_id, stamp in recent.items()
+            if self._seen.get(recipe_id) != stamp
+        }
+        if changed:
+            # У удалённых рецептов состав пуст: _update их просто убирает.
+            self._update(changed)
+        self._remember(recent)
+
+    def _read_recent(self):
+        """Отметки изменений и удалений в окне: id рецепта → время."""
+        since = self._mark - SYNC_LAG
+        recent = dict(Recipe.objects.filter(
+            updated__gte=since
+        ).values_list('id', 'updated'))
+        recent.update(RecipeDeletion.objects.filter(
+            deleted__gte=since
+        ).values_list('recipe_id', 'deleted'))
+        return recent
+
+    def _remember(self, recent):
+        if recent:
+            self._mark = max(self._mark, *recent.values())
+        self._seen = {
+            recipe_id: stamp for recipe_id, stamp in recent.items()
+            if stamp >= self._mark - SYNC_LAG
+        }
+
+    def _build(self):
+        # Отметку берём до чтения состава: изменения во время чтения
+        # будут перечитаны при следующей синхронизации.
+        self._mark = self._synced = timezone.now()
+        recent = self._read_recent()
+        postings = {}
+        recipes = {}
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id').iterator()
+        for ingredient_id, recipe_id in rows:
+            if ingredient_id not in postings:
+                postings[ingredient_id] = array('I')
+            postings[ingredient_id].append(recipe_id)
+            recipes.setdefault(recipe_id, []).append(ingredient_id)
+        self._postings = postings
+        self._recipes = {
+            recipe_id: array('I', ingredients)
+            for recipe_id, ingredients in recipes.items()
+        }
+        self._remember(recent)
+
+    def _update(self, recipe_ids):
+        for recipe_id in recipe_ids:
+            for ingredient_id in self._recipes.pop(recipe_id, ()):
+                posting = self._postings[ingredient_id]
+                index = bisect_left(posting, recipe_id)
+                if index < len(posting) and posting[index] == recipe_id:
+                    del posting[index]
+        recipes = {}
+        for recipe_id, ingredient_id in RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by().values_list('recipe_id', 'ingredient_id'):
+            recipes.setdefault(recipe_id, []).append(ingredient_id)
+            insort(
+                self._postings.setdefault(ingredient_id, array('I')),
+                recipe_id
+            )
+        for recipe_id, ingredients in recipes.items():
+            self._recipes[recipe_id] = array('I', ingredients)
+
+
+pantry_index = PantryIndex()
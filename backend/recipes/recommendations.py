@@ -0,0 +1,264 @@
+import numpy as np
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Count, Exists, Max, OuterRef, Sum
+from scipy import sparse
+
+from .models import Favorite, InteractionChange, RecipeSimilarity, ShoppingCart
+from .shopping_list import chunked
+
+# Корзина — более слабый сигнал интереса, чем избранное.
+FAVORITE_WEIGHT = 1.0
+SHOPPING_CART_WEIGHT = 0.5
+# Сглаживание: пары, которые встретились у одного-двух пользователей,
+# не должны получать сходство, близкое к 1.
+SHRINKAGE = 5.0
+BLOCK_SIZE = 1000
+# Больше изменений дешевле обработать полным пересчётом.
+MAX_CHANGES = 100000
+
+
+def mark_interactions_changed(*pairs):
+    """
+    Записывает в журнал InteractionChange пары (пользователь, рецепт),
+    у которых изменились избранное или корзина.
+    """
+    InteractionChange.objects.bulk_create(
+        InteractionChange(user_id=user_id, recipe_id=recipe_id)
+        for user_id, recipe_id in pairs
+    )
+
+
+def read_changes():
+    """
+    id прочитанных записей журнала и пары (пользователь, рецепт).
+    Вместо пар None, если изменений больше MAX_CHANGES.
+    """
+    rows = list(InteractionChange.objects.order_by('id').values_list(
+        'id', 'user_id', 'recipe_id'
+    )[:MAX_CHANGES + 1])
+    ids = [row[0] for row in rows]
+    if len(rows) > MAX_CHANGES:
+        return ids, None
+    return ids, [row[1:] for row in rows]
+
+
+def load_interactions(user_ids=None):
+    """
+    Разреженная матрица «пользователь × рецепт» с весами избранного
+    и корзины и массивы id, соответствующие строкам и столбцам.
+    С user_ids — только строки этих пользователей.
+    """
+    parts = [
+        (
+            np.array(
+                list(iter_pairs(model, user_ids)), dtype=np.int64
+            ).reshape(-1, 2),
+            weight
+        )
+        for model, weight in (
+            (Favorite, FAVORITE_WEIGHT),
+            (ShoppingCart, SHOPPING_CART_WEIGHT),
+        )
+    ]
+    pairs = np.concatenate([pairs for pairs, _ in parts])
+    weights = np.concatenate([
+        np.full(len(pairs), weight) for pairs, weight in parts
+    ])
+    user_ids, users = np.unique(pairs[:, 0], return_inverse=True)
+    recipe_ids, recipes = np.unique(pairs[:, 1], return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (weights, (users, recipes)), shape=(len(user_ids), len(recipe_ids))
+    )
+    return matrix, user_ids, recipe_ids
+
+
+def iter_pairs(model, user_ids=None):
+    queryset = model.objects.order_by().values_list('user_id', 'recipe_id')
+    if user_ids is None:
+        yield from queryset.iterator()
+        return
+    for chunk in chunked(sorted(user_ids), BLOCK_SIZE):
+        yield from queryset.filter(user_id__in=chunk)
+
+
+def get_related_ids(field, related, ids):
+    """Значения field у избранного и корзин, где related из ids."""
+    result = set()
+    for chunk in chunked(sorted(ids), BLOCK_SIZE):
+        for model in (Favorite, ShoppingCart):
+            result.update(model.objects.filter(
+                **{f'{related}__in': chunk}
+            ).order_by().values_list(field, flat=True))
+    return result
+
+
+def load_norms(recipe_ids):
+    """
+    Нормы столбцов матрицы взаимодействий по всем пользователям,
+    без загрузки самой матрицы. Вес пары — сумма весов избранного
+    и корзины, поэтому квадрат нормы — F·wf² + C·wc² + 2·wf·wc·B, где
+    F, C — число добавлений в избранное и корзину, B — в оба списка.
+    """
+    squares = dict.fromkeys(recipe_ids.tolist(), 0.0)
+    for chunk in chunked(recipe_ids.tolist(), BLOCK_SIZE):
+        for queryset, factor in (
+            (
+                Favorite.objects.filter(recipe_id__in=chunk),
+                FAVORITE_WEIGHT ** 2,
+            ),
+            (
+                ShoppingCart.objects.filter(recipe_id__in=chunk),
+                SHOPPING_CART_WEIGHT ** 2,
+            ),
+            (
+                ShoppingCart.objects.filter(
+                    Exists(Favorite.objects.filter(
+                        user_id=OuterRef('user_id'),
+                        recipe_id=OuterRef('recipe_id'),
+                    )),
+                    recipe_id__in=chunk,
+                ),
+                2 * FAVORITE_WEIGHT * SHOPPING_CART_WEIGHT,
+            ),
+        ):
+            for recipe_id, count in queryset.order_by().values(
+                'recipe_id'
+            ).annotate(count=Count('id')).values_list('recipe_id', 'count'):
+                squares[recipe_id] += factor * count
+    return np.sqrt(np.array(list(squares.values()), dtype=float))
+
+
+def iter_top_similar(matrix, rows, top_k, block_size=BLOCK_SIZE,
+                     norms=None):
+    """
+    Для столбцов rows матрицы взаимодействий — top_k самых похожих
+    столбцов по косинусному сходству со сглаживанием.
+    Совместная встречаемость считается блоками: X[:, block].T @ X.
+    norms — нормы столбцов, если в матрице не все пользователи.
+    Выдаёт тройки (строка, индексы похожих, сходство).
+    """
+    matrix = matrix.tocsc()
+    if norms is None:
+        # У каждого столбца есть хотя бы одно взаимодействие, нулей нет.
+        norms = np.sqrt(
+            np.asarray(matrix.multiply(matrix).sum(axis=0)).ravel()
+        )
+    for block in chunked(list(rows), block_size):
+        block = np.asarray(block)
+        scores = (matrix[:, block].T @ matrix).tocsr()
+        scores[np.arange(len(block)), block] = 0
+        scores.eliminate_zeros()
+        counts = scores.data
+        block_rows = np.repeat(block, np.diff(scores.indptr))
+        scores.data = (
+            counts / (norms[block_rows] * norms[scores.indices])
+            * counts / (counts + SHRINKAGE)
+        )
+        for index, row in enumerate(block):
+            start, end = scores.indptr[index], scores.indptr[index + 1]
+            columns = scores.indices[start:end]
+            values = scores.data[start:end]
+            if len(values) > top_k:
+                best = np.argpartition(-values, top_k)[:top_k]
+                columns, values = columns[best], values[best]
+            order = np.argsort(-values, kind='stable')
+            yield row, columns[order], values[order]
+
+
+def refresh_similar_recipes(full=False, top_k=None, block_size=BLOCK_SIZE):
+    """
+    Пересчитывает таблицу похожих рецептов. По умолчанию только для
+    рецептов, затронутых изменениями из журнала: изменённых и всех
+    рецептов пользователей, чьи избранное или корзина поменялись.
+    Если изменений слишком много или таблица пуста, пересчитывает всё.
+    Обработанные записи журнала удаляются в конце, поэтому изменения
+    во время пересчёта дождутся следующего запуска. Возвращает число
+    пересчитанных рецептов.
+    """
+    top_k = top_k or settings.SIMILAR_RECIPES_TOP_K
+    change_ids, changes = read_changes()
+    if full or not RecipeSimilarity.objects.exists():
+        changes = None
+
+    if changes is None:
+        # Всё, что закоммичено до чтения матрицы, пересчёт учтёт, даже
+        # если read_changes прочитала не весь журнал.
+        last_change_id = InteractionChange.objects.aggregate(
+            last=Max('id')
+        )['last'] or 0
+        matrix, user_ids, recipe_ids = load_interactions()
+        norms = None
+        rows = np.arange(len(recipe_ids))
+        stale = set(
+            RecipeSimilarity.objects.values_list('recipe_id', flat=True)
+            .distinct()
+        ) - set(recipe_ids.tolist())
+    else:
+        # Для затронутых рецептов нужны только строки их пользователей;
+        # нормы остальных столбцов считаются в БД.
+        changed_recipes = {recipe_id for _, recipe_id in changes}
+        affected = changed_recipes | get_related_ids(
+            'recipe_id', 'user_id', {user_id for user_id, _ in changes}
+        )
+        matrix, user_ids, recipe_ids = load_interactions(
+            get_related_ids('user_id', 'recipe_id', affected)
+        )
+        norms = load_norms(recipe_ids)
+        rows = np.flatnonzero(np.isin(recipe_ids, sorted(affected)))
+        stale = changed_recipes - set(recipe_ids.tolist())
+
+    if stale:
+        RecipeSimilarity.objects.filter(recipe_id__in=stale).delete()
+    for batch in chunked(
+        iter_top_similar(matrix, rows, top_k, block_size, norms),
+        block_size,
+    ):
+        ids = [int(recipe_ids[row]) for row, _, _ in batch]
+        with transaction.atomic():
+            RecipeSimilarity.objects.filter(recipe_id__in=ids).delete()
+            RecipeSimilarity.objects.bulk_create(
+                (
+                    RecipeSimilarity(
+                        recipe_id=recipe_id,
+                        similar_id=int(recipe_ids[column]),
+                        score=float(score),
+                    )
+                    for recipe_id, (_, columns, scores) in zip(ids, batch)
+                    for column, score in zip(columns, scores)
+                ),
+                batch_size=block_size,
+            )
+    if changes is None:
+        InteractionChange.objects.filter(id__lte=last_change_id).delete()
+    else:
+        for ids in chunked(change_ids, BLOCK_SIZE):
+            InteractionChange.objects.filter(id__in=ids).delete()
+    return len(rows)
+
+
+def get_recommended_ids(user, limit):
+    """
+    Рецепты, похожие на избранное и корзину пользователя, кроме уже
+    добавленных, по сумме сходства. Список id.
+    """
+    interacted = set(
+        Favorite.objects.filter(user=user).order_by().values_list(
+            'recipe_id', flat=True
+        ).union(ShoppingCart.objects.filter(user=user).order_by().values_list(
+            'recipe_id', flat=True
+        ))
+    )
+    if not interacted:
+        return []
+    return list(
+        RecipeSimilarity.objects.filter(
+            recipe_id__in=interacted
+        ).exclude(
+            similar_id__in=interacted
+        ).values('similar_id').annotate(
+            total=Sum('score')
+        ).order_by('-total', '-similar_id').values_list(
+            'similar_id', flat=True
+        )[:limit]
+    )
@@ -0,0 +1,135 @@
+import re
+
+from django.db import connection
+from django.db.models import BooleanField, FloatField, Q
+from django.db.models.expressions import RawSQL
+
+from .autocomplete import normalize
+from .models import Recipe
+from .shopping_list import chunked
+
+SEARCH_CONFIG = 'russian'
+SEARCH_TABLE = 'recipes_recipe_search'
+# Веса полей: название, описание, ингредиенты.
+FTS5_WEIGHTS = (10.0, 4.0, 1.0)
+IDS_PER_QUERY = 500
+
+INGREDIENT_NAMES_SQL = (
+    'coalesce((SELECT {aggregate} '
+    'FROM recipes_recipeingredient AS recipe_ingredient '
+    'JOIN recipes_ingredient AS ingredient '
+    'ON ingredient.id = recipe_ingredient.ingredient_id '
+    "WHERE recipe_ingredient.recipe_id = recipe.id), '')"
+)
+POSTGRES_UPDATE_SQL = (
+    'UPDATE recipes_recipe AS recipe SET search_vector = '
+    "setweight(to_tsvector(%(config)s, translate(recipe.name, 'ёЁ', 'еЕ')), "
+    "'A') || "
+    "setweight(to_tsvector(%(config)s, translate(recipe.text, 'ёЁ', 'еЕ')), "
+    "'B') || "
+    'setweight(to_tsvector(%(config)s, translate({ingredients}, '
+    "'ёЁ', 'еЕ')), 'C')"
+).format(ingredients=INGREDIENT_NAMES_SQL.format(
+    aggregate="string_agg(ingredient.name, ' ')"
+))
+# replace в SQLite учитывает регистр, поэтому Ё заменяется отдельно.
+SQLITE_REPLACE_YO = "replace(replace({}, 'ё', 'е'), 'Ё', 'Е')"
+SQLITE_INSERT_SQL = (
+    f'INSERT INTO {SEARCH_TABLE} (rowid, name, text, ingredients) '
+    'SELECT recipe.id, {name}, {text}, {ingredients} '
+    'FROM recipes_recipe AS recipe'
+).format(
+    name=SQLITE_REPLACE_YO.format('recipe.name'),
+    text=SQLITE_REPLACE_YO.format('recipe.text'),
+    ingredients=SQLITE_REPLACE_YO.format(INGREDIENT_NAMES_SQL.format(
+        aggregate="group_concat(ingredient.name, ' ')"
+    )),
+)
+
+
+def update_search_index(recipe_ids=None):
+    """
+    Пересчитывает поисковый индекс для рецептов recipe_ids,
+    без аргументов — для всех; удалённые рецепты уходят из индекса.
+    На Postgres это столбец search_vector, на SQLite — таблица FTS5.
+    """
+    if connection.vendor not in ('postgresql', 'sqlite'):
+        return
+    batches = (
+        [None] if recipe_ids is None
+        else chunked(list(recipe_ids), IDS_PER_QUERY)
+    )
+    with connection.cursor() as cursor:
+        for ids in batches:
+            if connection.vendor == 'postgresql':
+                sql = POSTGRES_UPDATE_SQL
+                if ids is not None:
+                    sql += ' WHERE recipe.id = ANY(%(ids)s)'
+                cursor.execute(sql, {'config': SEARCH_CONFIG, 'ids': ids})
+                continue
+            if ids is None:
+                cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+                cursor.execute(SQLITE_INSERT_SQL)
+                continue
+            placeholders = ', '.join(['%s'] * len(ids))
+            cursor.execute(
+                f'DELETE FROM {SEARCH_TABLE} WHERE rowid IN ({placeholders})',
+                ids
+            )
+            cursor.execute(
+                SQLITE_INSERT_SQL + f' WHERE recipe.id IN ({placeholders})',
+                ids
+            )
+
+
+def get_fts5_query(query):
+    """Каждое слово — отдельный префиксный терм в кавычках."""
+    return ' '.join(
+        '"{}"*'.format(word.replace('"', '""'))
+        for word in re.findall(r'\w+', normalize(query))
+    )
+
+
+def search_recipes(queryset, query):
+    """
+    Оставляет рецепты, подходящие под запрос по названию, описанию
+    или ингредиентам, и сортирует их по релевантности (search_rank).
+    """
+    query = normalize(query).strip()
+    if not query:
+        return queryset
+    table = connection.ops.quote_name(Recipe._meta.db_table)
+    if connection.vendor == 'postgresql':
+        tsquery = 'websearch_to_tsquery(%s, %s)'
+        return queryset.annotate(
+            search_rank=RawSQL(
+                f'ts_rank({table}.search_vector, {tsquery})',
+                [SEARCH_CONFIG, query], output_field=FloatField()
+            )
+        ).filter(
+            RawSQL(
+                f'{table}.search_vector @@ {tsquery}',
+                [SEARCH_CONFIG, query], output_field=BooleanField()
+            )
+        ).order_by('-search_rank', '-pub_date', '-id')
+    if connection.vendor == 'sqlite':
+        fts_query = get_fts5_query(query)
+        if not fts_query:
+            return queryset.none()
+        weights = ', '.join(str(weight) for weight in FTS5_WEIGHTS)
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s',
+            [fts_query]
+        )).annotate(
+            search_rank=RawSQL(
+                f'SELECT -bm25({SEARCH_TABLE}, {weights}) FROM {SEARCH_TABLE} '
+                f'WHERE {SEARCH_TABLE} MATCH %s '
+                f'AND {SEARCH_TABLE}.rowid = {table}.id',
+                [fts_query], output_field=FloatField()
+            )
+        ).order_by('-search_rank', '-pub_date', '-id')
+    return queryset.filter(
+        Q(name__icontains=query)
+        | Q(text__icontains=query)
+        | Q(recipe_ingredients__ingredient__name__icontains=query)
+    ).distinct()
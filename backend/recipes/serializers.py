@@ -1,11 +1,18 @@
+import posixpath
+
 from django.db import transaction
+from foodgram.images import get_thumbnails
+from foodgram.profiling import ProfiledSerializerMixin
 from rest_framework import serializers
 from users.serializers import Base64ImageField, CustomUserSerializer
 
+from .changes import recipes_changed
 from .models import MAX_VALUE, MIN_VALUE, Ingredient, Recipe, RecipeIngredient
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(
+    ProfiledSerializerMixin, serializers.ModelSerializer
+):
     class Meta:
         model = Ingredient
         fields = ('id', 'name', 'measurement_unit')
@@ -35,20 +42,49 @@ class RecipeIngredientWriteSerializer(serializers.ModelSerializer):
         fields = ('id', 'amount')
 
 
-class RecipeMinifiedSerializer(serializers.ModelSerializer):
-    image = serializers.SerializerMethodField()
-
-    class Meta:
-        model = Recipe
-        fields = ('id', 'name', 'image', 'cooking_time')
+class RecipeImageMixin:
+    """Поля image, image_thumb и srcset рецепта."""
 
     def get_image(self, obj):
         if obj.image:
             return obj.image.url
         return None
 
+    def get_thumbnails(self, obj):
+        if not hasattr(obj, '_thumbnails'):
+            obj._thumbnails = get_thumbnails(obj.image)
+        return obj._thumbnails
+
+    def get_image_thumb(self, obj):
+        thumbnails = self.get_thumbnails(obj)
+        if thumbnails is None:
+            return self.get_image(obj)
+        return thumbnails['thumb']
+
+    def get_srcset(self, obj):
+        thumbnails = self.get_thumbnails(obj)
+        if thumbnails is None:
+            return None
+        return thumbnails['srcset']
+
+
+class RecipeMinifiedSerializer(
+    RecipeImageMixin, ProfiledSerializerMixin, serializers.ModelSerializer
+):
+    image = serializers.SerializerMethodField()
+    image_thumb = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Recipe
+        fields = (
+            'id', 'name', 'image', 'image_thumb', 'srcset', 'cooking_time'
+        )
 
-class RecipeReadSerializer(serializers.ModelSerializer):
+
+class RecipeReadSerializer(
+    RecipeImageMixin, ProfiledSerializerMixin, serializers.ModelSerializer
+):
     author = CustomUserSerializer(read_only=True)
     ingredients = RecipeIngredientReadSerializer(
         source='recipe_ingredients', many=True
@@ -56,21 +92,20 @@ class RecipeReadSerializer(serializers.ModelSerializer):
     is_favorited = serializers.SerializerMethodField()
     is_in_shopping_cart = serializers.SerializerMethodField()
     image = serializers.SerializerMethodField()
+    image_thumb = serializers.SerializerMethodField()
+    srcset = serializers.SerializerMethodField()
 
     class Meta:
         model = Recipe
         fields = (
             'id', 'author', 'ingredients',
             'is_favorited', 'is_in_shopping_cart',
-            'name', 'image', 'text', 'cooking_time'
+            'name', 'image', 'image_thumb', 'srcset', 'text', 'cooking_time'
         )
 
-    def get_image(self, obj):
-        if obj.image:
-            return obj.image.url
-        return None
-
     def get_is_favorited(self, obj):
+        if hasattr(obj, 'is_favorited'):
+            return obj.is_favorited
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return request.user.favorites.filter(
@@ -79,6 +114,8 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return False
 
     def get_is_in_shopping_cart(self, obj):
+        if hasattr(obj, 'is_in_shopping_cart'):
+            return obj.is_in_shopping_cart
         request = self.context.get('request')
         if request and request.user.is_authenticated:
             return request.user.shopping_cart.filter(
@@ -87,6 +124,13 @@ class RecipeReadSerializer(serializers.ModelSerializer):
         return False
 
 
+class PantryRecipeSerializer(RecipeReadSerializer):
+    missing_count = serializers.IntegerField(read_only=True)
+
+    class Meta(RecipeReadSerializer.Meta):
+        fields = RecipeReadSerializer.Meta.fields + ('missing_count',)
+
+
 class RecipeWriteSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientWriteSerializer(many=True)
     image = Base64ImageField()
@@ -144,6 +188,43 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
         self.create_ingredients(ingredients, recipe)
         return recipe
 
+    def update_ingredients(self, recipe, ingredients):
+        """
+        Приводит ингредиенты рецепта к новому списку, меняя только
+        отличающиеся строки. Возвращает True, если что-то изменилось.
+        """
+        rows = recipe.recipe_ingredients.values_list(
+            'pk', 'ingredient_id', 'amount'
+        ).order_by()
+        existing = {
+            ingredient_id: (pk, amount) for pk, ingredient_id, amount in rows
+        }
+        amounts = {item['id']: item['amount'] for item in ingredients}
+        to_create = [
+            RecipeIngredient(
+                recipe=recipe, ingredient_id=ingredient_id, amount=amount
+            )
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id not in existing
+        ]
+        to_update = [
+            RecipeIngredient(pk=existing[ingredient_id][0], amount=amount)
+            for ingredient_id, amount in amounts.items()
+            if ingredient_id in existing
+            and existing[ingredient_id][1] != amount
+        ]
+        to_delete = [
+            pk for ingredient_id, (pk, _) in existing.items()
+            if ingredient_id not in amounts
+        ]
+        if to_delete:
+            RecipeIngredient.objects.filter(pk__in=to_delete).delete()
+        if to_update:
+            RecipeIngredient.objects.bulk_update(to_update, ['amount'])
+        if to_create:
+            RecipeIngredient.objects.bulk_create(to_create)
+        return bool(to_create or to_update or to_delete)
+
     @transaction.atomic
     def update(self, instance, validated_data):
         if 'ingredients' not in validated_data:
@@ -153,21 +234,28 @@ class RecipeWriteSerializer(serializers.ModelSerializer):
 
         ingredients = validated_data.pop('ingredients')
 
-        instance.name = validated_data.get('name', instance.name)
-        instance.text = validated_data.get('text', instance.text)
-        instance.cooking_time = validated_data.get(
-            'cooking_time', instance.cooking_time
-        )
-        if validated_data.get('image'):
-            instance.image = validated_data.get('image', instance.image)
-        instance.save()
-
-        instance.recipe_ingredients.all().delete()
-        self.create_ingredients(ingredients, instance)
+        changed_fields = [
+            field for field in ('name', 'text', 'cooking_time')
+            if field in validated_data
+            and getattr(instance, field) != validated_data[field]
+        ]
+        for field in changed_fields:
+            setattr(instance, field, validated_data[field])
+        image = validated_data.get('image')
+        if image and posixpath.basename(instance.image.name) != image.name:
+            instance.image = image
+            changed_fields.append('image')
+        if changed_fields:
+            instance.save(update_fields=changed_fields)
+
+        if self.update_ingredients(instance, ingredients):
+            # bulk_update и bulk_create не отправляют сигналы.
+            recipes_changed(instance.pk)
 
         return instance
 
     def to_representation(self, instance):
         request = self.context.get('request')
         context = {'request': request}
+        instance = Recipe.objects.for_read(request.user).get(pk=instance.pk)
         return RecipeReadSerializer(instance, context=context).data
@@ -0,0 +1,168 @@
+import csv
+import hashlib
+import tempfile
+
+from django.conf import settings
+from django.db.models import Sum
+from django.utils.http import quote_etag
+
+from .models import RecipeIngredient
+
+try:
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFError, TTFont
+    from reportlab.pdfgen import canvas
+except ImportError:
+    canvas = None
+
+TITLE = 'Список покупок'
+CSV_HEADER = ('Ингредиент', 'Единица измерения', 'Количество')
+ROWS_PER_CHUNK = 500
+FILE_CHUNK_SIZE = 64 * 1024
+
+
+def get_cart_ingredients(user):
+    """
+    Суммарное количество каждого ингредиента из корзины пользователя:
+    список строк (название, единица, количество). Строк не больше, чем
+    разных ингредиентов, поэтому они читаются одним запросом и служат
+    и для ETag, и для выгрузки.
+    """
+    return list(RecipeIngredient.objects.filter(
+        recipe__shopping_cart__user=user
+    ).values_list(
+        'ingredient__name', 'ingredient__measurement_unit'
+    ).annotate(
+        total_amount=Sum('amount')
+    ).order_by('ingredient__name', 'ingredient__measurement_unit'))
+
+
+def get_cart_etag(ingredients, exporter):
+    """ETag по содержимому корзины: совпадает, пока список не изменился."""
+    digest = hashlib.sha256(exporter.extension.encode())
+    for name, unit, amount in ingredients:
+        digest.update(f'{name}\x1f{unit}\x1f{amount}\x1e'.encode())
+    return quote_etag(digest.hexdigest())
+
+
+def chunked(rows, size=ROWS_PER_CHUNK):
+    chunk = []
+    for row in rows:
+        chunk.append(row)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+class ExportUnavailableError(Exception):
+    """Формат выгрузки сейчас недоступен."""
+
+
+class Exporter:
+    extension = None
+    content_type = None
+
+    def prepare(self):
+        """Проверки до начала ответа; ошибки — ExportUnavailableError."""
+
+    def render(self, ingredients):
+        raise NotImplementedError
+
+
+class TextExporter(Exporter):
+    extension = 'txt'
+    content_type = 'text/plain; charset=utf-8'
+
+    def render(self, ingredients):
+        yield f'{TITLE}:\n\n'
+        for chunk in chunked(ingredients):
+            yield ''.join(
+                f'{name} ({unit}) — {amount}\n'
+                for name, unit, amount in chunk
+            )
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи."""
+
+    def write(self, value):
+        return value
+
+
+class CsvExporter(Exporter):
+    extension = 'csv'
+    content_type = 'text/csv; charset=utf-8'
+
+    def render(self, ingredients):
+        writer = csv.writer(Echo())
+        yield '\ufeff' + writer.writerow(CSV_HEADER)
+        for chunk in chunked(ingredients):
+            yield ''.join(writer.writerow(row) for row in chunk)
+
+
+class PdfExporter(Exporter):
+    extension = 'pdf'
+    content_type = 'application/pdf'
+    font_name = 'ShoppingListFont'
+    font_size = 11
+    line_height = 16
+    margin = 50
+
+    def prepare(self):
+        # Шрифт регистрируется до ответа: без него выгрузка оборвалась
+        # бы посреди потока.
+        if self.font_name in pdfmetrics.getRegisteredFontNames():
+            return
+        try:
+            font = TTFont(self.font_name, settings.SHOPPING_LIST_PDF_FONT)
+        except (OSError, TTFError):
+            raise ExportUnavailableError(
+                'Выгрузка в PDF недоступна: не найден шрифт '
+                'SHOPPING_LIST_PDF_FONT.'
+            )
+        pdfmetrics.registerFont(font)
+
+    def render(self, ingredients):
+        # reportlab не умеет писать PDF по частям, поэтому документ
+        # собирается во временный файл и отдаётся блоками.
+        with tempfile.SpooledTemporaryFile(
+            max_size=FILE_CHUNK_SIZE * 16
+        ) as file:
+            self.write(ingredients, file)
+            file.seek(0)
+            while True:
+                data = file.read(FILE_CHUNK_SIZE)
+                if not data:
+                    break
+                yield data
+
+    def write(self, ingredients, file):
+        self.prepare()
+        font = self.font_name
+        _, height = A4
+        pdf = canvas.Canvas(file, pagesize=A4)
+        pdf.setTitle(TITLE)
+        pdf.setFont(font, self.font_size + 4)
+        y = height - self.margin
+        pdf.drawString(self.margin, y, TITLE)
+        y -= self.line_height * 2
+        pdf.setFont(font, self.font_size)
+        for name, unit, amount in ingredients:
+            if y < self.margin:
+                pdf.showPage()
+                pdf.setFont(font, self.font_size)
+                y = height - self.margin
+            pdf.drawString(self.margin, y, f'{name} ({unit}) — {amount}')
+            y -= self.line_height
+        pdf.save()
+
+
+EXPORTERS = {
+    exporter.extension: exporter
+    for exporter in (TextExporter(), CsvExporter())
+}
+if canvas is not None:
+    EXPORTERS[PdfExporter.extension] = PdfExporter()
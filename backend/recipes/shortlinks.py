@@ -0,0 +1,210 @@
+import atexit
+import secrets
+import string
+import threading
+import time
+from collections import Counter, OrderedDict, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import IntegrityError, close_old_connections, transaction
+from django.db.models import F
+from foodgram.caching import is_shared_cache
+
+from .models import Recipe, ShortLink
+
+ALPHABET = string.digits + string.ascii_letters
+CODE_KEY = 'recipes:short-link:code:{}'
+RECIPE_KEY = 'recipes:short-link:recipe:{}'
+CODE_ATTEMPTS = 5
+
+
+def generate_code(length=None):
+    length = length or settings.SHORT_LINK_CODE_LENGTH
+    return ''.join(secrets.choice(ALPHABET) for _ in range(length))
+
+
+def get_short_code(recipe_id):
+    """
+    Код короткой ссылки рецепта; ссылка создаётся при первом запросе.
+    None, если рецепта нет.
+    """
+    try:
+        recipe_id = int(recipe_id)
+    except (TypeError, ValueError):
+        return None
+    shared = is_shared_cache()
+    if shared:
+        code = cache.get(RECIPE_KEY.format(recipe_id))
+        if code is not None:
+            return code
+    code = ShortLink.objects.filter(recipe_id=recipe_id).values_list(
+        'code', flat=True
+    ).first()
+    if code is None:
+        if not Recipe.objects.filter(pk=recipe_id).exists():
+            return None
+        code = _create(recipe_id)
+    if shared:
+        cache.set_many(
+            {
+                RECIPE_KEY.format(recipe_id): code,
+                CODE_KEY.format(code): recipe_id,
+            },
+            settings.SHORT_LINK_CACHE_TIMEOUT,
+        )
+    return code
+
+
+def _create(recipe_id):
+    for _ in range(CODE_ATTEMPTS):
+        code = generate_code()
+        try:
+            with transaction.atomic():
+                ShortLink.objects.create(recipe_id=recipe_id, code=code)
+        except IntegrityError:
+            # Ссылку уже создал параллельный запрос или код занят.
+            existing = ShortLink.objects.filter(
+                recipe_id=recipe_id
+            ).values_list('code', flat=True).first()
+            if existing is not None:
+                return existing
+            continue
+        return code
+    raise IntegrityError(
+        f'Не удалось подобрать свободный код за {CODE_ATTEMPTS} попыток'
+    )
+
+
+class CodeResolver:
+    """
+    Код → id рецепта: LRU в памяти процесса, затем общий кеш (если он
+    общий, а не LocMemCache), затем уникальный индекс ShortLink.code.
+    Таблица рецептов не читается. Коды не меняются, поэтому записи
+    устаревают только при удалении рецепта: сигнал чистит свой процесс
+    и общий кеш, в LRU других процессов запись доживает не дольше
+    SHORT_LINK_LOCAL_TIMEOUT.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._codes = OrderedDict()
+
+    def resolve(self, code):
+        now = time.monotonic()
+        with self._lock:
+            entry = self._codes.get(code)
+            if entry is not None:
+                if entry[0] > now:
+                    self._codes.move_to_end(code)
+                    return entry[1]
+                del self._codes[code]
+        shared = is_shared_cache()
+        recipe_id = cache.get(CODE_KEY.format(code)) if shared else None
+        if recipe_id is None:
+            recipe_id = ShortLink.objects.filter(code=code).values_list(
+                'recipe_id', flat=True
+            ).first()
+            if recipe_id is None:
+                return None
+            if shared:
+                cache.set(
+                    CODE_KEY.format(code), recipe_id,
+                    settings.SHORT_LINK_CACHE_TIMEOUT,
+                )
+        expires = now + settings.SHORT_LINK_LOCAL_TIMEOUT
+        with self._lock:
+            self._codes[code] = (expires, recipe_id)
+            while len(self._codes) > settings.SHORT_LINK_LOCAL_CACHE_SIZE:
+                self._codes.popitem(last=False)
+        return recipe_id
+
+    def invalidate(self, code, recipe_id):
+        cache.delete_many(
+            [CODE_KEY.format(code), RECIPE_KEY.format(recipe_id)]
+        )
+        with self._lock:
+            self._codes.pop(code, None)
+
+
+class HitBuffer:
+    """
+    Счётчики переходов в памяти процесса. Записываются в БД пачкой
+    в фоновом потоке, когда накопилось SHORT_LINK_HITS_BATCH переходов,
+    по таймеру раз в SHORT_LINK_HITS_INTERVAL секунд (даже если новых
+    переходов нет) и при остановке процесса. При аварийном завершении
+    несохранённые переходы теряются.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._hits = Counter()
+        self._pending = 0
+        self._timer = None
+        self._executor = ThreadPoolExecutor(
+            max_workers=1, thread_name_prefix='short-link-hits'
+        )
+
+    def add(self, code):
+        with self._lock:
+            self._hits[code] += 1
+            self._pending += 1
+            self._start_timer()
+            if self._pending < settings.SHORT_LINK_HITS_BATCH:
+                return
+            hits = self._take()
+        self._executor.submit(self._write_in_thread, hits)
+
+    def flush(self):
+        with self._lock:
+            hits = self._take()
+        self._write(hits)
+
+    def _take(self):
+        self._pending = 0
+        try:
+            return self._hits
+        finally:
+            self._hits = Counter()
+
+    def _start_timer(self):
+        # Поток запускается при первом переходе в рабочем процессе:
+        # потоки родителя после fork не наследуются.
+        if self._timer is None or not self._timer.is_alive():
+            self._timer = threading.Thread(
+                target=self._run_timer, name='short-link-hits-timer',
+                daemon=True,
+            )
+            self._timer.start()
+
+    def _run_timer(self):
+        while True:
+            time.sleep(settings.SHORT_LINK_HITS_INTERVAL)
+            with self._lock:
+                if not self._pending:
+                    continue
+                hits = self._take()
+            self._executor.submit(self._write_in_thread, hits)
+
+    def _write_in_thread(self, hits):
+        close_old_connections()
+        try:
+            self._write(hits)
+        finally:
+            close_old_connections()
+
+    def _write(self, hits):
+        # Коды с одинаковым числом переходов обновляются одним запросом.
+        codes_by_count = defaultdict(list)
+        for code, count in hits.items():
+            codes_by_count[count].append(code)
+        for count, codes in codes_by_count.items():
+            ShortLink.objects.filter(code__in=codes).update(
+                hits=F('hits') + count
+            )
+
+
+code_resolver = CodeResolver()
+hit_buffer = HitBuffer()
+atexit.register(hit_buffer.flush)
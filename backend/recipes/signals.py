@@ -0,0 +1,143 @@
+from django.db import transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from foodgram.images import schedule_thumbnails
+from users.models import Subscription, User
+
+from .autocomplete import ingredient_index
+from .cache import invalidate_recipes
+from .changes import interactions_changed, recipes_changed
+from .feed import backfill, clear_feed, fan_out
+from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                     ShoppingCart, ShortLink)
+from .pantry import mark_recipes_deleted
+from .shortlinks import code_resolver
+
+# Модель связи → (модель со счётчиком, поле связи, поле счётчика).
+COUNTERS = {
+    Favorite: (Recipe, 'recipe_id', 'favorites_count'),
+    ShoppingCart: (Recipe, 'recipe_id', 'in_carts_count'),
+    Recipe: (User, 'author_id', 'recipes_count'),
+    Subscription: (User, 'author_id', 'subscribers_count'),
+}
+
+
+@receiver(post_save, sender=Ingredient)
+@receiver(post_delete, sender=Ingredient)
+def invalidate_ingredient_index(**kwargs):
+    ingredient_index.invalidate()
+
+
+@receiver(post_save, sender=Ingredient)
+def ingredient_recipes_changed(instance, created, **kwargs):
+    if created:
+        return
+    recipe_ids = RecipeIngredient.objects.filter(
+        ingredient=instance
+    ).values_list('recipe_id', flat=True)
+    if recipe_ids:
+        recipes_changed(*recipe_ids)
+
+
+@receiver(post_save, sender=Recipe)
+@receiver(post_delete, sender=Recipe)
+def recipe_changed(instance, **kwargs):
+    recipes_changed(instance.pk)
+
+
+@receiver(post_delete, sender=Recipe)
+def recipe_deleted(instance, **kwargs):
+    recipe_id = instance.pk
+    transaction.on_commit(lambda: mark_recipes_deleted(recipe_id))
+
+
+@receiver(post_save, sender=RecipeIngredient)
+@receiver(post_delete, sender=RecipeIngredient)
+def recipe_ingredient_changed(instance, **kwargs):
+    recipes_changed(instance.recipe_id)
+
+
+@receiver(post_save, sender=Recipe)
+def fan_out_recipe(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(lambda: fan_out([instance.pk]))
+
+
+@receiver(post_save, sender=Subscription)
+def backfill_feed(instance, created, **kwargs):
+    if created:
+        transaction.on_commit(
+            lambda: backfill(instance.user_id, instance.author_id)
+        )
+
+
+@receiver(post_delete, sender=Subscription)
+def subscription_deleted(instance, **kwargs):
+    clear_feed(instance.user_id, instance.author_id)
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_thumbnails(instance, **kwargs):
+    if instance.image:
+        schedule_thumbnails(
+            instance.image.name, lambda: invalidate_recipes(instance.pk)
+        )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_delete, sender=ShoppingCart)
+def interaction_changed(sender, instance, **kwargs):
+    interactions_changed(sender, instance.user_id, [instance.recipe_id])
+
+
+@receiver(post_save, sender=User)
+def invalidate_author_recipes_cache(instance, update_fields, **kwargs):
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    recipe_ids = list(instance.recipes.values_list('id', flat=True))
+    if recipe_ids:
+        transaction.on_commit(lambda: invalidate_recipes(*recipe_ids))
+    if instance.avatar:
+        schedule_thumbnails(
+            instance.avatar.name, lambda: invalidate_recipes(*recipe_ids)
+        )
+
+
+@receiver(post_delete, sender=ShortLink)
+def short_link_deleted(instance, **kwargs):
+    transaction.on_commit(
+        lambda: code_resolver.invalidate(instance.code, instance.recipe_id)
+    )
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Recipe)
+@receiver(post_save, sender=Subscription)
+def counter_increment(sender, instance, created, **kwargs):
+    if created:
+        shift_counter(sender, instance, 1)
+
+
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Recipe)
+@receiver(post_delete, sender=Subscription)
+def counter_decrement(sender, instance, **kwargs):
+    shift_counter(sender, instance, -1)
+
+
+def shift_counter(sender, instance, delta):
+    """
+    Счётчики меняются при любом сохранении и удалении через ORM
+    (админка, каскадное удаление). API меняет связи SQL-запросами
+    без сигналов и обновляет счётчики сам; bulk_create — тоже.
+    """
+    model, link, field = COUNTERS[sender]
+    model.objects.filter(pk=getattr(instance, link)).update(
+        **{field: Greatest(F(field) + delta, 0)}
+    )
@@ -0,0 +1,961 @@
+import base64
+import json
+import shutil
+import tempfile
+import time
+from datetime import timedelta
+from io import StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management import call_command
+from django.db import transaction
+from django.test import (AsyncClient, SimpleTestCase, TestCase,
+                         TransactionTestCase, override_settings)
+from django.utils import timezone
+from foodgram.profiling import QueryBudgetExceeded
+from foodgram.renderers import FastJSONRenderer
+from rest_framework.authtoken.models import Token
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APITestCase
+from users.models import Subscription, User
+
+from .autocomplete import IngredientIndex
+from .changes import recipes_changed
+from .models import (Favorite, FeedEntry, Ingredient, InteractionChange,
+                     Recipe, RecipeDeletion, RecipeIngredient,
+                     RecipeSimilarity, ShoppingCart, ShortLink)
+from .pantry import PantryIndex
+from .recommendations import refresh_similar_recipes
+from .serializers import RecipeWriteSerializer
+from .shopping_list import EXPORTERS
+from .shortlinks import CodeResolver, HitBuffer, get_short_code
+from .views import RecipeViewSet
+
+MEDIA_ROOT = tempfile.mkdtemp()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class RecipeBulkImportTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.admin = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password',
+            first_name='Имя', last_name='Фамилия',
+        )
+        self.ingredient = Ingredient.objects.create(
+            name='Соль', measurement_unit='г'
+        )
+        self.image = default_storage.save(
+            'recipes/images/existing.png', ContentFile(b'image')
+        )
+        self.client.force_authenticate(self.admin)
+
+    def import_rows(self, *images):
+        content = ''.join(
+            json.dumps({
+                'name': 'Рецепт',
+                'text': 'Описание',
+                'cooking_time': 10,
+                'image': image,
+                'ingredients': [{'id': self.ingredient.pk, 'amount': 1}],
+            }) + '\n'
+            for image in images
+        )
+        return self.client.post(
+            '/api/recipes/bulk/', content,
+            content_type='application/x-ndjson',
+        )
+
+    def test_image_names_outside_storage_rejected(self):
+        response = self.import_rows(
+            '../../../etc/passwd',
+            '/etc/passwd',
+            'recipes/images/../../db.sqlite3',
+            'recipes/images/missing.png',
+            'recipes/images/',
+            self.image,
+        )
+        self.assertEqual(response.status_code, 201, response.content)
+        self.assertEqual(response.data['created'], 1)
+        self.assertEqual(
+            [error['line'] for error in response.data['errors']],
+            [1, 2, 3, 4, 5],
+        )
+        self.assertEqual(
+            list(Recipe.objects.values_list('image', flat=True)),
+            [self.image],
+        )
+        self.assertEqual(self.client.get('/api/recipes/').status_code, 200)
+
+
+class CounterSignalTests(TestCase):
+    def setUp(self):
+        self.author, self.user = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия',
+            )
+            for name in ('author', 'user')
+        )
+        self.recipe = Recipe.objects.create(
+            author=self.author, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/recipe.png',
+        )
+
+    def check_counters(self, **expected):
+        self.recipe.refresh_from_db()
+        self.author.refresh_from_db()
+        self.assertEqual({
+            field: getattr(
+                self.recipe if hasattr(self.recipe, field) else self.author,
+                field
+            )
+            for field in expected
+        }, expected)
+
+    def test_orm_changes_update_counters(self):
+        self.check_counters(recipes_count=1)
+        Favorite.objects.create(user=self.user, recipe=self.recipe)
+        ShoppingCart.objects.create(user=self.user, recipe=self.recipe)
+        Subscription.objects.create(user=self.user, author=self.author)
+        self.check_counters(
+            favorites_count=1, in_carts_count=1, subscribers_count=1
+        )
+
+        self.user.delete()
+        self.check_counters(
+            favorites_count=0, in_carts_count=0, subscribers_count=0
+        )
+        self.recipe.delete()
+        self.author.refresh_from_db()
+        self.assertEqual(self.author.recipes_count, 0)
+
+    def test_decrement_stops_at_zero(self):
+        favorite = Favorite.objects.create(user=self.user, recipe=self.recipe)
+        Recipe.objects.filter(pk=self.recipe.pk).update(favorites_count=0)
+        favorite.delete()
+        self.check_counters(favorites_count=0)
+
+
+@mock.patch('recipes.changes.mark_recipes_changed')
+@mock.patch('recipes.changes.update_search_index')
+@mock.patch('recipes.changes.invalidate_recipes')
+class RecipesChangedTests(TestCase):
+    def test_changes_flushed_once_per_transaction(
+        self, invalidate, update_index, mark_changed
+    ):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            recipes_changed(1, 2)
+            recipes_changed(2, 3)
+        self.assertEqual(len(callbacks), 1)
+        self.assertCountEqual(invalidate.call_args.args, [1, 2, 3])
+        # После коммита изменения снова откладываются до следующего.
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            recipes_changed(4)
+        self.assertEqual(len(callbacks), 1)
+        invalidate.assert_called_with(4)
+
+    def test_rolled_back_changes_are_dropped(
+        self, invalidate, update_index, mark_changed
+    ):
+        with self.captureOnCommitCallbacks(execute=True) as callbacks:
+            try:
+                with transaction.atomic():
+                    recipes_changed(1)
+                    raise ValueError
+            except ValueError:
+                pass
+            recipes_changed(2)
+        self.assertEqual(len(callbacks), 1)
+        invalidate.assert_called_once_with(2)
+        update_index.assert_called_once_with([2])
+        mark_changed.assert_called_once_with(2)
+
+
+@override_settings(ASYNC_VIEWS=True)
+class AsgiExportTests(TransactionTestCase):
+    """Выгрузки под ASGI: ответ собирается в потоке представления."""
+
+    def setUp(self):
+        self.user = User.objects.create_superuser(
+            username='admin', email='admin@example.com', password='password',
+            first_name='Имя', last_name='Фамилия',
+        )
+        recipe = Recipe.objects.create(
+            author=self.user, name='Рецепт', text='Описание',
+            cooking_time=10, image='recipes/images/recipe.png',
+        )
+        recipe.recipe_ingredients.create(
+            ingredient=Ingredient.objects.create(
+                name='Соль', measurement_unit='г'
+            ),
+            amount=5,
+        )
+        ShoppingCart.objects.create(user=self.user, recipe=recipe)
+        self.token = Token.objects.create(user=self.user)
+        self.client = AsyncClient()
+
+    async def test_exports(self):
+        for path, expected in (
+            ('/api/recipes/download_shopping_cart/', 'Соль (г) — 5'),
+            ('/api/recipes/download_shopping_cart/?type=csv', 'Соль,г,5'),
+            ('/api/recipes/bulk/', '"name": "Рецепт"'),
+        ):
+            with self.subTest(path=path):
+                response = await self.client.get(
+                    path, AUTHORIZATION=f'Token {self.token}'
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertIn(expected, response.content.decode())
+
+
+class ToggleRaceTests(TransactionTestCase):
+    """Параллельные добавления и удаления не сбивают счётчики."""
+
+    def test_counters_match_rows(self):
+        out = StringIO()
+        call_command(
+            'check_toggle_races', threads=8, iterations=25, stdout=out
+        )
+        self.assertIn('Расхождений нет.', out.getvalue())
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+})
+class IngredientIndexSyncTests(TestCase):
+    """Загрузка из другого процесса не ротирует поколение в LocMemCache."""
+
+    def setUp(self):
+        Ingredient.objects.create(name='Соль', measurement_unit='г')
+        self.index = IngredientIndex()
+
+    def names(self, query):
+        return [item['name'] for item in self.index.search(query, 10)]
+
+    def test_changes_without_invalidation_are_seen(self):
+        self.assertEqual(self.names('с'), ['Соль'])
+        # bulk_create сигналов не шлёт, как и COPY в load_ingredients.
+        Ingredient.objects.bulk_create([
+            Ingredient(name='Сахар', measurement_unit='г')
+        ])
+        self.assertEqual(self.names('с'), ['Сахар', 'Соль'])
+
+        Ingredient.objects.filter(name='Соль').update(name='Соль морская')
+        self.assertEqual(self.names('соль'), ['Соль'])
+        with mock.patch(
+            'recipes.autocomplete.time.monotonic',
+            return_value=time.monotonic() + 301,
+        ):
+            self.assertEqual(self.names('соль'), ['Соль морская'])
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+})
+class PantryIndexSyncTests(TestCase):
+    """Индекс догоняет изменения по БД, без общего кеша."""
+
+    def setUp(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия',
+        )
+        self.salt, self.sugar = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар')
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe = Recipe.objects.create(
+                author=author, name='Рецепт', text='Описание',
+                cooking_time=10, image='recipes/images/recipe.png',
+            )
+            RecipeIngredient.objects.create(
+                recipe=self.recipe, ingredient=self.salt, amount=1
+            )
+        self.index = PantryIndex()
+
+    def search(self, ingredient):
+        return [pk for pk, _ in self.index.search([ingredient.pk], 10)]
+
+    def test_changes_from_other_processes_are_seen(self):
+        self.assertEqual(self.search(self.salt), [self.recipe.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.recipe_ingredients.update(ingredient=self.sugar)
+            RecipeIngredient.objects.get(recipe=self.recipe).save()
+        self.assertEqual(self.search(self.salt), [])
+        self.assertEqual(self.search(self.sugar), [self.recipe.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        # Удаление применяется по отметке, без COUNT и перестройки.
+        with mock.patch.object(self.index, '_build') as build:
+            with self.assertNumQueries(3):
+                self.assertEqual(self.search(self.sugar), [])
+        build.assert_not_called()
+        with self.assertNumQueries(2):
+            self.assertEqual(self.search(self.sugar), [])
+
+    def test_old_deletion_marks_are_pruned(self):
+        RecipeDeletion.objects.create(
+            recipe_id=0, deleted=timezone.now() - timedelta(days=2)
+        )
+        recipe_id = self.recipe.pk
+        with self.captureOnCommitCallbacks(execute=True):
+            self.recipe.delete()
+        self.assertEqual(
+            list(RecipeDeletion.objects.values_list('recipe_id', flat=True)),
+            [recipe_id],
+        )
+
+
+class RecipeIngredientUpdateTests(TestCase):
+    """Обновление рецепта меняет только отличающиеся строки состава."""
+
+    def setUp(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия',
+        )
+        self.salt, self.sugar, self.flour = (
+            Ingredient.objects.create(name=name, measurement_unit='г')
+            for name in ('Соль', 'Сахар', 'Мука')
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=10,
+            image='recipes/images/recipe.png',
+        )
+        for ingredient, amount in ((self.salt, 5), (self.sugar, 10)):
+            self.recipe.recipe_ingredients.create(
+                ingredient=ingredient, amount=amount
+            )
+        self.rows = self.get_rows()
+
+    def get_rows(self):
+        return {
+            ingredient_id: (pk, amount)
+            for pk, ingredient_id, amount in
+            self.recipe.recipe_ingredients.values_list(
+                'pk', 'ingredient_id', 'amount'
+            )
+        }
+
+    def update(self, queries, *ingredients, **fields):
+        """
+        queries — запросы без SAVEPOINT/RELEASE транзакции update
+        и без сброса кешей после коммита.
+        """
+        validated_data = {
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': amount}
+                for ingredient, amount in ingredients
+            ],
+            **fields,
+        }
+        with mock.patch('recipes.serializers.recipes_changed') as changed:
+            with self.assertNumQueries(queries + 2):
+                RecipeWriteSerializer().update(self.recipe, validated_data)
+        return changed.called
+
+    def test_no_change(self):
+        self.assertFalse(self.update(
+            1, (self.salt, 5), (self.sugar, 10),
+            name='Рецепт', text='Описание', cooking_time=10,
+        ))
+        self.assertEqual(self.get_rows(), self.rows)
+
+    def test_change_amount(self):
+        self.assertTrue(self.update(2, (self.salt, 5), (self.sugar, 20)))
+        self.assertEqual(self.get_rows(), {
+            self.salt.pk: self.rows[self.salt.pk],
+            self.sugar.pk: (self.rows[self.sugar.pk][0], 20),
+        })
+
+    def test_add(self):
+        self.assertTrue(self.update(
+            2, (self.salt, 5), (self.sugar, 10), (self.flour, 300)
+        ))
+        rows = self.get_rows()
+        self.assertEqual(rows.pop(self.flour.pk)[1], 300)
+        self.assertEqual(rows, self.rows)
+
+    def test_remove(self):
+        self.assertTrue(self.update(3, (self.salt, 5)))
+        self.assertEqual(
+            self.get_rows(), {self.salt.pk: self.rows[self.salt.pk]}
+        )
+
+    def test_mixed(self):
+        self.assertTrue(self.update(
+            6, (self.sugar, 15), (self.flour, 300), name='Новое'
+        ))
+        rows = self.get_rows()
+        self.assertEqual(rows.pop(self.flour.pk)[1], 300)
+        self.assertEqual(rows, {
+            self.sugar.pk: (self.rows[self.sugar.pk][0], 15)
+        })
+
+
+class RecipeSearchTests(APITestCase):
+    """Поиск через FTS5 (SQLite): индекс обновляется после коммита."""
+
+    def setUp(self):
+        self.author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия',
+        )
+        self.mushrooms = Ingredient.objects.create(
+            name='Грибы', measurement_unit='г'
+        )
+        patcher = mock.patch('recipes.signals.schedule_thumbnails')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def create(self, name, text='Описание', ingredient=None):
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe = Recipe.objects.create(
+                author=self.author, name=name, text=text, cooking_time=10,
+                image='recipes/images/recipe.png',
+            )
+            if ingredient is not None:
+                recipe.recipe_ingredients.create(
+                    ingredient=ingredient, amount=100
+                )
+        return recipe
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.data['results']]
+
+    def test_index_follows_insert_update_delete(self):
+        recipe = self.create('Щи', 'Сварить бульон', self.mushrooms)
+        for query in ('щи', 'бульон', 'гриб', 'БУЛЬ'):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), [recipe.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.name = 'Солянка'
+            recipe.save()
+        self.assertEqual(self.search('щи'), [])
+        self.assertEqual(self.search('солянка'), [recipe.pk])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.recipe_ingredients.all().delete()
+        self.assertEqual(self.search('грибы'), [])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            recipe.delete()
+        self.assertEqual(self.search('солянка'), [])
+
+    def test_yo_matches_ye(self):
+        recipe = self.create('Ёжики')
+        self.assertEqual(self.search('ежики'), [recipe.pk])
+        self.assertEqual(self.search('ёжики'), [recipe.pk])
+
+    def test_name_ranks_above_text_and_ingredients(self):
+        by_ingredient = self.create('Суп', ingredient=self.mushrooms)
+        by_text = self.create('Жаркое', 'Добавить грибы')
+        by_name = self.create('Грибы в сметане')
+        self.assertEqual(
+            self.search('грибы'),
+            [by_name.pk, by_text.pk, by_ingredient.pk],
+        )
+
+    def test_fts_syntax_is_literal(self):
+        """Кавычки, *, -, NEAR и OR — обычные слова, а не синтаксис FTS5."""
+        recipe = self.create('Суп NEAR дом', 'Тесто - "домашнее" *')
+        for query, expected in (
+            ('"домашнее"', [recipe.pk]),
+            ('суп*', [recipe.pk]),
+            ('суп -дом', [recipe.pk]),
+            ('NEAR(суп дом)', [recipe.pk]),
+            ('дом"', [recipe.pk]),
+            ('суп OR щи', []),
+            ('AND', []),
+            ('(', []),
+            ('*', []),
+            ('-', []),
+            ('"', []),
+        ):
+            with self.subTest(query=query):
+                self.assertEqual(self.search(query), expected)
+
+
+@override_settings(FEED_FANOUT_MAX_SUBSCRIBERS=1, FEED_MAX_ENTRIES=3)
+class FeedTests(APITestCase):
+    """
+    Лента подписок: рецепты обычных авторов раскладываются по лентам,
+    рецепты авторов с подписчиками сверх порога читаются при запросе.
+    """
+
+    def setUp(self):
+        self.reader, self.author, self.heavy, self.fan = (
+            User.objects.create_user(
+                username=name, email=f'{name}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия',
+            )
+            for name in ('reader', 'author', 'heavy', 'fan')
+        )
+        self.subscribe(self.fan, self.heavy)
+        self.client.force_authenticate(self.reader)
+        # Файлов изображений нет, миниатюры не нужны.
+        patcher = mock.patch('recipes.signals.schedule_thumbnails')
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def subscribe(self, user, author):
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.create(user=user, author=author)
+
+    def publish(self, author, count=1):
+        recipes = []
+        for number in range(count):
+            with self.captureOnCommitCallbacks(execute=True):
+                recipes.append(Recipe.objects.create(
+                    author=author, name=f'Рецепт {number}',
+                    text='Описание', cooking_time=10,
+                    image='recipes/images/recipe.png',
+                ).pk)
+        return recipes
+
+    def get_feed(self, limit=10):
+        ids = []
+        url = f'/api/recipes/feed/?limit={limit}'
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def get_entries(self):
+        return list(FeedEntry.objects.filter(user=self.reader).order_by(
+            '-pub_date', '-recipe_id'
+        ).values_list('recipe_id', flat=True))
+
+    def test_subscribe_and_unsubscribe(self):
+        old = self.publish(self.author, 2)
+        self.assertEqual(self.get_feed(), [])
+        self.subscribe(self.reader, self.author)
+        self.assertEqual(self.get_feed(), old[::-1])
+
+        new = self.publish(self.author)
+        self.assertEqual(self.get_feed(), (old + new)[::-1])
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.get(
+                user=self.reader, author=self.author
+            ).delete()
+        self.assertEqual(self.get_entries(), [])
+        self.assertEqual(self.get_feed(), [])
+
+    def test_trimmed_at_cap(self):
+        self.subscribe(self.reader, self.author)
+        recipes = self.publish(self.author, 5)
+        self.assertEqual(self.get_entries(), recipes[:-4:-1])
+
+        # Подписка на автора с длинной историей тоже не выходит за предел.
+        other = User.objects.create_user(
+            username='other', email='other@example.com', password='password',
+            first_name='Имя', last_name='Фамилия',
+        )
+        self.publish(other, 4)
+        self.subscribe(self.reader, other)
+        self.assertEqual(len(self.get_entries()), 3)
+
+    def test_heavy_author_merged_on_read(self):
+        self.subscribe(self.reader, self.author)
+        self.subscribe(self.reader, self.heavy)
+        recipes = []
+        for author in (self.author, self.heavy) * 3:
+            recipes += self.publish(author)
+        # Рецепты популярного автора в ленты не раскладываются.
+        self.assertEqual(self.get_entries(), recipes[-2::-2])
+        for limit in (1, 2, 4, 10):
+            with self.subTest(limit=limit):
+                self.assertEqual(self.get_feed(limit), recipes[::-1])
+
+
+class SimilarRecipesTests(APITestCase):
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия',
+            )
+            for number in range(3)
+        ]
+        self.recipes = [
+            Recipe.objects.create(
+                author=self.users[0], name=f'Рецепт {number}',
+                text='Описание', cooking_time=10,
+                image='recipes/images/recipe.png',
+            )
+            for number in range(3)
+        ]
+
+    def favorite(self, user, *recipes):
+        self.client.force_authenticate(user)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(
+                '/api/recipes/favorite/',
+                {'recipes': [recipe.pk for recipe in recipes]}, format='json',
+            )
+        self.assertEqual(response.status_code, 201, response.content)
+
+    def get_similar(self, recipe):
+        response = self.client.get(f'/api/recipes/{recipe.pk}/similar/')
+        self.assertEqual(response.status_code, 200)
+        return [item['id'] for item in response.data]
+
+    def test_incremental_refresh_uses_db_journal(self):
+        first, second, third = self.recipes
+        self.favorite(self.users[1], first, second)
+        self.assertEqual(refresh_similar_recipes(), 2)
+        self.assertFalse(InteractionChange.objects.exists())
+        # Только рецепты: без ингредиентов, авторов и флагов.
+        with self.assertNumQueries(1):
+            self.assertEqual(self.get_similar(first), [second.pk])
+
+        self.favorite(self.users[2], first, third)
+        # Пересчитываются только рецепты, затронутые изменениями.
+        self.assertEqual(refresh_similar_recipes(), 2)
+        self.assertEqual(refresh_similar_recipes(), 0)
+        self.assertEqual(set(self.get_similar(first)), {second.pk, third.pk})
+
+    def test_full_refresh_drains_whole_journal(self):
+        self.favorite(self.users[1], *self.recipes)
+        with mock.patch('recipes.recommendations.MAX_CHANGES', 1):
+            self.assertEqual(refresh_similar_recipes(), 3)
+        self.assertFalse(InteractionChange.objects.exists())
+
+    def get_scores(self, recipes):
+        rows = RecipeSimilarity.objects.filter(
+            recipe__in=recipes
+        ).values_list('recipe_id', 'similar_id', 'score')
+        return {
+            (recipe_id, similar_id): round(score, 9)
+            for recipe_id, similar_id, score in rows
+        }
+
+    def test_incremental_refresh_matches_full(self):
+        first, second, third = self.recipes
+        fourth = Recipe.objects.create(
+            author=self.users[0], name='Рецепт 3', text='Описание',
+            cooking_time=10, image='recipes/images/recipe.png',
+        )
+        outsider = User.objects.create_user(
+            username='outsider', email='outsider@example.com',
+            password='password', first_name='Имя', last_name='Фамилия',
+        )
+        with self.captureOnCommitCallbacks(execute=True):
+            for user, recipes in zip((*self.users, outsider), (
+                (first, second), (first, second, third), (second, fourth),
+                (fourth,),
+            )):
+                for recipe in recipes:
+                    Favorite.objects.create(user=user, recipe=recipe)
+            ShoppingCart.objects.create(user=self.users[2], recipe=third)
+        refresh_similar_recipes()
+        with self.captureOnCommitCallbacks(execute=True):
+            # Пара и в избранном, и в корзине: вес 1.5.
+            ShoppingCart.objects.create(user=self.users[0], recipe=first)
+            Favorite.objects.filter(user=self.users[1], recipe=third).delete()
+        # outsider в пересчёт не загружается, норма fourth считается в БД.
+        self.assertEqual(refresh_similar_recipes(), 3)
+        incremental = self.get_scores(self.recipes)
+        self.assertIn((second.pk, fourth.pk), incremental)
+        refresh_similar_recipes(full=True)
+        self.assertEqual(incremental, self.get_scores(self.recipes))
+
+    def test_similar_for_missing_recipe(self):
+        self.assertEqual(self.get_similar(self.recipes[0]), [])
+        for pk in (999999, 'x'):
+            response = self.client.get(f'/api/recipes/{pk}/similar/')
+            self.assertEqual(response.status_code, 404)
+
+
+class RecipeDataMixin:
+    """Рецепты разных авторов с ингредиентами, избранным и подпиской."""
+
+    @classmethod
+    def setUpTestData(cls):
+        authors = [
+            User.objects.create_user(
+                username=f'author{number}',
+                email=f'author{number}@example.com', password='password',
+                first_name='Имя', last_name='Фамилия',
+            )
+            for number in range(3)
+        ]
+        cls.user = authors[0]
+        ingredients = [
+            Ingredient.objects.create(
+                name=f'Ингредиент {number}', measurement_unit='г'
+            )
+            for number in range(4)
+        ]
+        cls.recipes = []
+        for number in range(6):
+            recipe = Recipe.objects.create(
+                author=authors[number % 3], name=f'Рецепт {number}',
+                text='Описание', cooking_time=10,
+                image='recipes/images/recipe.png',
+            )
+            for ingredient in ingredients[:number % 4 + 1]:
+                recipe.recipe_ingredients.create(
+                    ingredient=ingredient, amount=number + 1
+                )
+            cls.recipes.append(recipe)
+        Favorite.objects.create(user=cls.user, recipe=cls.recipes[1])
+        ShoppingCart.objects.create(user=cls.user, recipe=cls.recipes[2])
+        Subscription.objects.create(user=cls.user, author=authors[1])
+        User.objects.filter(pk=authors[1].pk).update(
+            avatar='users/avatar.png'
+        )
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+})
+class RecipeQueryCountTests(RecipeDataMixin, APITestCase):
+    """Число запросов list и retrieve не зависит от числа рецептов."""
+
+    def check_queries(self, user, extra):
+        """
+        list: COUNT, рецепты, ингредиенты; retrieve: рецепт, ингредиенты.
+        Флаги избранного и корзины — подзапросы в том же SQL. extra —
+        запросы сверх этого у RecipeReadSerializer (авторы с подпиской).
+        """
+        self.client.force_authenticate(user)
+        for path, count in (
+            ('/api/recipes/', 3),
+            (f'/api/recipes/{self.recipes[0].pk}/', 2),
+        ):
+            for fastpath in (True, False):
+                with self.subTest(path=path, fastpath=fastpath):
+                    with override_settings(RECIPE_FASTPATH=fastpath):
+                        with self.assertNumQueries(
+                            count if fastpath else count + extra
+                        ):
+                            response = self.client.get(path)
+                    self.assertEqual(response.status_code, 200)
+
+    def test_anonymous(self):
+        self.check_queries(None, 0)
+
+    def test_authenticated(self):
+        self.check_queries(self.user, 1)
+
+    def test_budget_exceeded(self):
+        self.assertTrue(settings.QUERY_BUDGET_STRICT)
+        budget = {**RecipeViewSet.query_budget, 'list': 2}
+        with mock.patch.object(RecipeViewSet, 'query_budget', budget):
+            with self.assertRaisesMessage(
+                QueryBudgetExceeded, 'RecipeViewSet.list: 3 запросов'
+            ):
+                self.client.get('/api/recipes/')
+
+
+@override_settings(CACHES={
+    'default': {'BACKEND': 'django.core.cache.backends.dummy.DummyCache'}
+})
+class RecipeFastPathTests(RecipeDataMixin, APITestCase):
+    """recipes.fastpath отдаёт те же байты, что RecipeReadSerializer."""
+
+    def check_bodies(self, user, paths):
+        self.client.force_authenticate(user)
+        for path in paths:
+            with self.subTest(path=path):
+                responses = []
+                for fastpath in (True, False):
+                    with override_settings(RECIPE_FASTPATH=fastpath):
+                        response = self.client.get(path)
+                    responses.append((response.status_code, response.content))
+                self.assertEqual(responses[0], responses[1])
+
+    def get_paths(self):
+        return [
+            '/api/recipes/',
+            '/api/recipes/?limit=2&page=2',
+            f'/api/recipes/?author={self.recipes[1].author_id}',
+            '/api/recipes/999999/',
+            *(f'/api/recipes/{recipe.pk}/' for recipe in self.recipes),
+        ]
+
+    def test_anonymous(self):
+        self.check_bodies(None, self.get_paths())
+
+    def test_authenticated(self):
+        self.check_bodies(self.user, [
+            *self.get_paths(),
+            '/api/recipes/?is_favorited=1',
+            '/api/recipes/?is_in_shopping_cart=1',
+        ])
+
+
+class RecipeResponseCacheTests(RecipeDataMixin, APITestCase):
+    """Изменение из другого процесса: сигналов здесь нет, как и там."""
+
+    def setUp(self):
+        cache.clear()
+        self.url = f'/api/recipes/{self.recipes[0].pk}/'
+
+    def get_name_after_update(self):
+        self.assertEqual(self.client.get(self.url).data['name'], 'Рецепт 0')
+        Recipe.objects.filter(pk=self.recipes[0].pk).update(name='Новое')
+        return self.client.get(self.url).data['name']
+
+    def test_local_cache_not_used(self):
+        self.assertEqual(self.get_name_after_update(), 'Новое')
+
+    @mock.patch('recipes.cache.is_shared_cache', return_value=True)
+    def test_shared_cache_used(self, shared):
+        self.assertEqual(self.get_name_after_update(), 'Рецепт 0')
+
+
+class PaginationTests(RecipeDataMixin, APITestCase):
+    url = '/api/recipes/'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def encode(self, value):
+        return base64.urlsafe_b64encode(json.dumps(value).encode()).decode()
+
+    def walk(self, url):
+        ids = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, 200)
+            self.assertIsNone(response.data['previous'])
+            ids.extend(recipe['id'] for recipe in response.data['results'])
+            url = response.data['next']
+        return ids
+
+    def test_cursor_round_trip(self):
+        expected = list(Recipe.objects.order_by(
+            '-pub_date', '-id'
+        ).values_list('id', flat=True))
+        self.assertEqual(self.walk(f'{self.url}?cursor=&limit=4'), expected)
+
+    def test_cursor_tie_break_on_equal_pub_date(self):
+        Recipe.objects.update(pub_date=timezone.now())
+        self.assertEqual(
+            self.walk(f'{self.url}?cursor=&limit=2'),
+            sorted((recipe.pk for recipe in self.recipes), reverse=True),
+        )
+
+    def test_malformed_cursor(self):
+        for cursor in (
+            '!!!', self.encode({'id': 1}), self.encode([1]),
+            self.encode(['не дата', 1]),
+        ):
+            with self.subTest(cursor=cursor):
+                response = self.client.get(self.url, {'cursor': cursor})
+                self.assertEqual(response.status_code, 404)
+
+    def test_filtered_count_not_stale(self):
+        url = f'{self.url}?is_favorited=1'
+        self.assertEqual(self.client.get(url).data['count'], 1)
+        Favorite.objects.create(user=self.user, recipe=self.recipes[0])
+        self.assertEqual(self.client.get(url).data['count'], 2)
+
+
+class ShoppingCartDownloadTests(RecipeDataMixin, APITestCase):
+    url = '/api/recipes/download_shopping_cart/'
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_single_aggregate_query(self):
+        for file_type in ('txt', 'csv'):
+            with self.subTest(file_type=file_type):
+                with self.assertNumQueries(1):
+                    response = self.client.get(self.url, {'type': file_type})
+                self.assertEqual(response.status_code, 200)
+                with self.assertNumQueries(1):
+                    response = self.client.get(
+                        self.url, {'type': file_type},
+                        HTTP_IF_NONE_MATCH=response['ETag'],
+                    )
+                self.assertEqual(response.status_code, 304)
+
+    def test_pdf_without_font(self):
+        if 'pdf' not in EXPORTERS:
+            self.skipTest('reportlab не установлен')
+        with mock.patch.object(
+            EXPORTERS['pdf'], 'font_name', 'MissingFont'
+        ), override_settings(SHOPPING_LIST_PDF_FONT='/nonexistent.ttf'):
+            response = self.client.get(self.url, {'type': 'pdf'})
+        self.assertEqual(response.status_code, 503)
+        self.assertIn('errors', response.data)
+
+
+class ShortLinkTests(TransactionTestCase):
+    def setUp(self):
+        author = User.objects.create_user(
+            username='author', email='author@example.com',
+            password='password', first_name='Имя', last_name='Фамилия',
+        )
+        self.recipe = Recipe.objects.create(
+            author=author, name='Рецепт', text='Описание', cooking_time=10,
+            image='recipes/images/recipe.png',
+        )
+        self.code = get_short_code(self.recipe.pk)
+
+    @override_settings(SHORT_LINK_HITS_INTERVAL=0.05)
+    def test_idle_hits_flushed_by_timer(self):
+        buffer = HitBuffer()
+        buffer.add(self.code)
+        buffer.add(self.code)
+        deadline = time.monotonic() + 5
+        while time.monotonic() < deadline:
+            if ShortLink.objects.get(code=self.code).hits == 2:
+                break
+            time.sleep(0.05)
+        self.assertEqual(ShortLink.objects.get(code=self.code).hits, 2)
+
+    @override_settings(SHORT_LINK_LOCAL_TIMEOUT=0)
+    def test_deleted_recipe_expires_in_other_processes(self):
+        # Отдельный экземпляр — LRU другого процесса: сигнал до него
+        # не доходит.
+        resolver = CodeResolver()
+        self.assertEqual(resolver.resolve(self.code), self.recipe.pk)
+        self.recipe.delete()
+        self.assertIsNone(resolver.resolve(self.code))
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def assert_same_json(self, data):
+        self.assertEqual(
+            FastJSONRenderer().render(data), JSONRenderer().render(data)
+        )
+
+    def test_output_matches_json_renderer(self):
+        self.assert_same_json({
+            'id': 1,
+            'name': 'Суп\u2028с переносом',
+            'items': [{'amount': 0.5}, {'amount': 1234.75}, None, True],
+        })
+
+    def test_exponent_floats(self):
+        for value in (1e16, -2.5e20, 1e-5, 3.3e-7):
+            with self.subTest(value=value):
+                self.assert_same_json({'values': [{'x': value}]})
+        self.assertEqual(FastJSONRenderer().render([1e16]), b'[1e+16]')
+
+    def test_non_finite_floats(self):
+        for value in (float('nan'), float('inf'), float('-inf')):
+            with self.subTest(value=value):
+                with self.assertRaises(ValueError):
+                    FastJSONRenderer().render({'x': [value]})
@@ -1,34 +1,105 @@
-from django.db.models import Sum
-from django.http import HttpResponse
+from django.conf import settings
+from django.db import transaction
+from django.http import Http404, HttpResponseRedirect
 from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
 from django_filters.rest_framework import DjangoFilterBackend
+from foodgram.asynchronous import AsyncReadMixin, streaming_response
+from foodgram.relations import add_links, remove_links, update_counter
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
-from rest_framework.permissions import AllowAny, IsAuthenticated
+from rest_framework.exceptions import NotFound
+from rest_framework.permissions import AllowAny, IsAdminUser, IsAuthenticated
 from rest_framework.response import Response
 
+from .autocomplete import ingredient_index
+from .bulk import NDJSONParser, RecipeImporter, iter_export, render_ndjson
+from .cache import RecipeResponseCacheMixin
+from .changes import interactions_changed
+from .fastpath import RecipeFastPathMixin
+from .feed import get_feed, parse_cursor
 from .filters import IngredientFilter, RecipeFilter
-from .models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                     ShoppingCart)
+from .models import Favorite, Ingredient, Recipe, ShoppingCart
+from .pantry import pantry_index
 from .permissions import IsAuthorOrReadOnly
-from .serializers import (IngredientSerializer, RecipeMinifiedSerializer,
-                          RecipeReadSerializer, RecipeWriteSerializer)
+from .recommendations import get_recommended_ids
+from .serializers import (IngredientSerializer, PantryRecipeSerializer,
+                          RecipeMinifiedSerializer, RecipeReadSerializer,
+                          RecipeWriteSerializer)
+from .shopping_list import (EXPORTERS, ExportUnavailableError, get_cart_etag,
+                            get_cart_ingredients)
+from .shortlinks import code_resolver, get_short_code, hit_buffer
 
+RELATIONS_BATCH_SIZE = 100
+RELATION_COUNTERS = {
+    Favorite: 'favorites_count',
+    ShoppingCart: 'in_carts_count',
+}
 
-class IngredientViewSet(viewsets.ReadOnlyModelViewSet):
+
+class IngredientViewSet(AsyncReadMixin, viewsets.ReadOnlyModelViewSet):
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
     permission_classes = (AllowAny,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = IngredientFilter
     pagination_class = None
+    query_budget = {'list': 2, 'retrieve': 2}
+    async_actions = ('list', 'retrieve')
+
+    def list(self, request, *args, **kwargs):
+        name = request.query_params.get('name')
+        if not name:
+            return super().list(request, *args, **kwargs)
+
+        limit = settings.INGREDIENT_AUTOCOMPLETE_LIMIT
+        try:
+            limit = min(int(request.query_params['limit']), limit)
+        except (KeyError, ValueError):
+            pass
+        if settings.INGREDIENT_AUTOCOMPLETE_INDEX:
+            return Response(ingredient_index.search(name, limit))
 
+        queryset = self.filter_queryset(self.get_queryset())[:max(limit, 0)]
+        serializer = self.get_serializer(queryset, many=True)
+        return Response(serializer.data)
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(AsyncReadMixin, RecipeResponseCacheMixin,
+                    RecipeFastPathMixin, viewsets.ModelViewSet):
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthorOrReadOnly,)
     filter_backends = (DjangoFilterBackend,)
     filterset_class = RecipeFilter
+    query_budget = {
+        'list': 5,
+        'retrieve': 4,
+        'create': 15,
+        'update': 16,
+        'partial_update': 16,
+        'favorite': 4,
+        'shopping_cart': 4,
+        'favorite_batch': 4,
+        'shopping_cart_batch': 4,
+        'download_shopping_cart': 3,
+        'get_link': 4,
+        'pantry': 7,
+        'similar': 3,
+        'recommended': 6,
+        'feed': 7,
+    }
+    async_actions = ('list', 'retrieve')
+
+    @property
+    def cursor_ordering(self):
+        if self.action == 'list':
+            return ('-pub_date', '-id')
+        return None
+
+    def get_queryset(self):
+        if self.action in ('list', 'retrieve'):
+            return Recipe.objects.for_read(self.request.user)
+        return super().get_queryset()
 
     def get_serializer_class(self):
         if self.action in ('list', 'retrieve'):
@@ -59,45 +130,234 @@ class RecipeViewSet(viewsets.ModelViewSet):
     def delete_shopping_cart(self, request, pk):
         return self._delete_relation(request, pk, ShoppingCart)
 
-    def _add_relation(self, request, pk, model):
-        recipe = get_object_or_404(Recipe, pk=pk)
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='favorite',
+        url_name='favorite-batch',
+        permission_classes=[IsAuthenticated]
+    )
+    def favorite_batch(self, request):
+        return self._manage_relations(request, Favorite)
 
-        if request.method == 'POST':
-            obj, created = model.objects.get_or_create(
-                user=request.user, recipe=recipe
+    @action(
+        detail=False,
+        methods=['post', 'delete'],
+        url_path='shopping_cart',
+        url_name='shopping-cart-batch',
+        permission_classes=[IsAuthenticated]
+    )
+    def shopping_cart_batch(self, request):
+        return self._manage_relations(request, ShoppingCart)
+
+    def _get_recipe_id(self, pk):
+        try:
+            return int(pk)
+        except ValueError:
+            raise NotFound
+
+    def _add_relation(self, request, pk, model):
+        recipes = self._link(request, model, [self._get_recipe_id(pk)])
+        if not recipes:
+            get_object_or_404(Recipe, pk=pk)
+            return Response(
+                {'errors': 'Уже добавлено!'},
+                status=status.HTTP_400_BAD_REQUEST
             )
+        serializer = RecipeMinifiedSerializer(
+            recipes[0], context={'request': request}
+        )
+        return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-            if not created:
-                return Response(
-                    {'errors': 'Уже добавлено!'},
-                    status=status.HTTP_400_BAD_REQUEST
-                )
+    def _delete_relation(self, request, pk, model):
+        if not self._unlink(request, model, [self._get_recipe_id(pk)]):
+            get_object_or_404(Recipe, pk=pk)
+            return Response(
+                {'errors': 'Объект не найден'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
 
+    def _manage_relations(self, request, model):
+        recipe_ids = (
+            request.data.get('recipes') if isinstance(request.data, dict)
+            else None
+        )
+        if (
+            not isinstance(recipe_ids, list) or not recipe_ids
+            or len(recipe_ids) > RELATIONS_BATCH_SIZE
+            or not all(
+                isinstance(pk, int) and not isinstance(pk, bool)
+                for pk in recipe_ids
+            )
+        ):
+            return Response(
+                {'errors': (
+                    'Ожидается список id рецептов, '
+                    f'не больше {RELATIONS_BATCH_SIZE}.'
+                )},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        recipe_ids = list(dict.fromkeys(recipe_ids))
+        if request.method == 'POST':
             serializer = RecipeMinifiedSerializer(
-                recipe, context={'request': request}
+                self._link(request, model, recipe_ids),
+                many=True, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
+        return Response({'removed': self._unlink(request, model, recipe_ids)})
 
-        obj = model.objects.filter(user=request.user, recipe=recipe)
-        if obj.exists():
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+    def _link(self, request, model, recipe_ids):
+        """
+        Добавляет рецепты в избранное или корзину. Возвращает только
+        добавленные этим запросом рецепты с полями для ответа.
+        """
+        with transaction.atomic():
+            recipe_ids = add_links(
+                model, 'user', request.user.pk, 'recipe', recipe_ids
+            )
+            recipes = update_counter(
+                Recipe, RELATION_COUNTERS[model], recipe_ids, 1,
+                returning=('name', 'image', 'cooking_time')
+            )
+        interactions_changed(model, request.user.pk, recipe_ids)
+        return sorted(recipes, key=lambda recipe: recipe.pk)
 
-        return Response(
-            {'errors': 'Объект не найден'},
-            status=status.HTTP_400_BAD_REQUEST
+    def _unlink(self, request, model, recipe_ids):
+        with transaction.atomic():
+            recipe_ids = remove_links(
+                model, 'user', request.user.pk, 'recipe', recipe_ids
+            )
+            update_counter(Recipe, RELATION_COUNTERS[model], recipe_ids, -1)
+        interactions_changed(model, request.user.pk, recipe_ids)
+        return sorted(recipe_ids)
+
+    @action(
+        detail=False,
+        permission_classes=[AllowAny]
+    )
+    def pantry(self, request):
+        try:
+            ingredient_ids = [
+                int(value)
+                for param in request.query_params.getlist('ingredients')
+                for value in param.split(',') if value
+            ]
+            max_missing = request.query_params.get('max_missing')
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            return Response(
+                {'errors': 'Ожидаются целые числа.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                {'errors': 'Укажите ингредиенты.'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        page = self.paginate_queryset(pantry_index.search(
+            ingredient_ids, settings.PANTRY_MAX_RESULTS, max_missing
+        ))
+        recipes = Recipe.objects.for_read(request.user).in_bulk(
+            [pk for pk, _ in page]
+        )
+        results = []
+        for pk, missing in page:
+            if pk in recipes:
+                recipes[pk].missing_count = missing
+                results.append(recipes[pk])
+        serializer = PantryRecipeSerializer(
+            results, many=True, context=self.get_serializer_context()
         )
+        return self.get_paginated_response(serializer.data)
 
-    def _delete_relation(self, request, pk, model):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        obj = model.objects.filter(user=request.user, recipe=recipe)
-        if obj.exists():
-            obj.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
+    @action(
+        detail=True,
+        permission_classes=[AllowAny]
+    )
+    def similar(self, request, pk):
+        recipe_id = self._get_recipe_id(pk)
+        recipes = list(Recipe.objects.filter(
+            similar_to__recipe_id=recipe_id
+        ).only('id', 'name', 'image', 'cooking_time').order_by(
+            '-similar_to__score', '-id'
+        ))
+        # Пустой список — ещё не посчитано или рецепта нет.
+        if not recipes and not Recipe.objects.filter(pk=recipe_id).exists():
+            raise NotFound
+        serializer = RecipeMinifiedSerializer(
+            recipes, many=True, context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def recommended(self, request):
+        page = self.paginate_queryset(get_recommended_ids(
+            request.user, settings.RECOMMENDED_RECIPES_LIMIT
+        ))
+        recipes = Recipe.objects.for_read(request.user).in_bulk(page)
+        serializer = RecipeReadSerializer(
+            [recipes[pk] for pk in page if pk in recipes],
+            many=True, context=self.get_serializer_context()
+        )
+        return self.get_paginated_response(serializer.data)
+
+    @action(
+        detail=False,
+        permission_classes=[IsAuthenticated]
+    )
+    def feed(self, request):
+        paginator = self.paginator
+        limit = paginator.get_page_size(request)
+        cursor = request.query_params.get(paginator.cursor_query_param)
+        if cursor:
+            try:
+                cursor = parse_cursor(paginator.decode_cursor(cursor))
+            except (TypeError, ValueError):
+                raise NotFound(paginator.invalid_cursor_message)
+        keys = get_feed(request.user, limit, cursor or None)
+        recipes = Recipe.objects.for_read(request.user).in_bulk(
+            [pk for _, pk in keys[:limit]]
+        )
+        serializer = RecipeReadSerializer(
+            [recipes[pk] for _, pk in keys[:limit] if pk in recipes],
+            many=True, context=self.get_serializer_context()
+        )
+        return Response({
+            'next': (
+                paginator.get_cursor_link(request, keys[limit - 1])
+                if len(keys) > limit else None
+            ),
+            'previous': None,
+            'results': serializer.data,
+        })
 
+    @action(
+        detail=False,
+        methods=['get', 'post'],
+        permission_classes=[IsAdminUser],
+        parser_classes=[NDJSONParser],
+    )
+    def bulk(self, request):
+        if request.method == 'GET':
+            return streaming_response(
+                render_ndjson(iter_export(Recipe.objects.all())),
+                content_type=NDJSONParser.media_type
+            )
+        importer = RecipeImporter(request.user)
+        importer.run(request.data)
         return Response(
-            {'errors': 'Объект не найден'},
-            status=status.HTTP_400_BAD_REQUEST
+            {'created': importer.created, 'errors': importer.errors},
+            status=(
+                status.HTTP_400_BAD_REQUEST
+                if importer.errors and not importer.created
+                else status.HTTP_201_CREATED
+            )
         )
 
     @action(
@@ -105,24 +365,35 @@ class RecipeViewSet(viewsets.ModelViewSet):
         permission_classes=[IsAuthenticated]
     )
     def download_shopping_cart(self, request):
-        ingredients = RecipeIngredient.objects.filter(
-            recipe__shopping_cart__user=request.user
-        ).values(
-            'ingredient__name', 'ingredient__measurement_unit'
-        ).annotate(total_amount=Sum('amount'))
-
-        shopping_list = 'Список покупок:\n\n'
-        for item in ingredients:
-            shopping_list += (
-                f'{item["ingredient__name"]} '
-                f'({item["ingredient__measurement_unit"]}) — '
-                f'{item["total_amount"]}\n'
+        file_type = request.query_params.get('type', 'txt')
+        exporter = EXPORTERS.get(file_type)
+        if exporter is None:
+            return Response(
+                {'errors': 'Доступные форматы: ' + ', '.join(EXPORTERS)},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+
+        try:
+            exporter.prepare()
+        except ExportUnavailableError as error:
+            return Response(
+                {'errors': str(error)},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE
             )
 
-        response = HttpResponse(shopping_list, content_type='text/plain')
+        ingredients = get_cart_ingredients(request.user)
+        etag = get_cart_etag(ingredients, exporter)
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            return response
+
+        response = streaming_response(
+            exporter.render(ingredients), content_type=exporter.content_type
+        )
         response['Content-Disposition'] = (
-            'attachment; filename="shopping_list.txt"'
+            f'attachment; filename="shopping_list.{exporter.extension}"'
         )
+        response['ETag'] = etag
         return response
 
     @action(
@@ -132,6 +403,22 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path='get-link'
     )
     def get_link(self, request, pk):
-        recipe = get_object_or_404(Recipe, pk=pk)
-        link = request.build_absolute_uri(f'/recipes/{recipe.id}/')
+        code = get_short_code(pk)
+        if code is None:
+            raise NotFound('Рецепт не найден.')
+        link = request.build_absolute_uri(f'/s/{code}/')
         return Response({'short-link': link}, status=status.HTTP_200_OK)
+
+
+def short_link_redirect(request, code):
+    """
+    Переход по короткой ссылке. Обычное представление Django, без
+    аутентификации и согласования формата DRF: на горячем пути только
+    поиск кода в памяти процесса.
+    """
+    recipe_id = code_resolver.resolve(code)
+    if recipe_id is None:
+        raise Http404
+    if settings.SHORT_LINK_HIT_COUNTERS:
+        hit_buffer.add(code)
+    return HttpResponseRedirect(f'/recipes/{recipe_id}/')
@@ -8,6 +8,7 @@ from .models import Subscription, User
 class CustomUserAdmin(UserAdmin):
     list_display = (
         'id', 'username', 'email', 'first_name', 'last_name',
+        'recipes_count', 'subscribers_count',
     )
     search_fields = ('username', 'email')
     list_filter = ('username', 'email')
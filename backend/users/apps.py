@@ -4,3 +4,10 @@ from django.apps import AppConfig
 class UsersConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'users'
+
+    def ready(self):
+        from foodgram.profiling import metrics
+
+        from . import signals  # noqa: F401
+        from .authentication import token_cache
+        metrics.register_source('auth_token_cache', token_cache.stats)
@@ -0,0 +1,196 @@
+import functools
+import hashlib
+import threading
+import time
+import uuid
+from collections import OrderedDict
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS
+from foodgram.caching import is_shared_cache
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.authtoken.models import Token
+
+CACHE_KEY = 'users:token:{}'
+GENERATION_KEY = 'users:token:{}:generation'
+# Поля пользователя, которые нужны представлениям без запроса к БД.
+# Пароль и остальные поля остаются отложенными и читаются по обращению.
+USER_FIELDS = (
+    'id', 'username', 'email', 'first_name', 'last_name', 'avatar',
+    'is_active', 'is_staff', 'is_superuser',
+)
+
+
+class TokenCache:
+    """
+    Токен → id и основные поля пользователя. Первый уровень — LRU
+    в памяти процесса с коротким TTL, второй — общий кеш Django, если
+    он действительно общий (не LocMemCache). Хеш пароля не кешируется.
+
+    Запись в общем кеше помечена поколением токена: инвалидация меняет
+    поколение, и запись, прочитанная из БД до неё, уже не подойдёт.
+    Сигналы чистят LRU своего процесса; в LRU других процессов запись
+    доживает не дольше AUTH_TOKEN_LOCAL_TIMEOUT.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._entries = OrderedDict()
+        self._invalidations = 0
+        self._counters = dict.fromkeys(
+            ('local_hits', 'shared_hits', 'misses', 'invalidations',
+             'evictions'),
+            0,
+        )
+
+    def get(self, key):
+        """Пара (пользователь, токен) или None."""
+        now = time.monotonic()
+        with self._lock:
+            invalidations = self._invalidations
+            entry = self._entries.get(key)
+            if entry is not None:
+                if entry[0] > now:
+                    self._entries.move_to_end(key)
+                    self._counters['local_hits'] += 1
+                    return self.build(key, entry[1])
+                del self._entries[key]
+        values = None
+        if is_shared_cache():
+            cache_key = self.get_cache_key(key)
+            generation_key = self.get_generation_key(key)
+            found = cache.get_many([cache_key, generation_key])
+            entry = found.get(cache_key)
+            if entry is not None:
+                if entry[0] == found.get(generation_key):
+                    values = entry[1]
+                else:
+                    cache.delete(cache_key)
+        with self._lock:
+            self._counters['misses' if values is None else 'shared_hits'] += 1
+        if values is None:
+            return None
+        self._remember(key, values, invalidations)
+        return self.build(key, values)
+
+    def load(self, key, fetch):
+        """
+        Промах: fetch() читает пользователя и токен из БД. Поколение
+        и счётчик инвалидаций берутся до чтения, поэтому инвалидация,
+        случившаяся во время него, не даст сохранить устаревшие данные.
+        """
+        invalidations = self._invalidations
+        generation = None
+        if is_shared_cache():
+            generation_key = self.get_generation_key(key)
+            cache.add(
+                generation_key, uuid.uuid4().hex,
+                settings.AUTH_TOKEN_CACHE_TIMEOUT,
+            )
+            generation = cache.get(generation_key)
+        user, token = fetch()
+        values = tuple(
+            # У файловых полей храним имя файла.
+            getattr(value, 'name', value) for value in (
+                field.value_from_object(user) for field in self.user_fields
+            )
+        )
+        if generation is not None:
+            cache.add(
+                self.get_cache_key(key), (generation, values),
+                settings.AUTH_TOKEN_CACHE_TIMEOUT,
+            )
+        self._remember(key, values, invalidations)
+        return user, token
+
+    def invalidate(self, *keys):
+        if is_shared_cache():
+            cache.set_many(
+                {
+                    self.get_generation_key(key): uuid.uuid4().hex
+                    for key in keys
+                },
+                settings.AUTH_TOKEN_CACHE_TIMEOUT,
+            )
+            cache.delete_many([self.get_cache_key(key) for key in keys])
+        with self._lock:
+            self._invalidations += 1
+            for key in keys:
+                self._entries.pop(key, None)
+            self._counters['invalidations'] += len(keys)
+
+    def stats(self):
+        with self._lock:
+            lookups = sum(
+                self._counters[name]
+                for name in ('local_hits', 'shared_hits', 'misses')
+            )
+            hits = lookups - self._counters['misses']
+            return {
+                **self._counters,
+                'shared': is_shared_cache(),
+                'size': len(self._entries),
+                'max_size': settings.AUTH_TOKEN_CACHE_SIZE,
+                'hit_ratio': round(hits / lookups, 3) if lookups else None,
+            }
+
+    @functools.cached_property
+    def user_fields(self):
+        # from_db ждёт значения в порядке полей модели.
+        return [
+            field for field in get_user_model()._meta.concrete_fields
+            if field.name in USER_FIELDS
+        ]
+
+    def build(self, key, values):
+        """Новые экземпляры на каждый запрос; прочие поля отложены."""
+        user = get_user_model().from_db(
+            DEFAULT_DB_ALIAS,
+            [field.attname for field in self.user_fields],
+            values,
+        )
+        token = Token.from_db(
+            DEFAULT_DB_ALIAS, ['key', 'user_id'], [key, user.pk]
+        )
+        token.user = user
+        return user, token
+
+    def get_cache_key(self, key):
+        # Сам токен в ключ кеша не попадает.
+        return CACHE_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+    def get_generation_key(self, key):
+        return GENERATION_KEY.format(hashlib.sha256(key.encode()).hexdigest())
+
+    def _remember(self, key, values, invalidations):
+        expires = time.monotonic() + settings.AUTH_TOKEN_LOCAL_TIMEOUT
+        with self._lock:
+            # Пока читали, запись могли инвалидировать.
+            if invalidations != self._invalidations:
+                return
+            self._entries[key] = (expires, values)
+            self._entries.move_to_end(key)
+            while len(self._entries) > settings.AUTH_TOKEN_CACHE_SIZE:
+                self._entries.popitem(last=False)
+                self._counters['evictions'] += 1
+
+
+token_cache = TokenCache()
+
+
+class CachedTokenAuthentication(TokenAuthentication):
+    """
+    TokenAuthentication без запроса Token JOIN User на каждый запрос:
+    найденные токены активных пользователей берутся из token_cache.
+    Неверные токены не кешируются и каждый раз проверяются в БД.
+    """
+
+    def authenticate_credentials(self, key):
+        cached = token_cache.get(key)
+        if cached is not None:
+            return cached
+        return token_cache.load(
+            key, functools.partial(super().authenticate_credentials, key)
+        )
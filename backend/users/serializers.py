@@ -1,7 +1,8 @@
-import base64
+import binascii
 
 from django.contrib.auth import get_user_model
-from django.core.files.base import ContentFile
+from foodgram.images import decode_data_uri, get_thumbnails
+from foodgram.profiling import ProfiledSerializerMixin
 from rest_framework import serializers
 
 User = get_user_model()
@@ -10,9 +11,10 @@ User = get_user_model()
 class Base64ImageField(serializers.ImageField):
     def to_internal_value(self, data):
         if isinstance(data, str) and data.startswith('data:image'):
-            format, imgstr = data.split(';base64,')
-            ext = format.split('/')[-1]
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            try:
+                data = decode_data_uri(data)
+            except binascii.Error:
+                self.fail('invalid_image')
         return super().to_internal_value(data)
 
 
@@ -27,21 +29,35 @@ class CustomUserCreateSerializer(serializers.ModelSerializer):
         return User.objects.create_user(**validated_data)
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(
+    ProfiledSerializerMixin, serializers.ModelSerializer
+):
     is_subscribed = serializers.SerializerMethodField()
     avatar = Base64ImageField(required=False, allow_null=True)
+    avatar_thumb = serializers.SerializerMethodField()
 
     class Meta:
         model = User
         fields = ('email', 'id', 'username', 'first_name',
-                  'last_name', 'is_subscribed', 'avatar')
+                  'last_name', 'is_subscribed', 'avatar', 'avatar_thumb')
 
     def get_is_subscribed(self, obj):
         request = self.context.get('request')
         if request is None or request.user.is_anonymous:
             return False
+        if hasattr(obj, 'is_subscribed'):
+            return obj.is_subscribed
         return request.user.subscriber.filter(author=obj).exists()
 
+    def get_avatar_thumb(self, obj):
+        thumbnails = get_thumbnails(obj.avatar)
+        if thumbnails is None:
+            return self.fields['avatar'].to_representation(obj.avatar)
+        request = self.context.get('request')
+        if request is None:
+            return thumbnails['thumb']
+        return request.build_absolute_uri(thumbnails['thumb'])
+
 
 class AvatarSerializer(serializers.ModelSerializer):
     avatar = Base64ImageField()
@@ -53,25 +69,25 @@ class AvatarSerializer(serializers.ModelSerializer):
 
 class SubscriptionSerializer(CustomUserSerializer):
     recipes = serializers.SerializerMethodField()
-    recipes_count = serializers.SerializerMethodField()
+    recipes_count = serializers.ReadOnlyField()
 
     class Meta(CustomUserSerializer.Meta):
         fields = CustomUserSerializer.Meta.fields + (
             'recipes', 'recipes_count'
         )
 
-    def get_recipes_count(self, obj):
-        return obj.recipes.count()
-
     def get_recipes(self, obj):
         request = self.context.get('request')
-        limit = request.GET.get('recipes_limit')
-        recipes = obj.recipes.all()
-        if limit:
-            try:
-                recipes = recipes[:int(limit)]
-            except ValueError:
-                pass
+        if hasattr(obj, 'feed_recipes'):
+            recipes = obj.feed_recipes
+        else:
+            limit = request.GET.get('recipes_limit')
+            recipes = obj.recipes.all()
+            if limit:
+                try:
+                    recipes = recipes[:int(limit)]
+                except ValueError:
+                    pass
 
         from recipes.serializers import RecipeMinifiedSerializer
         serializer = RecipeMinifiedSerializer(
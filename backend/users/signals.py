@@ -0,0 +1,25 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from rest_framework.authtoken.models import Token
+
+from .authentication import token_cache
+from .models import User
+
+
+@receiver(post_delete, sender=Token)
+def token_deleted(instance, **kwargs):
+    transaction.on_commit(lambda: token_cache.invalidate(instance.key))
+
+
+@receiver(post_save, sender=User)
+def user_changed(instance, update_fields, **kwargs):
+    # Вместе с токеном закеширован пользователь: после любого изменения
+    # (в том числе is_active=False) запись устарела.
+    if update_fields and set(update_fields) <= {'last_login'}:
+        return
+    keys = list(
+        Token.objects.filter(user=instance).values_list('key', flat=True)
+    )
+    if keys:
+        transaction.on_commit(lambda: token_cache.invalidate(*keys))
@@ -1 +1,239 @@
-# from django.test import TestCase
+import base64
+import hashlib
+import shutil
+import tempfile
+from io import BytesIO, StringIO
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.test import override_settings
+from foodgram.images import (THUMBNAIL_FORMATS, _run, generate_thumbnails,
+                             get_thumbnail_name, get_thumbnails_by_name,
+                             thumbnails_ready)
+from PIL import Image
+from recipes.models import Recipe
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from .authentication import TokenCache
+from .models import Subscription, User
+
+MEDIA_ROOT = tempfile.mkdtemp()
+AVATAR_URL = '/api/users/me/avatar/'
+
+
+def make_png(color):
+    buffer = BytesIO()
+    Image.new('RGB', (8, 8), color).save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def data_uri(content):
+    return 'data:image/png;base64,' + base64.b64encode(content).decode()
+
+
+@override_settings(MEDIA_ROOT=MEDIA_ROOT)
+class AvatarStorageTests(APITestCase):
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        shutil.rmtree(MEDIA_ROOT, ignore_errors=True)
+
+    def setUp(self):
+        self.users = [
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия',
+            )
+            for number in range(2)
+        ]
+
+    def put_avatar(self, user, avatar, format='json'):
+        self.client.force_authenticate(user)
+        response = self.client.put(
+            AVATAR_URL, {'avatar': avatar}, format=format
+        )
+        self.assertEqual(response.status_code, 200, response.content)
+        user.refresh_from_db()
+        return user.avatar.name
+
+    def test_client_filename_does_not_claim_content_hash(self):
+        genuine = make_png((10, 20, 30))
+        digest = hashlib.sha256(genuine).hexdigest()
+        forged = SimpleUploadedFile(
+            f'{digest}.png', make_png((200, 0, 0)), 'image/png'
+        )
+        forged_name = self.put_avatar(self.users[0], forged, 'multipart')
+        self.assertNotIn(digest, forged_name)
+
+        name = self.put_avatar(self.users[1], data_uri(genuine))
+        self.assertEqual(name, f'users/{digest}.png')
+        with default_storage.open(name) as file:
+            self.assertEqual(file.read(), genuine)
+
+    def test_same_uploads_share_one_file(self):
+        content = data_uri(make_png((1, 2, 3)))
+        names = [self.put_avatar(user, content) for user in self.users]
+        self.assertEqual(names[0], names[1])
+
+    def test_avatar_delete_keeps_shared_file(self):
+        content = data_uri(make_png((4, 5, 6)))
+        name = [self.put_avatar(user, content) for user in self.users][0]
+
+        response = self.client.delete(AVATAR_URL)
+        self.assertEqual(response.status_code, 204)
+        self.users[1].refresh_from_db()
+        self.assertFalse(self.users[1].avatar)
+        self.users[0].refresh_from_db()
+        self.assertEqual(self.users[0].avatar.name, name)
+        self.assertTrue(default_storage.exists(name))
+
+    def test_unused_images_collected(self):
+        old = self.put_avatar(self.users[0], data_uri(make_png((7, 8, 9))))
+        shared = self.put_avatar(self.users[1], data_uri(make_png((1, 1, 1))))
+        generate_thumbnails(old)
+        self.put_avatar(self.users[0], data_uri(make_png((1, 1, 1))))
+        thumbnails = [
+            get_thumbnail_name(old, width, ext)
+            for width in settings.IMAGE_THUMBNAIL_WIDTHS
+            for ext, _ in THUMBNAIL_FORMATS
+        ]
+        self.assertTrue(all(map(default_storage.exists, thumbnails)))
+
+        call_command('delete_unused_images', min_age=0, stdout=StringIO())
+        self.assertFalse(default_storage.exists(old))
+        self.assertFalse(any(map(default_storage.exists, thumbnails)))
+        self.assertTrue(default_storage.exists(shared))
+
+    def test_thumbnail_check_cached(self):
+        name = self.put_avatar(self.users[0], data_uri(make_png((3, 3, 3))))
+        generate_thumbnails(name)
+        thumbnails_ready.clear()
+        with mock.patch.object(
+            default_storage, 'exists', wraps=default_storage.exists
+        ) as exists:
+            for _ in range(3):
+                self.assertIsNotNone(get_thumbnails_by_name(name))
+        exists.assert_called_once()
+
+    def test_decompression_bomb_logged(self):
+        name = self.put_avatar(self.users[0], data_uri(make_png((5, 5, 5))))
+        with mock.patch.object(Image, 'MAX_IMAGE_PIXELS', 10):
+            with self.assertLogs('foodgram.images', 'ERROR'):
+                _run(name, None)
+
+
+class SubscriptionRecipesTests(APITestCase):
+    """
+    recipes и recipes_count в подписках совпадают с прежним запросом
+    на каждого автора: author.recipes.all()[:recipes_limit].
+    """
+
+    def setUp(self):
+        self.user, *self.authors = (
+            User.objects.create_user(
+                username=f'user{number}', email=f'user{number}@example.com',
+                password='password', first_name='Имя', last_name='Фамилия',
+            )
+            for number in range(4)
+        )
+        with mock.patch('recipes.signals.schedule_thumbnails'):
+            for author, count in zip(self.authors, (0, 2, 5)):
+                for number in range(count):
+                    Recipe.objects.create(
+                        author=author, name=f'Рецепт {number}',
+                        text='Описание', cooking_time=10,
+                        image='recipes/images/recipe.png',
+                    )
+                Subscription.objects.create(user=self.user, author=author)
+        self.client.force_authenticate(self.user)
+
+    def get_expected(self, limit):
+        expected = []
+        for author in self.authors:
+            recipes = author.recipes.all()
+            if limit:
+                try:
+                    recipes = recipes[:int(limit)]
+                except ValueError:
+                    pass
+            expected.append((
+                author.pk,
+                [recipe.pk for recipe in recipes],
+                author.recipes.count(),
+            ))
+        return expected
+
+    def test_matches_per_author_query(self):
+        for limit in (None, '0', '1', '3', '10', 'x'):
+            with self.subTest(limit=limit):
+                params = {} if limit is None else {'recipes_limit': limit}
+                response = self.client.get(
+                    '/api/users/subscriptions/', params
+                )
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual([
+                    (
+                        author['id'],
+                        [recipe['id'] for recipe in author['recipes']],
+                        author['recipes_count'],
+                    )
+                    for author in response.data['results']
+                ], self.get_expected(limit))
+
+
+class TokenCacheTests(APITestCase):
+    def setUp(self):
+        self.user = User.objects.create_user(
+            username='user', email='user@example.com', password='password',
+            first_name='Имя', last_name='Фамилия',
+        )
+        self.token = Token.objects.create(user=self.user)
+        self.cache = TokenCache()
+
+    def fetch(self):
+        return self.user, self.token
+
+    def test_password_hash_not_cached(self):
+        self.cache.load(self.token.key, self.fetch)
+        user, token = self.cache.get(self.token.key)
+        self.assertEqual(
+            (user.pk, user.email), (self.user.pk, 'user@example.com')
+        )
+        self.assertIn('password', user.get_deferred_fields())
+        self.assertEqual(token.user_id, self.user.pk)
+        self.assertNotIn(
+            self.user.password, repr(list(self.cache._entries.values()))
+        )
+
+    def test_local_cache_is_not_shared(self):
+        self.cache.load(self.token.key, self.fetch)
+        self.assertIsNone(cache.get(self.cache.get_cache_key(self.token.key)))
+
+    @mock.patch('users.authentication.is_shared_cache', return_value=True)
+    def test_invalidation_during_load_wins(self, shared):
+        def fetch():
+            # Пользователь изменился, пока запрос читал его из БД.
+            self.cache.invalidate(self.token.key)
+            return self.fetch()
+
+        self.cache.load(self.token.key, fetch)
+        self.assertIsNone(self.cache.get(self.token.key))
+
+        self.cache.load(self.token.key, self.fetch)
+        self.cache._entries.clear()
+        self.assertEqual(self.cache.get(self.token.key)[0].pk, self.user.pk)
+        self.cache.invalidate(self.token.key)
+        self.assertIsNone(self.cache.get(self.token.key))
+
+    def test_deactivated_user_rejected(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Token {self.token}')
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 200)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.is_active = False
+            self.user.save()
+        self.assertEqual(self.client.get('/api/users/me/').status_code, 401)
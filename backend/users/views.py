@@ -1,7 +1,14 @@
+from django.db import transaction
+from django.db.models import BooleanField, F, Prefetch, Value
 from django.shortcuts import get_object_or_404
 from djoser.views import UserViewSet
+from foodgram.asynchronous import AsyncReadMixin
+from foodgram.relations import add_links, remove_links, update_counter
+from recipes.feed import backfill, clear_feed
+from recipes.models import Recipe
 from rest_framework import status
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
 
@@ -10,10 +17,18 @@ from .serializers import (AvatarSerializer, CustomUserSerializer,
                           SubscriptionSerializer)
 
 
-class CustomUserViewSet(UserViewSet):
+class CustomUserViewSet(AsyncReadMixin, UserViewSet):
     queryset = User.objects.all()
     serializer_class = CustomUserSerializer
     permission_classes = [AllowAny]
+    query_budget = {'me': 2, 'subscriptions': 4, 'subscribe': 9}
+    async_actions = ('subscriptions',)
+
+    @property
+    def cursor_ordering(self):
+        if self.action == 'subscriptions':
+            return ('subscription_id',)
+        return None
 
     @action(
         detail=False,
@@ -40,7 +55,9 @@ class CustomUserViewSet(UserViewSet):
                 {'avatar': user.avatar.url}, status=status.HTTP_200_OK
             )
 
-        user.avatar.delete()
+        # Файлы общие для одинаковых загрузок: удаляем только ссылку,
+        # сам файл уберёт команда delete_unused_images.
+        user.avatar = None
         user.save()
         return Response(status=status.HTTP_204_NO_CONTENT)
 
@@ -49,7 +66,7 @@ class CustomUserViewSet(UserViewSet):
         permission_classes=[IsAuthenticated]
     )
     def subscriptions(self, request):
-        queryset = User.objects.filter(subscribing__user=request.user)
+        queryset = self._get_subscriptions_queryset(request)
         pages = self.paginate_queryset(queryset)
         serializer = SubscriptionSerializer(
             pages,
@@ -58,6 +75,26 @@ class CustomUserViewSet(UserViewSet):
         )
         return self.get_paginated_response(serializer.data)
 
+    def _get_subscriptions_queryset(self, request):
+        recipes = Recipe.objects.filter(
+            author__subscribing__user=request.user
+        )
+        try:
+            limit = int(request.query_params.get('recipes_limit'))
+        except (TypeError, ValueError):
+            limit = None
+        if limit is not None and limit >= 0:
+            recipes = recipes.latest_per_author(limit)
+
+        return User.objects.filter(
+            subscribing__user=request.user
+        ).annotate(
+            is_subscribed=Value(True, output_field=BooleanField()),
+            subscription_id=F('subscribing__id'),
+        ).prefetch_related(
+            Prefetch('recipes', queryset=recipes, to_attr='feed_recipes')
+        ).order_by('subscription_id')
+
     @action(
         detail=True,
         methods=['post', 'delete'],
@@ -67,37 +104,52 @@ class CustomUserViewSet(UserViewSet):
         return self._manage_subscription(request, id)
 
     def _manage_subscription(self, request, id):
-        user_to_subscribe = get_object_or_404(User, pk=id)
+        try:
+            author_id = int(id)
+        except ValueError:
+            raise NotFound
 
         if request.method == 'POST':
-            if request.user == user_to_subscribe:
+            if request.user.pk == author_id:
                 return Response(
                     {'errors': 'Нельзя подписаться на самого себя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            if request.user.subscriber.filter(
-                author=user_to_subscribe
-            ).exists():
+            # Ответ читается в той же транзакции: параллельная отписка
+            # не увидит новую подписку до коммита.
+            with transaction.atomic():
+                created = add_links(
+                    Subscription, 'user', request.user.pk, 'author',
+                    [author_id]
+                )
+                if created:
+                    update_counter(User, 'subscribers_count', created, 1)
+                    author = self._get_subscriptions_queryset(request).get(
+                        pk=author_id
+                    )
+            if not created:
+                get_object_or_404(User, pk=author_id)
                 return Response(
                     {'errors': 'Вы уже подписаны на этого пользователя'},
                     status=status.HTTP_400_BAD_REQUEST
                 )
-            Subscription.objects.create(
-                user=request.user, author=user_to_subscribe
-            )
+            transaction.on_commit(lambda: backfill(request.user.pk, author_id))
             serializer = SubscriptionSerializer(
-                user_to_subscribe, context={'request': request}
+                author, context={'request': request}
             )
             return Response(serializer.data, status=status.HTTP_201_CREATED)
 
-        subscription = request.user.subscriber.filter(
-            author=user_to_subscribe
-        )
-        if subscription.exists():
-            subscription.delete()
-            return Response(status=status.HTTP_204_NO_CONTENT)
-
-        return Response(
-            {'errors': 'Вы не были подписаны на этого пользователя'},
-            status=status.HTTP_400_BAD_REQUEST
-        )
+        with transaction.atomic():
+            removed = remove_links(
+                Subscription, 'user', request.user.pk, 'author', [author_id]
+            )
+            update_counter(User, 'subscribers_count', removed, -1)
+            if removed:
+                clear_feed(request.user.pk, author_id)
+        if not removed:
+            get_object_or_404(User, pk=author_id)
+            return Response(
+                {'errors': 'Вы не были подписаны на этого пользователя'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        return Response(status=status.HTTP_204_NO_CONTENT)
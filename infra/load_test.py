@@ -0,0 +1,226 @@
+"""
+Нагрузочный тест API: несколько потоков в течение заданного времени
+запрашивают адреса по кругу, в конце печатаются RPS и перцентили
+задержки. Только стандартная библиотека.
+
+Прогон против уже запущенного сервера:
+
+    python infra/load_test.py --url http://localhost/ --token <токен> \\
+        --path /api/users/me/ --path /api/recipes/feed/
+
+Сравнение настроек соединений с базой на локальном Postgres: для каждой
+конфигурации скрипт сам запускает gunicorn из backend/ с нужными
+переменными окружения (переменные POSTGRES_*, DB_HOST и DB_PORT берутся
+из окружения) и печатает сводную таблицу:
+
+    python infra/load_test.py --spawn baseline persistent pool \\
+        --token <токен> --path /api/users/me/ --output results.json
+
+С --server wsgi asgi каждая конфигурация запускается дважды: синхронными
+воркерами gunicorn и воркерами uvicorn (SERVER_MODE=asgi) при одинаковом
+числе процессов; у uvicorn число потоков чтения равно --threads.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+from http.client import HTTPConnection
+from urllib.parse import urlsplit
+
+BACKEND_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                           '..', 'backend')
+
+# Переменные окружения backend для сравниваемых конфигураций.
+CONFIGS = {
+    # Как было: новое соединение на каждый запрос.
+    'baseline': {'DB_CONN_MAX_AGE': '0', 'DB_POOL': 'False'},
+    'persistent': {'DB_CONN_MAX_AGE': '60', 'DB_POOL': 'False'},
+    'pool': {'DB_POOL': 'True'},
+}
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    index = min(len(values) - 1, int(round(fraction * (len(values) - 1))))
+    return values[index]
+
+
+def run_load(url, paths, token, concurrency, duration):
+    """Гоняет запросы и возвращает сводку по задержкам в миллисекундах."""
+    parts = urlsplit(url)
+    headers = {'Accept': 'application/json'}
+    if token:
+        headers['Authorization'] = f'Token {token}'
+    deadline = time.monotonic() + duration
+    latencies, errors = [], {}
+    lock = threading.Lock()
+
+    def worker(offset):
+        connection = HTTPConnection(parts.hostname, parts.port or 80,
+                                    timeout=30)
+        local, local_errors = [], {}
+        number = offset
+        while time.monotonic() < deadline:
+            path = paths[number % len(paths)]
+            number += 1
+            start = time.perf_counter()
+            try:
+                connection.request('GET', path, headers=headers)
+                response = connection.getresponse()
+                response.read()
+                status = response.status
+            except OSError as error:
+                status = type(error).__name__
+                connection.close()
+            if status == 200:
+                local.append((time.perf_counter() - start) * 1000)
+            else:
+                key = str(status)
+                local_errors[key] = local_errors.get(key, 0) + 1
+        connection.close()
+        with lock:
+            latencies.extend(local)
+            for status, count in local_errors.items():
+                errors[status] = errors.get(status, 0) + count
+
+    threads = [
+        threading.Thread(target=worker, args=(number,))
+        for number in range(concurrency)
+    ]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+    latencies.sort()
+    return {
+        'requests': len(latencies),
+        'errors': errors,
+        'rps': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.5), 2),
+        'p90_ms': round(percentile(latencies, 0.9), 2),
+        'p99_ms': round(percentile(latencies, 0.99), 2),
+        'max_ms': round(latencies[-1], 2) if latencies else 0.0,
+    }
+
+
+def fetch_pool_metrics(url, token):
+    """Счётчики пулов соединений из /api/_metrics/ (нужен токен админа)."""
+    request = urllib.request.Request(
+        url.rstrip('/') + '/api/_metrics/',
+        headers={'Authorization': f'Token {token}'} if token else {},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=10) as response:
+            data = json.load(response)
+    except (OSError, ValueError):
+        return None
+    return {
+        name: value for name, value in data.items()
+        if name.startswith('db_pool:')
+    }
+
+
+def wait_ready(url, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            urllib.request.urlopen(url.rstrip('/') + '/api/users/', timeout=2)
+            return
+        except urllib.error.HTTPError:
+            return
+        except OSError:
+            time.sleep(0.2)
+    raise RuntimeError(f'Сервер {url} не запустился за {timeout} с')
+
+
+def spawn(config, server, port, workers, threads):
+    # Приложение и класс воркеров выбирает backend/gunicorn.conf.py.
+    env = {
+        **os.environ, **CONFIGS[config],
+        'SERVER_MODE': server, 'ASYNC_VIEW_THREADS': str(threads),
+    }
+    return subprocess.Popen(
+        [
+            sys.executable, '-m', 'gunicorn',
+            '--bind', f'127.0.0.1:{port}', '--workers', str(workers),
+            '--threads', str(threads), '--log-level', 'warning',
+        ],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+def print_table(results):
+    columns = ('rps', 'p50_ms', 'p90_ms', 'p99_ms', 'max_ms', 'requests')
+    print(f'{"":<20}' + ''.join(f'{column:>10}' for column in columns)
+          + '  errors')
+    for name, result in results.items():
+        print(f'{name:<20}' + ''.join(
+            f'{result[column]:>10}' for column in columns
+        ) + f'  {result["errors"] or "-"}')
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split('\n\n')[0])
+    parser.add_argument('--url', default='http://127.0.0.1:8000/')
+    parser.add_argument('--path', action='append', dest='paths')
+    parser.add_argument('--token', default=os.getenv('LOAD_TEST_TOKEN'))
+    parser.add_argument('--concurrency', type=int, default=16)
+    parser.add_argument('--duration', type=float, default=20)
+    parser.add_argument('--warmup', type=float, default=2)
+    parser.add_argument(
+        '--spawn', nargs='+', choices=sorted(CONFIGS), metavar='CONFIG',
+        help='Запустить gunicorn для каждой конфигурации: '
+             + ', '.join(sorted(CONFIGS)),
+    )
+    parser.add_argument(
+        '--server', nargs='+', choices=('wsgi', 'asgi'), default=['wsgi'],
+    )
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--workers', type=int, default=2)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--output', help='Сохранить результаты в JSON.')
+    args = parser.parse_args()
+    paths = args.paths or ['/api/users/?limit=10']
+
+    results = {}
+    if not args.spawn:
+        run_load(args.url, paths, args.token, args.concurrency, args.warmup)
+        results['server'] = run_load(
+            args.url, paths, args.token, args.concurrency, args.duration
+        )
+        results['server']['pools'] = fetch_pool_metrics(args.url, args.token)
+    runs = [
+        (config, server)
+        for config in args.spawn or () for server in args.server
+    ]
+    for config, server in runs:
+        name = config if len(args.server) == 1 else f'{config}/{server}'
+        url = f'http://127.0.0.1:{args.port}/'
+        process = spawn(config, server, args.port, args.workers, args.threads)
+        try:
+            wait_ready(url)
+            run_load(url, paths, args.token, args.concurrency, args.warmup)
+            results[name] = run_load(
+                url, paths, args.token, args.concurrency, args.duration
+            )
+            results[name]['pools'] = fetch_pool_metrics(url, args.token)
+        finally:
+            process.terminate()
+            process.wait()
+
+    print_table(results)
+    if args.output:
+        with open(args.output, 'w') as file:
+            json.dump(results, file, ensure_ascii=False, indent=2)
+
+
+if __name__ == '__main__':
+    main()